@@ -0,0 +1,4 @@
+""" Micro-benchmarks and differential checks of the hot paths, and the end-to-end benchmark
+    of TelegramDumper against a synthetic chat (fakes, endtoend).
+    Run one with: python -m benchmarks.<name>
+"""
@@ -0,0 +1,221 @@
+""" Runs TelegramDumper end to end against a synthetic chat (see benchmarks.fakes) for every
+    exporter and filter. Reports messages/sec, peak RSS and bytes written, and stores the results
+    as JSON, so two versions can be compared:
+
+    python -m benchmarks.endtoend [--count N] [--pipeline] [--parallel N] [--takeout accept|refuse] [--out FILE] [--compare OLD_FILE]
+
+    Every scenario runs in its own process, so its peak RSS is not shared with the others.
+    'client msg/sec' leaves out the time the fake server spent generating messages.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import os.path
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+EXPORTERS = ('text', 'csv', 'jsonl', 'media', 'parquet', 'sqlite')
+
+# Columns of exporters that write nothing without --expdata
+EXPDATA = {
+    'media': 'file,link,msg-id,size,ext,date-time,mime-type',
+}
+
+FILTERS = (
+    '',
+    'has-media',
+    'text #= deploy and not is-reply',
+    'media == document and size > 1m',
+)
+
+
+def peakRss() -> int:
+    """ :return peak resident set size of this process, bytes """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def diskUsage(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(path) for name in names)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def runScenario(scenario: dict) -> dict:
+    """ Dumps the synthetic chat in this process. :return measurements """
+    from teledump import exporters
+    from teledump import filters
+    from teledump.settings import ChatDumpMetaFile
+    from teledump.settings import ChatDumpSettings
+    from .fakes import ChatShape
+    from .fakes import FakeChat
+    from .fakes import FakeDumper
+
+    chat = FakeChat(ChatShape(**scenario['shape']), scenario.get('takeout') or 'accept')
+    with tempfile.TemporaryDirectory(prefix='teledump-bench-') as root:
+        out = os.path.join(root, 'out.' + scenario['exporter'])
+        argv = ['teledump', '-c', '@' + chat.channel.username, '-p', '+10000000000', '-o', out,
+                '-e', scenario['exporter'], '-l', '0', '-q']
+        if scenario['exporter'] in EXPDATA:
+            argv += ['--expdata', EXPDATA[scenario['exporter']]]
+        if scenario['filter']:
+            argv += ['-f', scenario['filter']]
+        if scenario['pipeline']:
+            argv += ['--pipeline']
+        if scenario.get('parallel', 1) > 1:
+            argv += ['--parallel', str(scenario['parallel'])]
+        if scenario.get('takeout'):
+            argv += ['--takeout']
+        sys.argv = argv
+        settings = ChatDumpSettings('')
+        exporter = exporters.load(settings.exporter)
+        exporter.setConfig(settings.exporterConfig)
+        exporter.setCompression(settings.compression)
+        dumper = FakeDumper(os.path.join(root, 'session'), settings, ChatDumpMetaFile(settings.outFile),
+                            exporter, filters.load(settings.filter, exporter), chat, scenario['paced'])
+
+        baseRss = peakRss()
+        started = time.perf_counter()
+        rc = dumper.run()
+        seconds = time.perf_counter() - started
+        saved = dumper.output.totalSaved
+        clientSeconds = max(seconds - chat.generateSeconds, 1e-9)
+        return {
+            'exporter'        : scenario['exporter'],
+            'filter'          : scenario['filter'],
+            'rc'              : rc,
+            'messages'        : saved,
+            'seconds'         : round(seconds, 3),
+            'msgsPerSec'      : round(saved / seconds, 1),
+            'clientMsgsPerSec': round(saved / clientSeconds, 1),
+            'peakRssMB'       : round(peakRss() / 1024 / 1024, 1),
+            'baseRssMB'       : round(baseRss / 1024 / 1024, 1),
+            'bytesWritten'    : diskUsage(out),
+            'requests'        : chat.requests,
+            'floods'          : chat.floods,
+            'takeoutRequests' : chat.takeoutRequests,
+        }
+
+
+def spawn(scenario: dict) -> dict:
+    """ Runs the scenario in a new process """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run([sys.executable, '-m', 'benchmarks.endtoend', '--run', json.dumps(scenario)],
+                          cwd=root, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        return {'exporter': scenario['exporter'], 'filter': scenario['filter'], 'rc': proc.returncode or 1,
+                'error': (proc.stderr.strip().splitlines() or ['no output'])[-1]}
+    return json.loads(lines[-1])
+
+
+def commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def compare(report: dict, path: str) -> None:
+    """ Prints change of throughput and peak RSS against results stored in 'path' """
+    with open(path, encoding='utf-8') as ff:
+        previous = json.load(ff)
+    old = {(item['exporter'], item['filter']): item for item in previous['results']}
+    print('\nCompared to "{}" (teledump {}, commit {}):'.format(path, previous['teledump'], previous['commit']))
+    for key in ('shape', 'pipeline', 'parallel', 'takeout', 'paced'):
+        if previous.get(key) != report[key]:
+            print('Warning: {} differs, the numbers are not comparable.'.format(key))
+    results = report['results']
+    print('{:<8} {:<36} {:>12} {:>12}'.format('Exporter', 'Filter', 'msg/sec', 'peak RSS'))
+    for item in results:
+        before = old.get((item['exporter'], item['filter']))
+        if before is None or 'error' in item or 'error' in before:
+            continue
+        print('{:<8} {:<36} {:>+11.1f}% {:>+11.1f}%'.format(
+            item['exporter'], item['filter'][:36] or '(exporter)',
+            (item['clientMsgsPerSec'] / before['clientMsgsPerSec'] - 1) * 100,
+            (item['peakRssMB'] / before['peakRssMB'] - 1) * 100))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=20000, help='messages in the chat')
+    parser.add_argument('--media', type=float, default=0.2, help='share of messages with media')
+    parser.add_argument('--senders', type=int, default=300, help='distinct senders')
+    parser.add_argument('--replies', type=float, default=0.3, help='share of replies')
+    parser.add_argument('--unicode', type=float, default=0.1, help='share of long non-ascii bodies')
+    parser.add_argument('--body', type=int, default=120, help='average body length, characters')
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated request latency, seconds')
+    parser.add_argument('--flood-every', type=int, default=0, dest='flood_every',
+                        help='every n-th request fails with FloodWait')
+    parser.add_argument('--flood-seconds', type=int, default=1, dest='flood_seconds')
+    parser.add_argument('--exporters', type=str, default=','.join(EXPORTERS))
+    parser.add_argument('--filters', type=str, default=None, help='filters separated by ";"')
+    parser.add_argument('--pipeline', action='store_true', help='dump with --pipeline')
+    parser.add_argument('--parallel', type=int, default=1, help='dump with --parallel id ranges')
+    parser.add_argument('--takeout', type=str, default='', choices=('', 'accept', 'refuse'),
+                        help='dump with --takeout, the fake server accepts or refuses it')
+    parser.add_argument('--paced', action='store_true', help='keep the rate limiter pace')
+    parser.add_argument('--out', type=str, default='endtoend.json', help='JSON file with the results')
+    parser.add_argument('--compare', type=str, default='', help='JSON results of another version')
+    parser.add_argument('--run', type=str, default='', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(runScenario(json.loads(args.run))))
+        return 0
+
+    shape = {
+        'count': args.count, 'media': args.media, 'senders': args.senders, 'replies': args.replies,
+        'unicode': args.unicode, 'bodyLength': args.body, 'latency': args.latency,
+        'floodEvery': args.flood_every, 'floodSeconds': args.flood_seconds,
+    }
+    filterList = FILTERS if args.filters is None else args.filters.split(';')
+    print('{:<8} {:<36} {:>8} {:>10} {:>10} {:>8} {:>12}'.format(
+        'Exporter', 'Filter', 'Messages', 'msg/sec', 'client', 'RSS MB', 'Bytes'))
+    results = []
+    for exporter in args.exporters.split(','):
+        for filter in filterList:
+            item = spawn({'shape': shape, 'exporter': exporter, 'filter': filter,
+                          'pipeline': args.pipeline, 'parallel': args.parallel, 'takeout': args.takeout, 'paced': args.paced})
+            results.append(item)
+            if 'error' in item:
+                print('{:<8} {:<36} FAILED: {}'.format(exporter, filter[:36] or '(exporter)', item['error']))
+                continue
+            print('{:<8} {:<36} {:>8} {:>10.1f} {:>10.1f} {:>8.1f} {:>12}'.format(
+                exporter, filter[:36] or '(exporter)', item['messages'], item['msgsPerSec'],
+                item['clientMsgsPerSec'], item['peakRssMB'], item['bytesWritten']))
+
+    from teledump import __version__
+    report = {
+        'teledump': __version__,
+        'commit'  : commit(),
+        'python'  : platform.python_version(),
+        'date'    : datetime.datetime.now().isoformat(timespec='seconds'),
+        'pipeline': args.pipeline,
+        'parallel': args.parallel,
+        'takeout' : args.takeout,
+        'paced'   : args.paced,
+        'shape'   : shape,
+        'results' : results,
+    }
+    with open(args.out, 'w', encoding='utf-8') as ff:
+        json.dump(report, ff, indent=4)
+    print('Results saved into "{}".'.format(args.out))
+    if args.compare:
+        compare(report, args.compare)
+    return 1 if any(item.get('rc') for item in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
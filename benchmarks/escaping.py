@@ -0,0 +1,115 @@
+""" Compares escaping kernel of teledump.utils with the regex based escaping it replaced.
+    Fails if any string of the corpus is escaped differently, then reports timings.
+
+    python -m benchmarks.escaping [--rounds N]
+"""
+
+import argparse
+import random
+import re
+import sys
+import timeit
+
+from teledump import utils
+
+
+class _RegexEscaper:
+    """ The escaping of utils.Escaper and TextExporter before the table-driven kernel """
+
+    def __init__(self, pattern: str, extra: dict):
+        self.ESCAPE = re.compile(pattern)
+        self.ESCAPE_DICT = {
+            '\b': '\\b',
+            '\f': '\\f',
+            '\n': '\\n',
+            '\r': '\\r',
+            '\t': '\\t',
+        }
+        self.ESCAPE_DICT.update(extra)
+        for i in range(0x20):
+            self.ESCAPE_DICT.setdefault(chr(i), '\\u{0:04x}'.format(i))
+
+    def escape(self, ss: str) -> str:
+        def replace(match):
+            return self.ESCAPE_DICT[match.group(0)]
+        return self.ESCAPE.sub(replace, ss)
+
+
+_csv = _RegexEscaper(r'[\x00-\x1f\\"\b\f\n\r\t]', {'\\': '\\\\', '"': '""'})
+_text = _RegexEscaper(r'[\x00-\x1f\b\f\n\r\t]', {'\\': '\\\\'})
+
+
+def reference_escape(ss: str) -> str:
+    return str(_csv.escape(ss)) if ss else ""
+
+
+def reference_escape_text(ss: str) -> str:
+    return _text.escape(ss) if ss else ss
+
+
+def corpus(count: int = 20000, seed: int = 1) -> list:
+    """ Strings with and without characters to escape, short and long, ascii and not """
+    rnd = random.Random(seed)
+    alphabets = [
+        'abcdefghijklmnopqrstuvwxyz ABCXYZ0123456789.,;:!?',
+        ''.join(chr(i) for i in range(0x20)) + '\\"\'abc',
+        'привет мир 你好 🙂 \u2028\u2029\u00a0\x7f\x80',
+    ]
+    strings = ['', 'a', '\\', '"', '\n', '\x00', '\x1f', '\x20', 'no escapes at all', '\\"\\"', '\r\n' * 10]
+    strings.extend(chr(i) for i in range(0x80))
+    for _ in range(count):
+        length = rnd.choice((1, 8, 40, 200, 2000))
+        weights = rnd.choice(((1, 0, 0), (20, 1, 0), (10, 1, 5), (0, 0, 1), (1, 1, 1)))
+        strings.append(''.join(rnd.choice(rnd.choices(alphabets, weights)[0]) for _ in range(length)))
+    return strings
+
+
+def messages(count: int = 20000, seed: int = 2) -> list:
+    """ Message-like texts: words with occasional line breaks, tabs, quotes and backslashes """
+    rnd = random.Random(seed)
+    words = 'lorem ipsum dolor sit amet привет мир "quoted" path\\to 🙂'.split(' ')
+    texts = []
+    for _ in range(count):
+        parts = []
+        for _ in range(rnd.choice((3, 10, 40, 150))):
+            parts.append(rnd.choice(words))
+            parts.append(rnd.choices((' ', '\n', '\t'), (30, 2, 0.2))[0])
+        texts.append(''.join(parts))
+    return texts
+
+
+def check(strings: list) -> int:
+    """ :return number of strings escaped differently """
+    mismatches = 0
+    for ss in strings:
+        for new, old in ((utils.escape, reference_escape), (utils.escape_text, reference_escape_text)):
+            if new(ss) != old(ss):
+                mismatches += 1
+                print('MISMATCH {}: {!r} -> {!r} != {!r}'.format(new.__name__, ss[:40], new(ss)[:40], old(ss)[:40]))
+    return mismatches
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    strings = corpus()
+    texts = messages()
+    mismatches = check(strings + texts)
+    print('{} strings checked, {} mismatches.'.format(len(strings) + len(texts), mismatches))
+    if mismatches:
+        return 1
+
+    plain = [ss for ss in strings if not re.search(r'[\x00-\x1f\\"]', ss)]
+    for name, sample in (('messages', texts), ('random', strings), ('without escapes', plain)):
+        for label, func in (('regex', reference_escape), ('kernel', utils.escape),
+                            ('regex text', reference_escape_text), ('kernel text', utils.escape_text)):
+            best = min(timeit.repeat(lambda: [func(ss) for ss in sample], number=1, repeat=args.rounds))
+            print('{:<16} {:<12} {:8.1f} ms  {:6.2f} us/string'.format(
+                name, label, best * 1000, best * 1000000 / len(sample)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
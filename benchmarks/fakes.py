@@ -0,0 +1,299 @@
+""" Synthetic chat and a TelegramDumper that serves it instead of Telegram servers """
+
+import asyncio
+import datetime
+import math
+import random
+import time
+from array import array
+
+from telethon.errors import FloodWaitError
+from telethon.errors import TakeoutInitDelayError
+from telethon.errors import TakeoutInvalidError
+from telethon.helpers import TotalList
+from telethon.tl import TLRequest
+from telethon.tl import functions
+from telethon.tl import types
+
+from teledump.TelegramDumper import TelegramDumper
+from teledump.network import RateLimiter
+
+
+class ChatShape:
+    """ Volume and shape of a synthetic chat """
+
+    def __init__(self, count: int = 20000, media: float = 0.2, senders: int = 300, replies: float = 0.3,
+                 unicode: float = 0.1, bodyLength: int = 120, latency: float = 0.0, floodEvery: int = 0,
+                 floodSeconds: int = 1, seed: int = 1):
+        # Messages in the chat
+        self.count : int = count
+        # Share of messages with a document or a photo
+        self.media : float = media
+        # Distinct senders
+        self.senders : int = senders
+        # Share of replies
+        self.replies : float = replies
+        # Share of long non-ascii bodies (cyrillic, CJK, emoji)
+        self.unicode : float = unicode
+        # Average length of a plain body, characters
+        self.bodyLength : int = bodyLength
+        # Simulated round trip of a request, seconds
+        self.latency : float = latency
+        # Every n-th request fails with FloodWait of 'floodSeconds', 0 disables it
+        self.floodEvery : int = floodEvery
+        self.floodSeconds : int = floodSeconds
+        self.seed : int = seed
+
+    def toDict(self) -> dict:
+        return dict(self.__dict__)
+
+
+class FakeChat:
+    """ Generates messages of a chat on request, the way messages.getHistory and
+        messages.search return them, so only the requested pages are kept in memory.
+        Every message is derived from its id, repeated requests return equal messages.
+    """
+    MEDIA_NONE     = 0
+    MEDIA_DOCUMENT = 1
+    MEDIA_PHOTO    = 2
+
+    _WORDS = ('the', 'a', 'report', 'deploy', 'build', 'meeting', 'tomorrow', 'see', 'link', 'fixed',
+              'issue', 'please', 'thanks', '"quoted"', 'path\\to\\file', 'ok', 'why', 'release', 'v2.1,', 'lol')
+    _UNICODE = ('привет', 'мир', 'сообщение', '你好', '世界', '消息', '🙂', '🚀', 'ünïcödé', 'ελληνικά', 'עברית')
+    _EXTENSIONS = (('pdf', 'application/pdf'), ('epub', 'application/epub+zip'), ('mp4', 'video/mp4'),
+                   ('zip', 'application/zip'), ('jpg', 'image/jpeg'))
+
+    def __init__(self, shape: ChatShape, takeout: str = 'accept'):
+        self.shape : ChatShape = shape
+        self.channel = types.Channel(id=1000001, title='Benchmark chat', photo=types.ChatPhotoEmpty(),
+                                     date=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc), username='benchmark_chat', access_hash=1)
+        self.users = [types.User(id=100 + i, access_hash=i, first_name='First{}'.format(i), last_name='Last',
+                                 username='user{}'.format(i) if i % 3 else None, bot=(i % 40 == 0))
+                      for i in range(shape.senders)]
+
+        # Compact per-message attributes, indexed by id - 1
+        rnd = random.Random(shape.seed)
+        self._sender = array('i', (rnd.randrange(shape.senders) for _ in range(shape.count)))
+        self._media = bytes(self._mediaKind(rnd) for _ in range(shape.count))
+        self._reply = array('i', (rnd.randrange(1, i + 1) if i > 1 and rnd.random() < shape.replies else 0
+                                  for i in range(1, shape.count + 1)))
+        # Message 'id' is dated 'id' minutes after it, in UTC as Telethon dates are
+        self._base = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+
+        # Requests served, FloodWaits raised and time spent generating messages
+        self.requests : int = 0
+        self.floods : int = 0
+        self.generateSeconds : float = 0.0
+        # Ids matching a search query, by query
+        self._matches = {}
+
+        # How account.initTakeoutSession is answered: 'accept' or 'refuse'
+        self.takeout : str = takeout
+        # Requests served within takeout session, and 'success' it was finished with (None if it was not)
+        self.takeoutRequests : int = 0
+        self.takeoutSuccess : bool = None
+        self._takeoutId : int = 0
+
+    def _mediaKind(self, rnd: random.Random) -> int:
+        if rnd.random() >= self.shape.media:
+            return FakeChat.MEDIA_NONE
+        return FakeChat.MEDIA_DOCUMENT if rnd.random() < 0.7 else FakeChat.MEDIA_PHOTO
+
+    def text(self, id: int) -> str:
+        rnd = random.Random(id * 7919 + self.shape.seed)
+        if rnd.random() < self.shape.unicode:
+            words, length = FakeChat._UNICODE, self.shape.bodyLength * 4
+        else:
+            words, length = FakeChat._WORDS, rnd.randrange(1, self.shape.bodyLength * 2)
+        parts = []
+        size = 0
+        while size < length:
+            word = rnd.choice(words)
+            parts.append(word)
+            parts.append('\n' if rnd.random() < 0.05 else ' ')
+            size += len(word) + 1
+        return ''.join(parts)
+
+    def message(self, id: int) -> types.Message:
+        index = id - 1
+        sender = self.users[self._sender[index]]
+        media = None
+        kind = self._media[index]
+        if kind == FakeChat.MEDIA_DOCUMENT:
+            ext, mime = FakeChat._EXTENSIONS[id % len(FakeChat._EXTENSIONS)]
+            media = types.MessageMediaDocument(document=types.Document(
+                id=id, access_hash=id * 31, file_reference=b'ref', date=self._base, mime_type=mime,
+                size=(id * 104729) % (64 * 1024 * 1024), dc_id=2,
+                attributes=[types.DocumentAttributeFilename('file{}.{}'.format(id, ext))]))
+        elif kind == FakeChat.MEDIA_PHOTO:
+            media = types.MessageMediaPhoto(photo=types.PhotoEmpty(id=id))
+        reply = self._reply[index]
+        msg = types.Message(
+            id=id, peer_id=types.PeerChannel(self.channel.id), date=self._base + datetime.timedelta(minutes=id),
+            message=self.text(id), from_id=types.PeerUser(sender.id), media=media,
+            reply_to=types.MessageReplyHeader(reply_to_msg_id=reply) if reply else None)
+        # What Telethon attaches to messages it returns
+        msg._sender = sender
+        msg._sender_id = sender.id
+        msg._chat = self.channel
+        return msg
+
+    def _match(self, filter, fromUser, search) -> list:
+        """ :return ascending ids of messages matching a messages.search query """
+        key = (type(filter).__name__, getattr(fromUser, 'user_id', None), search)
+        ids = self._matches.get(key)
+        if ids is None:
+            kind = {
+                types.InputMessagesFilterDocument: FakeChat.MEDIA_DOCUMENT,
+                types.InputMessagesFilterPhotos: FakeChat.MEDIA_PHOTO,
+            }.get(type(filter))
+            ids = []
+            for id in range(1, self.shape.count + 1):
+                if kind is not None and self._media[id - 1] != kind:
+                    continue
+                if fromUser is not None and self.users[self._sender[id - 1]].id != fromUser.user_id:
+                    continue
+                if search is not None and search.lower() not in self.text(id).lower():
+                    continue
+                ids.append(id)
+            self._matches[key] = ids
+        return ids
+
+    async def getMessages(self, limit=100, offset_id=0, reverse=False, min_id=0, filter=None, from_user=None,
+                          search=None, offset_date=None, **kwargs) -> TotalList:
+        """ TelegramClient.get_messages() of this chat """
+        self.requests += 1
+        if self.shape.latency:
+            await asyncio.sleep(self.shape.latency)
+        if self.shape.floodEvery and self.requests % self.shape.floodEvery == 0:
+            self.floods += 1
+            raise FloodWaitError(request=None, capture=self.shape.floodSeconds)
+
+        started = time.perf_counter()
+        isSearch = filter is not None or from_user is not None or search is not None
+        ids = self._match(filter, from_user, search) if isSearch else None
+        total = len(ids) if isSearch else self.shape.count
+        if limit is None:
+            limit = total
+        if offset_date is not None and offset_id == 0:
+            # offset_id has priority over offset_date. The first message dated at offset_date or later
+            atDate = max(math.ceil((offset_date - self._base) / datetime.timedelta(minutes=1)), 1)
+            offset_id = atDate - 1 if reverse else min(atDate, self.shape.count + 1)
+        if reverse:
+            first = max(offset_id, min_id) + 1
+            candidates = (id for id in ids if id >= first) if isSearch else range(first, self.shape.count + 1)
+        else:
+            last = offset_id - 1 if offset_id > 0 else self.shape.count
+            candidates = (id for id in reversed(ids) if id <= last) if isSearch else range(last, 0, -1)
+        page = TotalList()
+        for id in candidates:
+            if len(page) >= limit or (not reverse and id <= min_id):
+                break
+            page.append(self.message(id))
+        page.total = total
+        self.generateSeconds += time.perf_counter() - started
+        return page
+
+
+    async def serve(self, request):
+        """ Answers a request sent through the client, see FakeDumper """
+        if isinstance(request, functions.account.InitTakeoutSessionRequest):
+            if self.takeout != 'accept':
+                raise TakeoutInitDelayError(request=request, capture=86400)
+            self._takeoutId = random.randrange(1, 2 ** 62)
+            return types.account.Takeout(id=self._takeoutId)
+        if isinstance(request, functions.InvokeWithTakeoutRequest):
+            # A takeout id of another server (process) is unknown here
+            if request.takeout_id != self._takeoutId:
+                raise TakeoutInvalidError(request=request)
+            self.takeoutRequests += 1
+            request = request.query
+            if isinstance(request, functions.account.FinishTakeoutSessionRequest):
+                self.takeoutSuccess = request.success
+                self._takeoutId = 0
+                return True
+        if isinstance(request, PageRequest):
+            return PageRequest.Page(await self.getMessages(**request.kwargs))
+        raise NotImplementedError(type(request).__name__)
+
+
+class PageRequest(TLRequest):
+    """ TelegramClient.get_messages() of FakeChat as a request, so it is sent through the client
+        (and takeout session) the way Telethon requests are
+    """
+    CONSTRUCTOR_ID = 0x7e1ed0e1
+    SUBCLASS_OF_ID = 0x7e1ed0e1
+
+    class Page:
+        """ Result that has no entities for the client to process """
+        def __init__(self, messages: TotalList):
+            self.messages : TotalList = messages
+
+    def __init__(self, kwargs: dict):
+        self.kwargs : dict = kwargs
+
+    def to_dict(self) -> dict:
+        return {'_': 'PageRequest', 'kwargs': self.kwargs}
+
+
+class _FakeSender:
+    """ MTProtoSender of FakeDumper, it passes requests to FakeChat """
+
+    def __init__(self, chat: FakeChat):
+        self.chat : FakeChat = chat
+
+    def send(self, request, ordered: bool = False):
+        return asyncio.ensure_future(self.chat.serve(request))
+
+
+class _UnpacedLimiter(RateLimiter):
+    """ Keeps no pace between requests, only blocks for FloodWait """
+
+    def reserve(self, limit: int) -> float:
+        return max(self._next - time.monotonic(), 0.0)
+
+    def concurrency(self, maxRequests: int) -> int:
+        return maxRequests
+
+    def onFlood(self, seconds: int) -> None:
+        self._next = max(self._next, time.monotonic() + seconds)
+        self.floodWait += seconds
+
+
+class FakeDumper(TelegramDumper):
+    """ TelegramDumper that is logged in and reads the history of FakeChat """
+
+    def __init__(self, session_user_id, settings, chatMeta, exporter, filter, chat: FakeChat, paced: bool = False):
+        super().__init__(session_user_id, settings, chatMeta, exporter, filter)
+        self.chat : FakeChat = chat
+        self._sender = _FakeSender(chat)
+        if not paced:
+            # Measures teledump, not the pace Telegram allows
+            self.limiter = _UnpacedLimiter(session_user_id + '.limiter')
+
+    def _sync(self, coro):
+        """ Runs coroutine the way Telethon sync methods do: awaited inside the loop, completed outside """
+        if self.loop.is_running():
+            return coro
+        return self.loop.run_until_complete(coro)
+
+    def connect(self):
+        return True
+
+    def is_user_authorized(self):
+        return True
+
+    def _getChannel(self, chatName: str = None):
+        return self.chat.channel
+
+    def get_messages(self, entity, *args, **kwargs):
+        # Pages go through the client, or its takeout proxy, see TelegramDumper.fetchMessages()
+        return self._sync(self._getPage(kwargs))
+
+    async def _getPage(self, kwargs: dict) -> TotalList:
+        return (await self(PageRequest(kwargs))).messages
+
+    def get_input_entity(self, peer):
+        async def resolve():
+            return types.InputPeerUser(peer.user_id, 0)
+        return self._sync(resolve())
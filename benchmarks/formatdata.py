@@ -0,0 +1,158 @@
+""" Compares lazy, slot-based FormatData with the eager one it replaced.
+    Fails if any field differs, then reports time and memory allocated per message
+    for the fields each exporter reads, and memory held by buffered objects.
+
+    python -m benchmarks.formatdata [--count N] [--rounds N]
+"""
+
+import argparse
+import datetime
+import random
+import sys
+import timeit
+import tracemalloc
+
+from telethon.tl import types
+
+from teledump.exporters import SenderCache
+from teledump.exporters.FormatData import FormatData
+
+
+class _EagerFormatData(object):
+    """ FormatData before it computed its fields lazily """
+
+    def __init__(self, msg, senders=None):
+        if senders is not None:
+            self.name, self.is_sent_by_bot = senders.resolve(msg)
+        else:
+            self.name, self.is_sent_by_bot = SenderCache.describe(msg.sender)
+
+        self.caption = None
+        if hasattr(msg, 'message'):
+            self.content = msg.message
+        elif hasattr(msg, 'action'):
+            self.content = str(msg.action)
+        else:
+            self.content = type(msg).__name__
+
+        self.re_id_str = ''
+        if hasattr(msg, 'reply_to_msg_id') and msg.reply_to_msg_id is not None:
+            self.re_id_str = str(msg.reply_to_msg_id)
+
+        self.is_contains_media = False
+        self.media_content = None
+        if getattr(msg, 'media', None):
+            self.is_contains_media = True
+            self.caption = getattr(msg.media, 'caption', '')
+            self.media_content = '<{}> {}'.format(type(msg.media).__name__, self.caption)
+
+
+FIELDS = ('name', 'is_sent_by_bot', 'caption', 'content', 're_id_str', 'is_contains_media', 'media_content')
+
+# Fields read by exporters
+READERS = [
+    ('csv'  , ('name', 're_id_str', 'content')),
+    ('text' , ('re_id_str', 'name', 'content')),
+    ('jsonl', ('re_id_str', 'name', 'is_sent_by_bot', 'content', 'is_contains_media', 'media_content')),
+]
+
+
+def messages(count: int, seed: int = 1) -> list:
+    """ Messages of a group: a few hundred senders, some replies, some media, some service messages """
+    rnd = random.Random(seed)
+    senders = [types.User(id=i, first_name='First{}'.format(i), last_name='Last', bot=(i % 50 == 0))
+               for i in range(1, 300)]
+    result = []
+    for i in range(count):
+        sender = rnd.choice(senders)
+        if rnd.random() < 0.02:
+            msg = types.MessageService(id=i, peer_id=types.PeerChannel(1), date=datetime.datetime(2020, 1, 1),
+                                       action=types.MessageActionPinMessage(), from_id=types.PeerUser(sender.id))
+        else:
+            reply = types.MessageReplyHeader(reply_to_msg_id=rnd.randrange(1, i + 2)) if rnd.random() < 0.3 else None
+            media = types.MessageMediaPhoto() if rnd.random() < 0.2 else None
+            msg = types.Message(id=i, peer_id=types.PeerChannel(1), date=datetime.datetime(2020, 1, 1),
+                                message='message text {}'.format(i), from_id=types.PeerUser(sender.id),
+                                reply_to=reply, media=media)
+        msg._sender = sender
+        msg._sender_id = sender.id
+        result.append(msg)
+    return result
+
+
+def check(msgs: list) -> int:
+    """ :return number of fields that differ """
+    mismatches = 0
+    for msg in msgs:
+        old = _EagerFormatData(msg)
+        new = FormatData(msg)
+        for field in FIELDS:
+            if getattr(old, field) != getattr(new, field):
+                mismatches += 1
+                print('MISMATCH id={} {}: {!r} != {!r}'.format(msg.id, field, getattr(new, field), getattr(old, field)))
+    return mismatches
+
+
+def allocated(func) -> int:
+    """ :return bytes allocated by func while it runs """
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    msgs = messages(args.count)
+    mismatches = check(msgs)
+    print('{} messages checked, {} mismatches.'.format(len(msgs), mismatches))
+    if mismatches:
+        return 1
+
+    senders = SenderCache()
+    for msg in msgs:
+        senders.resolve(msg)
+
+    for reader, fields in READERS:
+        runs = {}
+        for label, cls in (('eager', _EagerFormatData), ('lazy', FormatData)):
+            # reads fields the way the exporter does, without a getattr() call per field
+            namespace = {'msgs': msgs, 'cls': cls, 'senders': senders}
+            exec('def run():\n'
+                 '    for msg in msgs:\n'
+                 '        data = cls(msg, senders)\n'
+                 '        {}\n'.format('; '.join('data.' + field for field in fields)), namespace)
+            runs[label] = (namespace['run'], [])
+        # rounds of both variants alternate, so both see the same machine load
+        for _ in range(args.rounds):
+            for run, times in runs.values():
+                times.append(timeit.timeit(run, number=1))
+        for label, (_, times) in runs.items():
+            best = min(times)
+            print('{:<6} {:<6} {:8.1f} ms  {:6.2f} us/message'.format(
+                reader, label, best * 1000, best * 1000000 / len(msgs)))
+
+    # Objects kept alive, e.g. a page of messages buffered before it is written
+    for label, cls in (('eager', _EagerFormatData), ('lazy', FormatData)):
+        def buffer():
+            kept = []
+            for msg in msgs:
+                data = cls(msg, senders)
+                for field in READERS[0][1]:
+                    getattr(data, field)
+                kept.append(data)
+            return kept
+
+        print('buffered {:<6} {:8.1f} bytes/message'.format(label, allocated(buffer) / len(msgs)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
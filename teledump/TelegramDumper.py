@@ -4,33 +4,49 @@
     that fetches messages from Telegram and do processing.
 """
 
-import codecs
+import asyncio
 import logging
 import os
 import os.path
 import sys
-import tempfile
-from collections import deque
+import time
 from getpass import getpass
 from time import sleep
 from typing import Deque
-from typing import TextIO
 
 from telethon import TelegramClient,sync  # pylint: disable=unused-import
+from telethon import utils
 from telethon.errors import (FloodWaitError,
+                             RPCError,
                              SessionPasswordNeededError,
+                             TakeoutInvalidError,
                              UsernameNotOccupiedError,
                              UsernameInvalidError)
 from telethon.tl.functions.contacts import ResolveUsernameRequest
 from telethon.tl.types import Channel
 
+from .archive import MessageArchive
 from .exceptions import DumpingError
 from .exceptions import MetaFileError
 from .exporters import Exporter
 from .filters import Filter
+from .filters import SearchQuery
 from .exporters import ExporterContext
+from .exporters import SenderCache
+from .media import MediaDownloader
+from .media import MediaStore
+from .network import BandwidthLimiter
+from .network import PeerCache
+from .network import RateLimiter
+from .network import TakeoutSession
+from .output import ChatDumpOutput
+from .pipeline import DumpPipeline
+from .pipeline import FollowPipeline
+from .pipeline import RangePipeline
+from .settings import ChatDumpCheckpoint
 from .settings import ChatDumpMetaFile
 from .settings import ChatDumpSettings
+from .stats import RunStats
 from .utils import JOIN_CHAT_PREFIX_URL
 
 
@@ -45,7 +61,9 @@ class TelegramDumper(TelegramClient):
             settings.api_id,
             settings.api_hash,
             timeout=40, #seconds
-            proxy=None
+            proxy=None,
+            # Let the rate limiter see every FloodWait instead of Telethon sleeping silently
+            flood_sleep_threshold=0
         )
 
         # Settings as specified by user or defaults or from metadata
@@ -55,10 +73,17 @@ class TelegramDumper(TelegramClient):
         # Exporter object that converts msg -> string
         self.exporter : Exporter = exporter
         self.filter   : Filter = filter
+        # Part of the filter evaluated by Telegram search and the one left to check locally
+        self.query    : SearchQuery = None
+        self.residual : Filter = filter
 
         # The context that will be passed to the exporter
         self.context : ExporterContext = ExporterContext()
         self.context.isContinue = self.settings.isIncremental
+        self.context.senders = SenderCache(self.settings.senderCacheFile)
+        self.filter.setSenders(self.context.senders)
+        self.context.stats = RunStats(self.settings.chatName, self.settings.exporter)
+        self.stats : RunStats = self.context.stats
         # How many massages user wants to be dumped
         # explicit --limit, or default of 100 or unlimited (int.Max)
         self.messageToFetch : int = 0
@@ -66,28 +91,67 @@ class TelegramDumper(TelegramClient):
         # Messages page offset for fetching
         self.idPageOffset : int = 0
 
-        # A list of paths to the temp files
-        self.tempFiles : Deque[str] = deque()
+        # Dialogs of the logged in user, fetched on demand
+        self.dialogs : list = None
+        # Chats resolved by the previous runs, kept alongside the session, and their refresh
+        self.peers : PeerCache = PeerCache(session_user_id + '.peers')
+        self._peerRefresh : asyncio.Task = None
+
+        # Paces requests and picks page size. Its state is kept alongside the session
+        self.limiter : RateLimiter = RateLimiter(session_user_id + '.limiter')
+
+        # Bulk export session with looser flood limits (--takeout), None once Telegram refuses it
+        self.takeoutSession : TakeoutSession = TakeoutSession(self) if self.settings.isTakeout else None
+
+        # Downloads documents exported by media exporter
+        if self.settings.downloadDir or self.settings.storeDir:
+            self.context.downloader = MediaDownloader(
+                self, self.settings, BandwidthLimiter(self.settings.bandwidth),
+                MediaStore(self.settings.storeDir) if self.settings.storeDir else None)
+
+        # Keeps raw fetched messages for offline export (--archive)
+        self.archive : MessageArchive = MessageArchive(self.settings.archiveDir) if self.settings.archiveDir else None
+
+        # Buffer, temp files and resulting file of the dump
+        self.output : ChatDumpOutput = ChatDumpOutput(self.settings, self.exporter, self.context)
 
         # Actual lattets message id that was prossessed since the dumper started running
         self.idLastMessage : int = self.settings.idLastMessage
 
-        # The number of messages written into a resulting file de-facto
-        self.totalSaved : int = 0
-
     def run(self) -> int:
         """ Dumps all desired chat messages into a file """
         rc = 0
+        self.limiter.load()
+        self.peers.load()
+        self.context.senders.load()
         try:
-            self._cnnect()
+            with self.stats.measure('connect'):
+                self._cnnect()
+            self._startTakeout()
             try:
-                chatObj = self._getChannel()
+                with self.stats.measure('resolve'):
+                    chatObj = self._getChannel()
             except ValueError as ex:
                 rc = 1
                 self.logger.error('%s', ex, exc_info=self.logger.level > logging.INFO)
                 return rc
+            if self.archive is not None:
+                self.archive.open(utils.get_peer_id(chatObj))
+            follower = None
+            if self.settings.isFollowing:
+                if self.settings.exporter == 'parquet' or self.settings.shardSize:
+                    # Restored by --continue from .meta, so the parser did not check it
+                    raise DumpingError('--follow is not applicable to parquet exporter and --shard')
+                # Subscribed before catching up, so messages posted meanwhile are not missed
+                follower = FollowPipeline(self, chatObj, self.settings, self.exporter, self.filter, self.context,
+                                          self.output, self.chatMeta, self.archive)
+                follower.subscribe()
             # Fetch history in chunks and save it into a resulting file
             self._dump(chatObj)
+            if self.context.downloader is not None:
+                self._download(self.context.downloader)
+            if follower is not None:
+                self._follow(follower)
         except (DumpingError, MetaFileError) as ex:
             self.logger.error('%s', ex, exc_info=self.logger.level > logging.INFO)
             rc = 1
@@ -98,13 +162,17 @@ class TelegramDumper(TelegramClient):
             self.logger.error('Uncaught exception occured. %s', ex, exc_info=self.logger.level > logging.INFO)
             rc = 1
         finally:
+            self._finishTakeout(rc == 0)
             self.logger.debug('Make sure there are no temp files left undeleted.')
             # Clear temp files if any
-            while self.tempFiles:
-                try:
-                    os.remove(self.tempFiles.pop().name)
-                except Exception:  # pylint: disable=broad-except
-                    pass
+            self.output.cleanup()
+            self.limiter.save()
+            self._savePeers(rc == 0)
+            self._saveSenders()
+            self._saveStats(rc)
+            if self.archive is not None:
+                self.archive.close()
+                self.print('{} new messages archived into "{}".', self.archive.totalAdded, self.archive.root)
 
         if self.settings.isClean:
             try:
@@ -114,9 +182,81 @@ class TelegramDumper(TelegramClient):
             except Exception:  # pylint: disable=broad-except
                 self.print('Failed to logout and clean session data.')
 
-        self.print('{} messages were successfully written in the resulting file. Done!', self.totalSaved)
+        self.print('{} messages were successfully written in the resulting file. Done!', self.output.totalSaved)
         return rc
 
+    async def fetchMessages(self, peer, **kwargs):
+        """ get_messages() within takeout session while it is open (--takeout).
+            Goes on with the normal session once Telegram no longer accepts the takeout.
+        """
+        if self.takeoutSession is not None and self.takeoutSession.isOpen:
+            try:
+                return await self.takeoutSession.client.get_messages(peer, **kwargs)
+            except TakeoutInvalidError:
+                self.print('Takeout session is no longer valid, go on with the normal session.')
+                self.takeoutSession.abandon()
+                self.takeoutSession = None
+        return await self.get_messages(peer, **kwargs)
+
+    def _startTakeout(self) -> None:
+        """ Opens takeout session, or goes on with the normal one if Telegram refuses it """
+        if self.takeoutSession is None:
+            return
+        with self.stats.measure('takeout'):
+            isStarted = self.loop.run_until_complete(self.takeoutSession.start())
+        if isStarted:
+            self.print('Takeout session started, history is fetched within it.')
+        else:
+            self.print('Telegram refused takeout session, go on with the normal session. {}', self.takeoutSession.refusal)
+            self.takeoutSession = None
+
+    def _finishTakeout(self, success: bool) -> None:
+        if self.takeoutSession is None or not self.takeoutSession.isOpen:
+            return
+        try:
+            with self.stats.measure('takeout'):
+                self.loop.run_until_complete(self.takeoutSession.finish(success))
+        except Exception as ex:  # pylint: disable=broad-except
+            self.logger.error('Failed to finish takeout session. %s', ex, exc_info=self.logger.level > logging.INFO)
+
+    def _savePeers(self, success: bool) -> None:
+        """ Persists resolved chats. The background walk of dialogs that is not done yet is waited
+            for up to 'PeerCache.walkTimeout' after a successful run, since a dump shorter than
+            the walk (e.g. a frequent --continue) would never let it finish otherwise.
+            It is dropped after a failed or interrupted run.
+        """
+        refresh, self._peerRefresh = self._peerRefresh, None
+        if refresh is not None and not refresh.done():
+            if success:
+                self.logger.debug('Wait for the walk of dialogs to finish.')
+                refresh = asyncio.wait_for(refresh, PeerCache.walkTimeout)
+            else:
+                refresh.cancel()
+            try:
+                self.loop.run_until_complete(refresh)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self.logger.debug('Walk of dialogs is not finished, resolved chats are refreshed next time.')
+        self.peers.save()
+
+    def _saveSenders(self) -> None:
+        senders = self.context.senders
+        self.logger.debug('Sender cache: %s hits, %s misses (%.1f%% hit rate).',
+                          senders.hits, senders.misses, senders.hitRate() * 100)
+        senders.save()
+
+    def _saveStats(self, rc: int) -> None:
+        """ Finishes statistics of the run and writes them into --stats and --prometheus files """
+        self.stats.finish(rc, self.output.totalSaved)
+        self._writeStats([self.stats])
+
+    def _writeStats(self, runs: list) -> None:
+        if not self.settings.statsFile and not self.settings.prometheusFile:
+            return
+        try:
+            RunStats.save(runs, self.settings.statsFile, self.settings.prometheusFile)
+        except OSError as ex:
+            self.logger.error('Failed to save run statistics. %s', ex)
+
     def _cnnect(self) -> None:
         """ Connect to the Telegram server and Authenticate. """
         self.print('Connecting to Telegram servers...')
@@ -136,11 +276,43 @@ class TelegramDumper(TelegramClient):
                     pw = getpass("Two step verification is enabled. Please enter your password: ")
                     selfUser = self.sign_in(password=pw)
 
-    def _getChannel(self) -> Channel:
+    def _getChannel(self, chatName: str = None) -> Channel:
         """ Returns telethon.tl.types.Channel object resolved from chat_name
-            at Telegram server
+            at Telegram server. Chats resolved before are taken from PeerCache.
+            :param chatName: chat to resolve, (Default: chat name from settings)
         """
-        name = self.settings.chatName
+        if chatName is None:
+            chatName = self.settings.chatName
+        channel = self._getCachedChannel(chatName)
+        if channel is None:
+            channel = self._resolveChannel(chatName)
+            self.peers.add(chatName, channel)
+        elif self.peers.isStale() and self._peerRefresh is None:
+            # Refresh the cache while the chat is dumped
+            self._peerRefresh = self.loop.create_task(self._walkDialogs())
+        return channel
+
+    def _getCachedChannel(self, chatName: str) -> Channel:
+        """ :return the chat the name was resolved into by the previous runs,
+                    None if it is not cached or no longer has the name
+        """
+        peer = self.peers.lookup(chatName)
+        if peer is None:
+            return None
+        try:
+            channel = self.get_entity(peer)
+        except (ValueError, RPCError) as ex:
+            self.logger.debug('Cached chat "%s" no longer resolves. %s', chatName, ex)
+            channel = None
+        if channel is None or not PeerCache.matches(chatName, channel):
+            self.peers.discard(chatName)
+            return None
+        self.print('Chat name "{}" resolved from cache into channel id={}', chatName, channel.id)
+        return channel
+
+    def _resolveChannel(self, chatName: str) -> Channel:
+        """ Resolves the chat at Telegram server, walking dialogs of the user if nothing else helps """
+        name = chatName
 
         # For private channуls try to resolve channel peer object from its invitation link
         # Note: it will only work if the login user has already joined the private channel.
@@ -153,7 +325,17 @@ class TelegramDumper(TelegramClient):
                     self.print('Invitation link "{}" resolved into channel id={}',name, peer.id)
                     return peer
             except ValueError as ex:
-                self.logger.debug( 'Failed to resolve "%s" as an invitation link. %s', self.settings.chatName, ex, exc_info=self.logger.level > logging.INFO)
+                self.logger.debug( 'Failed to resolve "%s" as an invitation link. %s', chatName, ex, exc_info=self.logger.level > logging.INFO)
+
+        if PeerCache.isChatId(name):
+            # A chat with neither username nor title, e.g. named so by SqliteDatabase.latest()
+            self.logger.debug('Trying to resolve as chat id.')
+            try:
+                peer = self.get_entity(int(name))
+                self.print('Chat id "{}" resolved into channel id={}', name, peer.id)
+                return peer
+            except (ValueError, RPCError) as ex:
+                self.logger.debug('Failed to resolve "%s" as chat id. %s', chatName, ex, exc_info=self.logger.level > logging.INFO)
 
         if name.startswith('@'):
             name = name[1:]
@@ -167,16 +349,14 @@ class TelegramDumper(TelegramClient):
                     self.print('User name "{}" resolved into channel id={}', name, peer.users[0].id )
                     return peer.users[0]
             except (UsernameNotOccupiedError, UsernameInvalidError) as ex:
-                self.logger.debug('Failed to resolve "%s" as @-chat-name. %s', self.settings.chatName, ex, exc_info=self.logger.level > logging.INFO)
+                self.logger.debug('Failed to resolve "%s" as @-chat-name. %s', chatName, ex, exc_info=self.logger.level > logging.INFO)
 
         # Search in dialogs first, this way we will find private groups and
         # channels.
-        self.logger.debug('Fetch loggedin user`s dialogs')
-        dialogs_count = self.get_dialogs(0).total
-        self.logger.info('%s user`s dialogs found', dialogs_count)
-        dialogs = self.get_dialogs(limit=None)
-        self.logger.debug('%s dialogs fetched.', len(dialogs))
-        for dialog in dialogs:
+        for dialog in self._getDialogs():
+            if PeerCache.isChatId(name) and utils.get_peer_id(dialog.entity) == int(name):
+                self.print('Chat id "{}" resolved into channel id={}', name, dialog.entity.id)
+                return dialog.entity
             if dialog.name == name:
                 self.print('Dialog title "{}" resolved into channel id={}', name, dialog.entity.id)
                 return dialog.entity
@@ -190,6 +370,28 @@ class TelegramDumper(TelegramClient):
 
         raise ValueError('Failed to resolve dialogue/chat name "{}".'.format(name))
 
+    def _getDialogs(self) -> list:
+        """ Returns all dialogs of the logged in user. They are fetched once per run """
+        if self.dialogs is None:
+            self.logger.debug('Fetch loggedin user`s dialogs')
+            dialogs_count = self.get_dialogs(0).total
+            self.logger.info('%s user`s dialogs found', dialogs_count)
+            self.dialogs = self.get_dialogs(limit=None)
+            self.logger.debug('%s dialogs fetched.', len(self.dialogs))
+            self.peers.addDialogs(self.dialogs)
+        return self.dialogs
+
+    async def _walkDialogs(self) -> None:
+        """ Refreshes resolved chats with all dialogs of the user """
+        try:
+            dialogs = await self.get_dialogs(limit=None)
+        except (RPCError, ConnectionError) as ex:
+            self.logger.debug('Failed to refresh resolved chats. %s', ex)
+            return
+        self.logger.debug('%s dialogs fetched, resolved chats refreshed.', len(dialogs))
+        self.dialogs = dialogs
+        self.peers.addDialogs(dialogs)
+
     def _fetch(self, peer, buffer : Deque[str]) -> int:
         """ Retrieves a number (100) of messages from Telegram's DC and adds them to 'buffer'.
             :param peer:        Chat/Channel object
@@ -205,45 +407,78 @@ class TelegramDumper(TelegramClient):
         for _ in range(0, 5):
             try:
                 # NOTE: Telethon will make 5 attempts to reconnect before failing
-                limit = 100
-                if self.messageToFetch > 1000:
-                    limit = 1000
-                messages = self.get_messages(peer, limit=limit, offset_id=self.idPageOffset)
+                limit = self.limiter.limit(self.messageToFetch)
+                # wait for a free slot to avoid flood ban
+                wait = self.limiter.reserve(limit)
+                if wait > 0:
+                    self.stats.add('pacing', wait)
+                sleep(wait)
+                started = time.monotonic()
+                messages = self.loop.run_until_complete(self.fetchMessages(
+                    peer, limit=limit, offset_id=self.idPageOffset,
+                    offset_date=self.settings.pageDate(self.idPageOffset, self.query is not None),
+                    reverse=self.settings.isAscending, **(self.query.kwargs() if self.query else {})))
+                latency = time.monotonic() - started
+                self.limiter.onSuccess(latency)
+                self.stats.page(latency, len(messages))
+                if self.query is not None and self.query.matched < 0:
+                    self.query.matched = messages.total
+                if self.archive is not None:
+                    with self.stats.measure('archive'):
+                        self.archive.add(messages)
                 if messages.total > 0 and messages:
                     self.print('{2:5} To Find - Fetch messages with ids {0:6} - {1:6} ...', messages[0].id, messages[-1].id , self.messageToFetch)
             except FloodWaitError as ex:
-                self.print('FloodWaitError detected. Sleep for {} sec before reconnecting! \n', ex.seconds)
-                sleep(ex.seconds)
-                self._cnnect()
+                self.print('FloodWaitError detected. Slow down and retry in {} sec.', ex.seconds)
+                self.limiter.onFlood(ex.seconds)
+                self.stats.add('flood-wait', ex.seconds)
                 continue
             break
 
-        idLastMessage = -1 \
-            if not messages or self.settings.idLastMessage >= messages[0].id \
-            else messages[0].id
+        idLastMessage = -1
+        if messages:
+            idNewest = self.settings.idNewest(messages)
+            if self.settings.idLastMessage < idNewest:
+                idLastMessage = idNewest
 
         # Iterate over all (in reverse order so the latest appear
-        # the last in the console) and print them with format provided by exporter.
+        # the last in the console) and pick the ones to dump.
+        started = time.monotonic()
+        selected = []
+        rejected = 0
         for msg in messages:
-            self.context.isFirst = (self.messageToFetch == 1)
-
-            if not self.filter.valid(msg):
+            bound = self.settings.dateBound(msg)
+            if bound > 0:
+                # Paging went past --since (--until in ascending mode)
+                self.messageToFetch = 0
+                break
+            if bound < 0:
+                self.idPageOffset = msg.id
+                continue
+            if not self.residual.valid(msg):
                 self.idPageOffset = msg.id
+                rejected += 1
                 continue
 
             if self.settings.idLastMessage >= msg.id:
                 self.messageToFetch = 0
                 break
 
-            msg_dump_str = self.exporter.format(msg, self.context)
-
-            buffer.append(msg_dump_str)
+            selected.append(msg)
 
             self.messageToFetch -= 1
             self.idPageOffset = msg.id
-            self.context.isLast = False
             if self.messageToFetch == 0:
                 break
+        self.stats.add('filter', time.monotonic() - started)
+        self.stats.count('messages-rejected', rejected)
+
+        # Format them with format provided by exporter
+        if selected:
+            self.context.isFirst = (self.messageToFetch == 0)
+            with self.stats.measure('format'):
+                buffer.extend(self.exporter.format_batch(selected, self.context))
+            self.context.isLast = False
 
         return idLastMessage
 
@@ -258,107 +493,142 @@ class TelegramDumper(TelegramClient):
 
              :return  Number of files that were saved into resulting file
         """
-        self.messageToFetch = self.settings.limit \
-            if self.settings.limit != -1\
-            and not self.settings.limit == 0\
-            and not self.settings.isIncremental\
-            else sys.maxsize
+        self.messageToFetch = self.settings.messageLimit()
+        self.idPageOffset = self.settings.firstPageOffset()
 
-        self._preconditions()
-
-        # Current buffer of messages, that will be batched into a temp file
-        # or otherwise written directly into the resulting file if there are too few of them
-        # to form a batch of size 1000.
-        buffer = deque()
+        if self.settings.isResumed:
+            self._resume()
+        else:
+            self._preconditions()
 
-        # Delete old metafile in Continue mode
-        if not self.settings.isIncremental:
-            self.chatMeta.delete()
+            # Delete old metafile in Continue mode
+            if not self.settings.isIncremental:
+                self.chatMeta.delete()
+            # Forget unfinished dump into the same file
+            self.output.discard()
+        self.stats.watch(self.settings.outFile)
 
-        tempMetaFiles = deque()  # a list of meta info about batches
+        if self.settings.isPushdown:
+            with self.stats.measure('pushdown'):
+                self._pushdown(peer)
 
         # process messages until either all message count requested by user are retrieved
         # or offset_id reaches msg_id=1 - the head of a channel message history
         try:
-            while self.messageToFetch > 0:
-                # slip for a few seconds to avoid flood ban
-                sleep(2)
-                latest_message_id_fetched = self._fetch(peer, buffer)
-                # This is for the case when buffer with fewer than 1000 records
-                # Relies on the fact that `_fetch_messages_from_server` returns messages
-                # in reverse order
-                if self.idLastMessage < latest_message_id_fetched:
-                    self.idLastMessage = latest_message_id_fetched
-                # when buffer is full, flush it into a temp file
-                # Assume that once a message got into temp file it will be counted as successful
-                # 'output_total_count'. This has to be improved.
-                if len(buffer) >= 1000:
-                    self._saveTempFile(buffer)
-                    tempMetaFiles.append(latest_message_id_fetched)
-
-                # break if the very beginning of channel history is reached
-                if latest_message_id_fetched == -1 or self.idPageOffset <= 1:
-                    break
+            if self.settings.isPipelined or self.settings.isParallel():
+                self._dumpPipelined(peer)
+            else:
+                self._dumpSerial(peer)
         except RuntimeError as ex:
             self.print('Fetching messages from server failed. {}',str(ex))
             self.print('Warn: The resulting file will contain partial/incomplete data.')
 
+        if self.query is not None and self.query.matched >= 0:
+            self.print('Telegram search matched {} of {} messages, about {} pages were not fetched.',
+                       self.query.matched, self.query.total, self.query.savedPages(self.limiter.pageSize))
+
         # Write all chunks into resulting file
         self.print('Merging results into an output file.')
         try:
-            self._saveFinalFile(buffer, tempMetaFiles)
+            self.idLastMessage = self.output.save(self.idLastMessage)
         except OSError as ex:
             raise DumpingError("Dumping to a final file failed.") from ex
 
-        data = {}
-        data[ChatDumpMetaFile.key_chatName      ] = self.settings.chatName
-        data[ChatDumpMetaFile.key_LastMessageId ] = self.idLastMessage
-        data[ChatDumpMetaFile.key_exporter      ] = self.settings.exporter
-        data[ChatDumpMetaFile.key_exporterConfig] = self.settings.exporterConfig
-        data[ChatDumpMetaFile.key_filter        ] = self.settings.filter
-        self.chatMeta.save(data)
-
-    def _saveTempFile(self, buffer : Deque[str]) -> None:
-        """ Flush buffer into a new temp file """
-        with tempfile.NamedTemporaryFile(mode='w+', encoding='utf-8', delete=False) as ff:
-            self.totalSaved += self._saveFile(ff, buffer)
-            self.tempFiles.append(ff)
-
-    def _saveFile(self, outFile: TextIO, buffer: Deque[str]) -> int:
-        """ Flush buffer into a file stream """
-        count = 0
-        while buffer:
-            count += 1
-            cur_message = buffer.pop()
-            print(cur_message, file=outFile)
-        return count
-
-    def _saveFinalFile(self, buffer : Deque[str], temp_files_list_meta : Deque[str]) -> None:
-        result_file_mode = 'a' if self.settings.idLastMessage > -1 else 'w'
-        with codecs.open(self.settings.outFile, result_file_mode, 'utf-8') as ff:
-            if self.settings.isAddbom:
-                ff.write(codecs.BOM_UTF8.decode())
-
-            self.exporter.begin_final_file(ff, self.context)
-            # flush what's left in the mem buffer into resulting file
-            self.totalSaved += self._saveFile(ff, buffer)
-            self._mergeToFinalFile(ff, temp_files_list_meta)
-
-    def _mergeToFinalFile(self, outFile : TextIO, temp_files_list_meta : Deque[str]) -> None:
-        """ merge all temp files into final one and delete them """
-        while self.tempFiles:
-            tf = self.tempFiles.pop()
-            with codecs.open(tf.name, 'r', 'utf-8') as ctf:
-                for line in ctf.readlines():
-                    print(line, file=outFile, end='')
-            # delete temp file
-            self.logger.debug("Delete temp file %s", tf.name)
-            tf.close()
-            os.remove(tf.name)
-            # update the latest_message_id metadata
-            batch_latest_message_id = temp_files_list_meta.pop()
-            if batch_latest_message_id > self.idLastMessage:
-                self.idLastMessage = batch_latest_message_id
+        self.chatMeta.update(self.settings, self.idLastMessage)
+
+    def _dumpSerial(self, peer) -> None:
+        """ Fetches pages one by one, formatting and buffering each before fetching the next """
+        buffer = self.output.buffer
+        while self.messageToFetch > 0:
+            latest_message_id_fetched = self._fetch(peer, buffer)
+            # This is for the case when buffer with fewer than 1000 records
+            # Relies on the fact that `_fetch_messages_from_server` returns messages
+            # in reverse order
+            if self.idLastMessage < latest_message_id_fetched:
+                self.idLastMessage = latest_message_id_fetched
+            # when buffer is full, flush it into a temp file (or resulting file in ascending mode)
+            # Assume that once a message got into temp file it will be counted as successful
+            # 'output_total_count'. This has to be improved.
+            if self.output.isFull():
+                self.output.spill(latest_message_id_fetched, self.idPageOffset, self.messageToFetch)
+
+            # break if the very beginning of channel history is reached
+            if latest_message_id_fetched == -1 or self.idPageOffset <= 1:
+                break
+
+    def _dumpPipelined(self, peer) -> None:
+        """ Fetches, formats and writes pages concurrently using asyncio engine,
+            from several id ranges at a time with --parallel
+        """
+        pipelineType = RangePipeline if self.settings.isParallel() else DumpPipeline
+        pipeline = pipelineType(self, peer, self.settings, self.exporter, self.residual, self.context,
+                                self.output, self.limiter, self.query, self.archive)
+        self._runInterruptible(pipeline.run(self.messageToFetch, self.idPageOffset))
+        if self.idLastMessage < pipeline.idLastMessage:
+            self.idLastMessage = pipeline.idLastMessage
+        self.print('{} messages dumped at {:.1f} msg/sec.', pipeline.totalWritten, pipeline.rate)
+
+    def _runInterruptible(self, coro) -> None:
+        """ Runs coroutine until it is complete. When interrupted, it is cancelled and waited for,
+            so the output calls it has in flight are finished before the output is cleaned up
+        """
+        running = self.loop.create_task(coro)
+        try:
+            self.loop.run_until_complete(running)
+        except KeyboardInterrupt:
+            running.cancel()
+            self.loop.run_until_complete(asyncio.gather(running, return_exceptions=True))
+            raise
+
+    def _follow(self, follower: FollowPipeline) -> None:
+        """ Appends new messages of the chat as they come, until interrupted """
+        self.print('Following new messages of the chat, press Ctrl+C to stop.')
+        running = self.loop.create_task(follower.run(self.idLastMessage))
+        try:
+            self.loop.run_until_complete(running)
+        except KeyboardInterrupt:
+            # What was received before the interrupt still goes into the resulting file
+            self.loop.run_until_complete(follower.stop(running))
+        finally:
+            follower.unsubscribe()
+        self.print('{} new messages appended while following the chat.', follower.totalWritten)
+
+    def _pushdown(self, peer) -> None:
+        """ Lets Telegram search evaluate the part of the filter it can """
+        query, residual = self.filter.pushdown()
+        if query is None:
+            return
+        try:
+            self.loop.run_until_complete(query.resolve(self, peer))
+        except ValueError as ex:
+            self.logger.info('Filter is checked locally. %s', ex)
+            return
+        self.query, self.residual = query, residual
+        self.print('Filter pushed down to Telegram search: {}', query)
+
+    def _download(self, downloader: MediaDownloader) -> None:
+        """ Downloads documents that went into resulting file """
+        self.print('Downloading {} documents into "{}" ...', downloader.pending,
+                   self.settings.storeDir or self.settings.downloadDir)
+        started = time.monotonic()
+        self.loop.run_until_complete(downloader.run())
+        self.stats.add('download', time.monotonic() - started, bytes=downloader.bytesDownloaded)
+        self.print('{} documents downloaded ({:.1f} MB), {} already existed, {} failed.',
+                   downloader.totalDownloaded, downloader.bytesDownloaded / (1024 * 1024),
+                   downloader.totalSkipped, downloader.totalFailed)
+
+    def _resume(self) -> None:
+        """ Restore progress of the interrupted dump from checkpoint """
+        try:
+            data = self.output.resume()
+        except OSError as ex:
+            raise DumpingError('Unable to resume the dump. {}'.format(ex)) from ex
+        self.idPageOffset   = data[ChatDumpCheckpoint.key_pageOffset]
+        self.messageToFetch = data[ChatDumpCheckpoint.key_messageToFetch]
+        if self.idLastMessage < self.output.idLatest:
+            self.idLastMessage = self.output.idLatest
+        self.print('Resuming dump into "{}" file from message id {}, {} messages already saved.',
+                   self.settings.outFile, self.idPageOffset, self.output.totalSaved)
 
     def _preconditions(self) -> None:
         """ Check preconditions before processing data """
@@ -379,8 +649,7 @@ class TelegramDumper(TelegramClient):
                     raise DumpingError("Terminating on user's request...")
             # Check if output file can be created/overwritten
             try:
-                with open(out_file_path, mode='w+'):
-                    pass
+                self.exporter.open_final_file(out_file_path, 'w').close()
             except OSError as ex:
                 msg = 'Output file path "{}" is invalid. {}'.format(out_file_path, ex.strerror)
                 raise DumpingError(msg)
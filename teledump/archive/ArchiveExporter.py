@@ -0,0 +1,143 @@
+""" This Module contains offline export of archived messages """
+
+import itertools
+import logging
+import os.path
+import sys
+import time
+
+from ..exceptions import DumpingError
+from ..exceptions import MetaFileError
+from ..exporters import Exporter
+from ..exporters import ExporterContext
+from ..exporters import SenderCache
+from ..filters import Filter
+from ..output import ChatDumpOutput
+from ..settings import ChatDumpMetaFile
+from ..settings import ChatDumpSettings
+from ..stats import RunStats
+from .MessageArchive import MessageArchive
+
+
+class ArchiveExporter:
+    """ Feeds messages of MessageArchive through exporter and filter into resulting file
+        the same way TelegramDumper does with fetched ones, without connecting to Telegram.
+    """
+    # Messages formatted at a time, like a page fetched from Telegram
+    pageSize : int = 100
+
+    def __init__(self, settings: ChatDumpSettings, chatMeta: ChatDumpMetaFile, exporter: Exporter, filter: Filter):
+        self.logger = logging.getLogger(__name__)
+        self.settings : ChatDumpSettings = settings
+        self.chatMeta : ChatDumpMetaFile = chatMeta
+        self.exporter : Exporter = exporter
+        self.filter   : Filter = filter
+
+        self.context : ExporterContext = ExporterContext()
+        self.context.senders = SenderCache(self.settings.senderCacheFile)
+        self.filter.setSenders(self.context.senders)
+        self.context.stats = RunStats(self.settings.chatName, self.settings.exporter)
+        self.stats : RunStats = self.context.stats
+        self.output  : ChatDumpOutput = ChatDumpOutput(self.settings, self.exporter, self.context)
+
+    def run(self) -> int:
+        """ Exports archived messages into a file """
+        rc = 0
+        try:
+            archive = MessageArchive(self.settings.archiveSource)
+            if not os.path.isdir(archive.root):
+                raise DumpingError('Archive "{}" does not exist.'.format(archive.root))
+            archive.open()
+            self.context.senders.load()
+            try:
+                if not self.settings.chatName:
+                    self.settings.chatName = archive.chatName()
+                self._export(archive)
+            finally:
+                archive.close()
+                self.context.senders.save()
+        except (DumpingError, MetaFileError) as ex:
+            self.logger.error('%s', ex, exc_info=self.logger.level > logging.INFO)
+            rc = 1
+        except KeyboardInterrupt:
+            self.print("Received a user's request to interrupt, stopping…")
+            rc = 1
+        finally:
+            self.output.cleanup()
+            self._saveStats(rc)
+        self.print('{} messages were successfully written in the resulting file. Done!', self.output.totalSaved)
+        return rc
+
+    def print(self, msg: str, *args) -> None:
+        """ Safe Print (handle UnicodeEncodeErrors on some terminals), silent with --quiet """
+        if self.settings.isQuiet:
+            return
+        msg = msg.format(*args)
+        try:
+            print(msg)
+        except UnicodeEncodeError:
+            print(msg.encode('utf-8', errors='ignore').decode('ascii', errors='ignore'))
+
+    def _saveStats(self, rc: int) -> None:
+        self.stats.chat = self.settings.chatName
+        self.stats.finish(rc, self.output.totalSaved)
+        if not self.settings.statsFile and not self.settings.prometheusFile:
+            return
+        try:
+            RunStats.save([self.stats], self.settings.statsFile, self.settings.prometheusFile)
+        except OSError as ex:
+            self.logger.error('Failed to save run statistics. %s', ex)
+
+    def _export(self, archive: MessageArchive) -> None:
+        try:
+            self.exporter.open_final_file(self.settings.outFile, 'w').close()
+        except OSError as ex:
+            raise DumpingError('Output file path "{}" is invalid. {}'.format(self.settings.outFile, ex.strerror))
+        self.chatMeta.delete()
+        self.output.discard()
+        self.stats.watch(self.settings.outFile)
+        self.print('Exporting {} archived messages into "{}" file ...', len(archive.messages), self.settings.outFile)
+
+        messageToFetch = self.settings.messageLimit()
+        idLastMessage = -1
+        idLatest = -1
+        messages = archive.iterate(descending=not self.settings.isAscending)
+        while messageToFetch > 0:
+            page = list(itertools.islice(messages, self.pageSize))
+            if not page:
+                break
+            # The newest of the pages so far, whichever order they come in
+            idLastMessage = max(idLastMessage, self.settings.idNewest(page))
+            idLatest = max(idLatest, self.settings.idNewest(page))
+            self.stats.count('messages-fetched', len(page))
+            started = time.monotonic()
+            selected = []
+            rejected = 0
+            for msg in page:
+                # Archived messages are bounded by --since/--until locally
+                if self.settings.dateBound(msg) != 0:
+                    continue
+                if not self.filter.valid(msg):
+                    rejected += 1
+                    continue
+                selected.append(msg)
+                messageToFetch -= 1
+                if messageToFetch == 0:
+                    break
+            self.stats.add('filter', time.monotonic() - started)
+            self.stats.count('messages-rejected', rejected)
+            if selected:
+                self.context.isFirst = (messageToFetch == 0)
+                with self.stats.measure('format'):
+                    self.output.buffer.extend(self.exporter.format_batch(selected, self.context))
+                self.context.isLast = False
+            if messageToFetch > 0 and self.output.isFull():
+                self.output.spill(idLatest, page[-1].id, messageToFetch)
+                idLatest = -1
+        messages.close()
+
+        try:
+            idLastMessage = self.output.save(idLastMessage)
+        except OSError as ex:
+            raise DumpingError("Exporting to a final file failed.") from ex
+        self.chatMeta.update(self.settings, idLastMessage)
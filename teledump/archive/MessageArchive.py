@@ -0,0 +1,234 @@
+""" This Module contains append-only archive of raw Telegram messages """
+
+import codecs
+import glob
+import json
+import logging
+import os
+import os.path
+import re
+import struct
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Tuple
+
+from telethon import utils
+from telethon.extensions import BinaryReader
+from telethon.tl.custom.message import Message
+
+from ..exceptions import DumpingError
+
+
+class MessageArchive:
+    """ Keeps serialized Telegram messages of one chat along with their senders and chats,
+        so they can be exported again without fetching them.
+
+        <root>/segment-NNNNN.tl   records: kind (1 byte), id (8 bytes), length (4 bytes), TL bytes
+        <root>/index.bin          entries: kind, id, segment number, offset of the record
+        <root>/chat.json          {"peer-id": <marked id of the chat>}, written when the archive is created
+
+        Files are only appended to. A new segment is started when the current one exceeds
+        'segmentSize' bytes. Records past the last valid index entry (left by a crash)
+        are dropped when the archive is opened. A message is archived once,
+        an entity is written again when it is seen in a later run, the latest copy wins.
+    """
+    segmentSize : int = 64 * 1024 * 1024
+
+    key_peerId : str = 'peer-id'
+
+    KIND_MESSAGE : int = 1
+    KIND_ENTITY  : int = 2
+
+    _RECORD = struct.Struct('<BqI')
+    _ENTRY  = struct.Struct('<BqIQ')
+
+    def __init__(self, root: str):
+        self.logger = logging.getLogger(__name__)
+        self.root : str = root
+        # Marked id of the chat the archive keeps, None if it is not known yet
+        self.peerId : int = None
+
+        # (segment, offset) of every archived message and entity by id
+        self.messages : Dict[int, Tuple[int, int]] = {}
+        self.entities : Dict[int, Tuple[int, int]] = {}
+        # Messages archived during this run
+        self.totalAdded : int = 0
+
+        self._segment : int = 0
+        self._segmentFile = None
+        self._indexFile = None
+        # Entities written during this run
+        self._fresh : set = set()
+
+    def open(self, peerId: int = None) -> 'MessageArchive':
+        """ Loads index, repairs the tail left by an interrupted run
+            :param peerId: marked id of the chat to archive, the archive is bound to it if it is not yet
+            :raise DumpingError: if the archive keeps messages of another chat
+        """
+        os.makedirs(self.root, exist_ok=True)
+        self._bind(peerId)
+        indexPath = os.path.join(self.root, 'index.bin')
+        segments = self._segments()
+        sizes = {number: os.path.getsize(path) for number, path in segments}
+
+        valid = 0
+        ends : Dict[int, int] = {}
+        if os.path.exists(indexPath):
+            with open(indexPath, 'rb') as ff:
+                data = ff.read()
+            readers = {}
+            try:
+                for pos in range(0, len(data) - self._ENTRY.size + 1, self._ENTRY.size):
+                    kind, id, segment, offset = self._ENTRY.unpack_from(data, pos)
+                    end = self._recordEnd(readers, segment, offset, sizes.get(segment, 0))
+                    if end is None:
+                        break
+                    (self.messages if kind == self.KIND_MESSAGE else self.entities)[id] = (segment, offset)
+                    ends[segment] = max(ends.get(segment, 0), end)
+                    valid = pos + self._ENTRY.size
+            finally:
+                for ff in readers.values():
+                    ff.close()
+            if valid != len(data):
+                self.logger.info('Archive index has %s bytes of an interrupted run, drop them.', len(data) - valid)
+
+        # Drop records that did not make it into the index
+        for number, path in segments:
+            if sizes[number] != ends.get(number, 0):
+                with open(path, 'r+b') as ff:
+                    ff.truncate(ends.get(number, 0))
+
+        self._indexFile = open(indexPath, 'r+b' if os.path.exists(indexPath) else 'wb')
+        self._indexFile.truncate(valid)
+        self._indexFile.seek(valid)
+        self._segment = segments[-1][0] if segments else 0
+        self._segmentFile = open(self._segmentPath(self._segment), 'ab')
+        return self
+
+    def add(self, messages: List[Message]) -> int:
+        """ Appends messages that are not archived yet, along with their senders and chats.
+            :return number of messages added
+        """
+        entries = []
+        added = 0
+        for msg in messages:
+            if self.peerId is not None and utils.get_peer_id(msg.peer_id) != self.peerId:
+                raise DumpingError('Message {} of chat {} does not belong to archive "{}" of chat {}.'.format(
+                    msg.id, utils.get_peer_id(msg.peer_id), self.root, self.peerId))
+            if msg.id in self.messages:
+                continue
+            for entity in (getattr(msg, 'sender', None), getattr(msg, 'chat', None)):
+                if entity is None:
+                    continue
+                peerId = utils.get_peer_id(entity)
+                if peerId not in self._fresh:
+                    self._fresh.add(peerId)
+                    entries.append(self._write(self.KIND_ENTITY, peerId, bytes(entity)))
+            entries.append(self._write(self.KIND_MESSAGE, msg.id, bytes(msg)))
+            added += 1
+
+        if entries:
+            # records reach the file before the index entries that refer to them
+            self._segmentFile.flush()
+            for kind, id, segment, offset in entries:
+                self._indexFile.write(self._ENTRY.pack(kind, id, segment, offset))
+                (self.messages if kind == self.KIND_MESSAGE else self.entities)[id] = (segment, offset)
+            self._indexFile.flush()
+        self.totalAdded += added
+        return added
+
+    def close(self) -> None:
+        for ff in (self._segmentFile, self._indexFile):
+            if ff is not None:
+                ff.flush()
+                os.fsync(ff.fileno())
+                ff.close()
+        self._segmentFile = self._indexFile = None
+
+    def iterate(self, descending: bool = True) -> Iterator[Message]:
+        """ Yields archived messages ordered by id with their senders and chats attached """
+        readers = {}
+        try:
+            entities = {}
+            for peerId, (segment, offset) in self.entities.items():
+                entities[peerId] = self._read(readers, segment, offset)
+            for id in sorted(self.messages, reverse=descending):
+                segment, offset = self.messages[id]
+                msg = self._read(readers, segment, offset)
+                msg._sender = entities.get(msg.sender_id)
+                msg._chat = entities.get(msg.chat_id)
+                yield msg
+        finally:
+            for ff in readers.values():
+                ff.close()
+
+    def chatName(self) -> str:
+        """ Name of the chat the archived messages belong to, resolvable by the dumper """
+        for msg in self.iterate():
+            chat = msg.chat
+            if chat is not None:
+                username = getattr(chat, 'username', None)
+                return '@' + username if username else getattr(chat, 'title', '')
+        return ''
+
+    def _bind(self, peerId: int) -> None:
+        """ Reads the chat of the archive, or records 'peerId' as one of a new archive """
+        path = os.path.join(self.root, 'chat.json')
+        try:
+            with codecs.open(path, 'r', 'utf-8') as ff:
+                self.peerId = int(json.load(ff)[MessageArchive.key_peerId])
+        except FileNotFoundError:
+            self.peerId = None
+        except (OSError, ValueError, KeyError, TypeError) as ex:
+            raise DumpingError('Unable to read the chat of archive "{}". {}'.format(self.root, ex)) from ex
+        if peerId is None or self.peerId == peerId:
+            return
+        if self.peerId is not None:
+            raise DumpingError('Archive "{}" keeps messages of chat {}, not of chat {}.'.format(
+                self.root, self.peerId, peerId))
+        with codecs.open(path + '.tmp', 'w', 'utf-8') as ff:
+            json.dump({MessageArchive.key_peerId: peerId}, ff)
+        os.replace(path + '.tmp', path)
+        self.peerId = peerId
+
+    def _write(self, kind: int, id: int, data: bytes) -> Tuple[int, int, int, int]:
+        if self._segmentFile.tell() >= self.segmentSize:
+            self._segmentFile.close()
+            self._segment += 1
+            self._segmentFile = open(self._segmentPath(self._segment), 'ab')
+        offset = self._segmentFile.tell()
+        self._segmentFile.write(self._RECORD.pack(kind, id, len(data)))
+        self._segmentFile.write(data)
+        return kind, id, self._segment, offset
+
+    def _read(self, readers: dict, segment: int, offset: int):
+        ff = readers.get(segment)
+        if ff is None:
+            ff = readers[segment] = open(self._segmentPath(segment), 'rb')
+        ff.seek(offset)
+        _, _, length = self._RECORD.unpack(ff.read(self._RECORD.size))
+        return BinaryReader(ff.read(length)).tgread_object()
+
+    def _recordEnd(self, readers: dict, segment: int, offset: int, size: int) -> int:
+        """ :return end of the record, or None if it is not entirely in the segment """
+        if offset + self._RECORD.size > size:
+            return None
+        ff = readers.get(segment)
+        if ff is None:
+            ff = readers[segment] = open(self._segmentPath(segment), 'rb')
+        ff.seek(offset)
+        _, _, length = self._RECORD.unpack(ff.read(self._RECORD.size))
+        end = offset + self._RECORD.size + length
+        return end if end <= size else None
+
+    def _segmentPath(self, number: int) -> str:
+        return os.path.join(self.root, 'segment-{:05d}.tl'.format(number))
+
+    def _segments(self) -> List[Tuple[int, str]]:
+        segments = []
+        for path in glob.glob(os.path.join(glob.escape(self.root), 'segment-*.tl')):
+            match = re.match(r'segment-(\d+)\.tl$', os.path.basename(path))
+            if match:
+                segments.append((int(match.group(1)), path))
+        return sorted(segments)
@@ -0,0 +1,2 @@
+from .MessageArchive import MessageArchive
+from .ArchiveExporter import ArchiveExporter
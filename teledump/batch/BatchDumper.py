@@ -0,0 +1,96 @@
+""" This Module contains the dumper of many chats over one session """
+
+import asyncio
+import logging
+from typing import List
+
+from ..TelegramDumper import TelegramDumper
+from ..settings import ChatDumpSettings
+from .BatchJob import BatchJob
+
+
+class BatchDumper(TelegramDumper):
+    """ Authenticates once and dumps all chats of a manifest concurrently.
+        At most 'settings.jobs' chats are dumped at a time, all of them share one rate limiter.
+        Documents exported by media exporters are downloaded when all chats are dumped.
+    """
+
+    def __init__(self, session_user_id, settings: ChatDumpSettings, jobs: List[BatchJob]):
+        super().__init__(session_user_id, settings, None, None, None)
+        self.jobs : List[BatchJob] = jobs
+        # Session wide stages, such as connect and download, are kept apart from the ones of chats
+        self.stats.chat = settings.batchFile
+        self.stats.exporter = ''
+        # One downloader for all chats, so a document forwarded into many of them is fetched once.
+        # One sender cache, as the same people post in many chats
+        for job in self.jobs:
+            job.context.downloader = self.context.downloader
+            job.context.senders    = self.context.senders
+            job.filter.setSenders(self.context.senders)
+
+    def run(self) -> int:
+        """ Dumps all chats of the manifest """
+        rc = 0
+        self.limiter.load()
+        self.peers.load()
+        self.context.senders.load()
+        try:
+            with self.stats.measure('connect'):
+                self._cnnect()
+            self._startTakeout()
+            for job in self.jobs:
+                try:
+                    with job.context.stats.measure('resolve'):
+                        job.peer = self._getChannel(job.settings.chatName)
+                except ValueError as ex:
+                    job.error = str(ex)
+            self._runInterruptible(self._dumpAll())
+            if self.context.downloader is not None:
+                self._download(self.context.downloader)
+        except KeyboardInterrupt:
+            self.print("Received a user's request to interrupt, stopping…")
+            rc = 1
+        except Exception as ex:  # pylint: disable=broad-except
+            self.logger.error('Uncaught exception occured. %s', ex, exc_info=self.logger.level > logging.INFO)
+            rc = 1
+        finally:
+            self._finishTakeout(rc == 0 and not any(job.error for job in self.jobs))
+            for job in self.jobs:
+                job.output.cleanup()
+            self.limiter.save()
+            self._savePeers(rc == 0)
+            self._saveSenders()
+            self._saveStats(rc)
+
+        self._summary()
+        if any(job.error for job in self.jobs):
+            rc = 1
+        return rc
+
+    async def _dumpAll(self) -> None:
+        semaphore = asyncio.Semaphore(self.settings.jobs)
+
+        async def dump(job: BatchJob) -> None:
+            async with semaphore:
+                self.print('Dumping "{}" into "{}" file ...', job.settings.chatName, job.settings.outFile)
+                await job.run(self, self.limiter)
+
+        await asyncio.gather(*[dump(job) for job in self.jobs if job.error is None])
+
+    def _saveStats(self, rc: int) -> None:
+        """ Writes statistics of the session followed by the ones of every chat """
+        for job in self.jobs:
+            if not job.context.stats.finished:
+                # The chat was never dumped, e.g. it was not resolved
+                job.context.stats.finish(int(job.error is not None), job.output.totalSaved)
+        self.stats.finish(rc, sum(job.output.totalSaved for job in self.jobs))
+        self._writeStats([self.stats] + [job.context.stats for job in self.jobs])
+
+    def _summary(self) -> None:
+        self.print('{:<32} {:>10} {:>8} {:>10}  {}', 'Chat', 'Messages', 'Sec', 'Msg/sec', 'Status')
+        for job in self.jobs:
+            self.print('{:<32} {:>10} {:>8.1f} {:>10.1f}  {}',
+                       job.settings.chatName[:32], job.output.totalSaved, job.elapsed, job.rate,
+                       'OK' if job.error is None else 'FAILED: ' + job.error)
+        failed = sum(1 for job in self.jobs if job.error)
+        self.print('{} of {} chats were dumped. {} failed.', len(self.jobs) - failed, len(self.jobs), failed)
@@ -0,0 +1,111 @@
+""" This Module contains a single chat dump of a batch run """
+
+import asyncio
+import logging
+import os.path
+import time
+from typing import Tuple
+
+from telethon import TelegramClient
+
+from ..exceptions import DumpingError
+from ..exporters import Exporter
+from ..exporters import ExporterContext
+from ..filters import Filter
+from ..filters import SearchQuery
+from ..network import RateLimiter
+from ..output import ChatDumpOutput
+from ..pipeline import DumpPipeline
+from ..pipeline import RangePipeline
+from ..settings import ChatDumpMetaFile
+from ..settings import ChatDumpSettings
+from ..stats import RunStats
+
+
+class BatchJob:
+    """ Dumps one chat of a batch into its own output and .meta files """
+
+    def __init__(self, settings: ChatDumpSettings, chatMeta: ChatDumpMetaFile, exporter: Exporter, filter: Filter):
+        self.logger = logging.getLogger(__name__)
+        self.settings : ChatDumpSettings = settings
+        self.chatMeta : ChatDumpMetaFile = chatMeta
+        self.exporter : Exporter = exporter
+        self.filter   : Filter = filter
+
+        self.context : ExporterContext = ExporterContext()
+        self.context.isContinue = self.settings.isIncremental
+        self.context.stats = RunStats(self.settings.chatName, self.settings.exporter)
+        self.output  : ChatDumpOutput = ChatDumpOutput(self.settings, self.exporter, self.context)
+
+        # Resolved Chat/Channel object
+        self.peer = None
+        # The reason the job failed or None
+        self.error : str = None
+        # Time spent on dumping, seconds
+        self.elapsed : float = 0.0
+
+    async def run(self, client: TelegramClient, limiter: RateLimiter) -> None:
+        """ Dumps the chat, records failure instead of raising it """
+        started = time.monotonic()
+        try:
+            self._preconditions()
+            self.context.stats.watch(self.settings.outFile)
+            if self.settings.isPushdown:
+                with self.context.stats.measure('pushdown'):
+                    query, residual = await self._pushdown(client)
+            else:
+                query, residual = None, self.filter
+            pipelineType = RangePipeline if self.settings.isParallel() else DumpPipeline
+            pipeline = pipelineType(client, self.peer, self.settings, self.exporter, residual, self.context,
+                                    self.output, limiter, query)
+            await pipeline.run(self.settings.messageLimit(), self.settings.firstPageOffset())
+            if query is not None and query.matched >= 0:
+                self.logger.info('"%s": Telegram search matched %s of %s messages, about %s pages were not fetched.',
+                                 self.settings.chatName, query.matched, query.total,
+                                 query.savedPages(limiter.pageSize))
+            loop = asyncio.get_event_loop()
+            idLastMessage = await loop.run_in_executor(None, self.output.save, pipeline.idLastMessage)
+            self.chatMeta.update(self.settings, idLastMessage)
+        except asyncio.CancelledError:
+            self.error = 'Cancelled'
+            raise
+        except Exception as ex:  # pylint: disable=broad-except
+            self.error = str(ex)
+            self.logger.error('Failed to dump "%s". %s', self.settings.chatName, ex,
+                              exc_info=self.logger.level > logging.INFO)
+        finally:
+            self.elapsed = time.monotonic() - started
+            self.output.cleanup()
+            self.context.stats.finish(int(self.error is not None), self.output.totalSaved)
+
+    async def _pushdown(self, client: TelegramClient) -> Tuple[SearchQuery, Filter]:
+        """ Splits the filter into Telegram search query and residual filter """
+        query, residual = self.filter.pushdown()
+        if query is None:
+            return None, self.filter
+        try:
+            await query.resolve(client, self.peer)
+        except ValueError as ex:
+            self.logger.info('"%s": filter is checked locally. %s', self.settings.chatName, ex)
+            return None, self.filter
+        self.logger.info('"%s": filter pushed down to Telegram search: %s', self.settings.chatName, query)
+        return query, residual
+
+    def _preconditions(self) -> None:
+        """ Check preconditions before processing data. Never asks user for confirmation """
+        out_file_path = self.settings.outFile
+        if self.settings.isIncremental:
+            if not os.path.exists(out_file_path):
+                raise DumpingError('Output file does not exist. Path="{}"'.format(out_file_path))
+            return
+        try:
+            self.exporter.open_final_file(out_file_path, 'w').close()
+        except OSError as ex:
+            raise DumpingError('Output file path "{}" is invalid. {}'.format(out_file_path, ex.strerror))
+        self.chatMeta.delete()
+        self.output.discard()
+
+    @property
+    def rate(self) -> float:
+        """ Messages written per second """
+        return self.output.totalSaved / self.elapsed if self.elapsed > 0 else 0.0
@@ -0,0 +1,152 @@
+""" This Module contains classes related to batch manifest files"""
+
+import codecs
+import copy
+import json
+import logging
+from typing import List
+
+from .. import exporters
+from .. import filters
+from ..exceptions import FilterError
+from ..exceptions import ManifestError
+from ..exceptions import MetaFileError
+from ..filters.expr.Predicates import parseDate
+from ..settings import ChatDumpMetaFile
+from ..settings import ChatDumpSettings
+from ..utils import Compression
+from .BatchJob import BatchJob
+
+
+class BatchManifest:
+    """ Loads a list of chats to dump in one run.
+        The manifest is a JSON array of objects, one per chat:
+            [
+                {"chat": "@python", "out": "python.log", "exporter": "jsonl"},
+                {"chat": "@news", "exporter": "media", "expdata": "file,size>1000"},
+                {"out": "python.log", "continue": true}
+            ]
+        Keys "chat", "out", "exporter", "expdata", "filter", "limit", "since" and "until" have the same
+        meaning as the CLI settings. "continue" is either true (settings are taken from .meta file)
+        or the last dumped message id.
+    """
+    key_chat     : str = 'chat'
+    key_out      : str = 'out'
+    key_exporter : str = 'exporter'
+    key_expdata  : str = 'expdata'
+    key_filter   : str = 'filter'
+    key_limit    : str = 'limit'
+    key_since    : str = 'since'
+    key_until    : str = 'until'
+    key_continue : str = 'continue'
+
+    def __init__(self, path: str):
+        self._logger : logging.Logger = logging.getLogger(__name__)
+        self._path : str = path
+
+    def load(self, settings: ChatDumpSettings) -> List[BatchJob]:
+        """ Creates a job per manifest entry. Unspecified entry settings are taken from 'settings' """
+        try:
+            self._logger.debug('Load manifest %s.', self._path)
+            with codecs.open(self._path, 'r', 'utf-8') as ff:
+                entries = json.load(ff)
+        except OSError as ex:
+            msg = 'Unable to open the manifest file "{}". {}'.format(self._path, ex.strerror)
+            raise ManifestError(msg) from ex
+        except ValueError as ex:
+            msg = 'Unable to load the manifest file "{}". {}'.format(self._path, ex)
+            raise ManifestError(msg) from ex
+
+        if not isinstance(entries, list) or not entries:
+            raise ManifestError('The manifest file "{}" must contain a non-empty array.'.format(self._path))
+
+        jobs = []
+        outFiles = set()
+        for index, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                raise ManifestError('Manifest entry #{} is not an object.'.format(index))
+            job = self._job(index, entry, settings)
+            if job.settings.outFile in outFiles:
+                raise ManifestError('Manifest entry #{} writes into "{}" file twice.'.format(index, job.settings.outFile))
+            outFiles.add(job.settings.outFile)
+            jobs.append(job)
+        return jobs
+
+    def _job(self, index: int, entry: dict, defaults: ChatDumpSettings) -> BatchJob:
+        settings = copy.copy(defaults)
+        settings.chatName       = str(entry.get(BatchManifest.key_chat, '')).strip()
+        settings.outFile        = str(entry.get(BatchManifest.key_out, '')).strip()
+        settings.exporter       = exporters.fallback(str(entry.get(BatchManifest.key_exporter, '')).strip())
+        settings.exporterConfig = str(entry.get(BatchManifest.key_expdata, ''))
+        settings.filter         = str(entry.get(BatchManifest.key_filter, '')).strip()
+        settings.limit          = entry.get(BatchManifest.key_limit, defaults.limit)
+        settings.isIncremental  = False
+        settings.idLastMessage  = -1
+        settings.compression    = defaults.compression or Compression.detect(settings.outFile)
+        try:
+            if BatchManifest.key_since in entry:
+                settings.since = parseDate(str(entry[BatchManifest.key_since]))[0]
+            if BatchManifest.key_until in entry:
+                settings.until = parseDate(str(entry[BatchManifest.key_until]))[1]
+        except FilterError as ex:
+            raise ManifestError('Manifest entry #{} has invalid "since"/"until" value. {}'.format(index, ex))
+        if settings.since is not None and settings.until is not None and settings.since >= settings.until:
+            raise ManifestError('Manifest entry #{}. "since" must be earlier than "until".'.format(index))
+        if (BatchManifest.key_since in entry or BatchManifest.key_until in entry) \
+                and BatchManifest.key_limit not in entry:
+            # The whole range unless limited explicitly
+            settings.limit = 0
+
+        increment = entry.get(BatchManifest.key_continue, False)
+        if increment is not False:
+            settings.isIncremental = True
+            if settings.outFile == '':
+                raise ManifestError('Manifest entry #{} must specify "out" to continue.'.format(index))
+            if isinstance(increment, bool):
+                chatMeta = ChatDumpMetaFile(settings.outFile)
+                try:
+                    chatMeta.merge(settings)
+                except MetaFileError as ex:
+                    raise ManifestError('Manifest entry #{}. {}'.format(index, ex)) from ex
+            elif isinstance(increment, int):
+                settings.idLastMessage = increment
+            else:
+                raise ManifestError('Manifest entry #{} has invalid "continue" value.'.format(index))
+
+        if settings.chatName == '':
+            raise ManifestError('Manifest entry #{} must specify "chat".'.format(index))
+        if not isinstance(settings.limit, int):
+            raise ManifestError('Manifest entry #{} has invalid "limit" value.'.format(index))
+        if settings.isAscending:
+            if settings.limit > 0:
+                raise ManifestError('Manifest entry #{}. limit is not allowed with --ascending'.format(index))
+            settings.limit = 0
+        if settings.parallel > 1:
+            if settings.limit > 0:
+                raise ManifestError('Manifest entry #{}. limit is not allowed with --parallel'.format(index))
+            settings.limit = 0
+        if not exporters.exist(settings.exporter):
+            raise ManifestError('Manifest entry #{}. No such exporter : <{}>'.format(index, settings.exporter))
+        if settings.exporter == 'parquet' and settings.isAddbom:
+            raise ManifestError('Manifest entry #{}. --addbom is not applicable to parquet exporter'.format(index))
+        if settings.filter != '':
+            try:
+                filters.check(settings.filter)
+            except FilterError as ex:
+                raise ManifestError('Manifest entry #{}. No such filter : <{}>. {}'.format(index, settings.filter, ex))
+        if settings.outFile == '':
+            settings.outFile = ChatDumpSettings.defaultOutFile(settings.chatName)
+        if settings.compression and settings.exporter in ('parquet', 'sqlite'):
+            raise ManifestError('Manifest entry #{}. --compress is not applicable to {} exporter'.format(
+                index, settings.exporter))
+        if settings.shardSize and not exporters.shardable(settings.exporter):
+            raise ManifestError('Manifest entry #{}. --shard is not applicable to {} exporter'.format(
+                index, settings.exporter))
+
+        exporter = exporters.load(settings.exporter)
+        exporter.setConfig(settings.exporterConfig)
+        exporter.setCompression(settings.compression)
+        if settings.shardSize:
+            exporter = exporters.shard(exporter, settings.exporter, settings.shardSize)
+        filter = filters.load(settings.filter, exporter)
+        return BatchJob(settings, ChatDumpMetaFile(settings.outFile), exporter, filter)
@@ -0,0 +1,3 @@
+from .BatchJob import BatchJob
+from .BatchManifest import BatchManifest
+from .BatchDumper import BatchDumper
@@ -0,0 +1,3 @@
+class FilterError(Exception):
+  """ Filter expression processing exception"""
+  pass
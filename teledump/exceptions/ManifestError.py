@@ -0,0 +1,3 @@
+class ManifestError(Exception):
+  """ Batch manifest processing exception"""
+  pass
@@ -1,2 +1,4 @@
 from .DumpingError  import DumpingError
 from .MetaFileError import MetaFileError
+from .ManifestError import ManifestError
+from .FilterError import FilterError
@@ -1,11 +1,18 @@
+import os
+from typing import List
 from typing import TextIO
+from typing import Tuple
 
 from telethon.tl.custom.message import Message
 
 from .ExporterContext import ExporterContext
 from ..filters import Filter
+from ..utils import Compression
 
 class Exporter(Filter):
+    # How resulting file is compressed, see --compress
+    compression : Compression = Compression()
+
     def __init__(self):
         self.config : str = ""
 
@@ -14,14 +21,55 @@ class Exporter(Filter):
             :param msg: Raw message object :class:`telethon.tl.types.Message` and derivatives.
                         https://core.telegram.org/type/Message
             :returns: *one-line* string containing one message data.
+                      Exporters of binary formats may return a row (list or dict of values)
+                      that the stream of open_final_file() takes with writeRow(row).
+                      Temp files keep rows as one-line JSON, see ChatDumpOutput.
         """
         return ""
 
+    def format_batch(self, messages: List[Message], context : ExporterContext) -> List[str]:
+        """ Formats a page of messages that passed the filter at once,
+            so exporters can set up encoders and buffers once per page.
+            context.isFirst is set if the page holds the last message to dump,
+            context.isLast unless messages were formatted before this page.
+            :returns: *one-line* string per message, in the order of 'messages'
+        """
+        return [self.format(msg, context) for msg in messages]
+
     def begin_final_file(self, output: TextIO , context: ExporterContext ) -> None:
         """ Hook executes at the beginning of writing a resulting file.
             (After BOM is written in case of --addbom)
         """
         pass
 
+    def open_final_file(self, path: str, mode: str) -> TextIO:
+        """ Opens resulting file for writing ('w') or appending ('a').
+            Exporters of binary formats return a stream that encodes the formatted messages.
+            Appending to a compressed file adds a new gzip member (zstd frame) to it.
+        """
+        return self.compression.open(path, mode)
+
+    def truncate_final_file(self, path: str, size: int) -> None:
+        """ Drops whatever was written into resulting file after it had 'size' (as of tell()).
+            Streams of datasets may return a list of positions from tell().
+        """
+        with open(path, 'r+b') as ff:
+            ff.truncate(size)
+
+    def final_file_size(self, path: str) -> int:
+        """ :returns: size of resulting file as truncate_final_file() takes it, 0 if there is no file """
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    @staticmethod
+    def recover_meta(path: str) -> Tuple[str, int]:
+        """ Reads chat name and the latest message id from resulting file
+            when its .meta file is missing.
+            :returns: None if the exporter does not keep them in resulting file
+        """
+        return None
+
     def setConfig(self, value: str):
          self.config= value
+
+    def setCompression(self, method: str):
+         self.compression = Compression(method)
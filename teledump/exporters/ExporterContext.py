@@ -1,3 +1,7 @@
+from ..stats import RunStats
+from .SenderCache import SenderCache
+
+
 class ExporterContext:
     """ Exporter context """
 
@@ -10,3 +14,9 @@ class ExporterContext:
         self.isLast : bool = True
         # Is working in continue/incremental mode
         self.isContinue : bool = False
+        # MediaDownloader that receives exported documents, if --download is used
+        self.downloader = None
+        # Resolves sender names once per sender, shared by all exporters of a run
+        self.senders : SenderCache = SenderCache()
+        # Timings and counters of the run, see --stats
+        self.stats : RunStats = RunStats()
@@ -1,67 +1,92 @@
 from telethon.tl.custom.message import Message
 
+from .SenderCache import SenderCache
+
+# Marks a field that is not computed yet, None is a valid value of some fields
+_UNSET = object()
+
+
 class FormatData(object):
-    """ json exporter plugin.
-        By convention it has to be called exactly the same as its file name.
-        (Apart from .py extention)
+    """ Message attributes shared by exporters.
+        A field is computed when it is read for the first time and then kept,
+        so an exporter pays only for the fields it uses.
     """
+    __slots__ = ('_msg', '_senders', '_name', '_is_sent_by_bot', '_content', '_re_id_str', '_media_content')
 
-    def __init__(self, msg : Message = None):
+    def __init__(self, msg : Message = None, senders : SenderCache = None):
         """ constructor """
-        self.name : str
-        self.caption : str
-        self.content : str
-        self.re_id_str : str
-        self.is_sent_by_bot : str
-        self.is_contains_media : str
-        self.media_content : str
+        self.parse(msg, senders)
 
-        if msg != None:
-            self.parse(msg)
-
-    def parse(self,msg: Message) -> None:
-        """ Extracts user name from 'sender', message caption and message content from msg.
+    def parse(self,msg: Message, senders : SenderCache = None) -> None:
+        """ Takes msg whose user name, message caption and message content are extracted on demand.
             :param msg: Raw message object.
-
-            :return
-                (...) tuple of message attributes
+            :param senders: Cache of sender names shared by the run, if any
         """
-        sender = msg.sender
+        self._msg = msg
+        self._senders = senders
+        self._name = self._is_sent_by_bot = self._content = self._re_id_str = self._media_content = _UNSET
 
-        # Get the name of the sender if any
-        is_sent_by_bot = None
-        if sender:
-            self.name = getattr(sender, 'username', None)
-            if not self.name:
-                self.name = getattr(sender, 'title', None)
-                if not self.name:
-                    self.name = (sender.first_name or "") + " " + (sender.last_name or "")
-                    self.name = self.name.strip()
-                if not self.name:
-                    self.name = '???'
-            is_sent_by_bot = getattr(sender, 'bot', None)
-        else:
-            self.name = '???'
+    @property
+    def name(self) -> str:
+        """ Name of the sender, '???' if unknown """
+        if self._name is _UNSET:
+            self._resolveSender()
+        return self._name
 
-        self.caption = None
-        if hasattr(msg, 'message'):
-            self.content = msg.message
-        elif hasattr(msg, 'action'):
-            self.content = str(msg.action)
-        else:
-            # Unknown message, simply print its class name
-            self.content = type(msg).__name__
+    @property
+    def is_sent_by_bot(self) -> bool:
+        """ Whether the sender is a bot, None if the sender is not a user """
+        if self._is_sent_by_bot is _UNSET:
+            self._resolveSender()
+        return self._is_sent_by_bot
+
+    @property
+    def content(self) -> str:
+        content = self._content
+        if content is _UNSET:
+            msg = self._msg
+            if hasattr(msg, 'message'):
+                content = msg.message
+            elif hasattr(msg, 'action'):
+                content = str(msg.action)
+            else:
+                # Unknown message, simply print its class name
+                content = type(msg).__name__
+            self._content = content
+        return content
+
+    @property
+    def re_id_str(self) -> str:
+        """ Id of the replied message, '' if it is not a reply """
+        reIdStr = self._re_id_str
+        if reIdStr is _UNSET:
+            reId = getattr(self._msg, 'reply_to_msg_id', None)
+            reIdStr = self._re_id_str = str(reId) if reId is not None else ''
+        return reIdStr
 
-        self.re_id_str = ''
-        if hasattr(msg, 'reply_to_msg_id') and msg.reply_to_msg_id is not None:
-            self.re_id_str = str(msg.reply_to_msg_id)
+    @property
+    def is_contains_media(self) -> bool:
+        return bool(getattr(self._msg, 'media', None))
 
-        self.is_contains_media = False
-        self.media_content = None
-        # Format the message content
-        if getattr(msg, 'media', None):
-            # The media may or may not have a caption
-            self.is_contains_media = True
-            self.caption = getattr(msg.media, 'caption', '')
-            self.media_content = '<{}> {}'.format(
-                type(msg.media).__name__, self.caption)
+    @property
+    def caption(self) -> str:
+        """ Caption of the media, None if there is no media """
+        media = getattr(self._msg, 'media', None)
+        # The media may or may not have a caption
+        return getattr(media, 'caption', '') if media else None
+
+    @property
+    def media_content(self) -> str:
+        """ '<media type> caption', None if there is no media """
+        mediaContent = self._media_content
+        if mediaContent is _UNSET:
+            media = getattr(self._msg, 'media', None)
+            mediaContent = self._media_content = \
+                '<{}> {}'.format(type(media).__name__, getattr(media, 'caption', '')) if media else None
+        return mediaContent
+
+    def _resolveSender(self) -> None:
+        if self._senders is not None:
+            self._name, self._is_sent_by_bot = self._senders.resolve(self._msg)
+        else:
+            self._name, self._is_sent_by_bot = SenderCache.describe(self._msg.sender)
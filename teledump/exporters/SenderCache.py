@@ -0,0 +1,97 @@
+""" This Module contains the cache of sender names shared by exporters of a run """
+
+import codecs
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Tuple
+
+from telethon.tl.custom.message import Message
+
+
+class SenderCache:
+    """ Display names and bot flags of message senders, resolved once per sender id.
+        Least recently used senders are evicted when more than 'capacity' are kept.
+
+        With 'path' the cache is kept between runs, so an incremental dump writes
+        senders under the names they had in the previous runs.
+    """
+    key_name : str = 'name'
+    key_bot  : str = 'bot'
+
+    def __init__(self, path: str = '', capacity: int = 4096):
+        self._logger = logging.getLogger(__name__)
+        self.path : str = path
+        self.capacity : int = capacity
+        # Lookups answered from the cache and those that resolved the sender
+        self.hits : int = 0
+        self.misses : int = 0
+        self._senders : OrderedDict = OrderedDict()
+
+    @staticmethod
+    def describe(sender) -> Tuple[str, bool]:
+        """ :return display name and bot flag (None if not a user) of the sender """
+        if not sender:
+            return '???', None
+        name = getattr(sender, 'username', None)
+        if not name:
+            name = getattr(sender, 'title', None)
+            if not name:
+                name = (sender.first_name or "") + " " + (sender.last_name or "")
+                name = name.strip()
+            if not name:
+                name = '???'
+        return name, getattr(sender, 'bot', None)
+
+    def resolve(self, msg: Message) -> Tuple[str, bool]:
+        """ :return display name and bot flag of the message sender """
+        senderId = getattr(msg, 'sender_id', None)
+        if senderId is None:
+            return SenderCache.describe(msg.sender)
+        entry = self._senders.get(senderId)
+        if entry is not None:
+            self.hits += 1
+            self._senders.move_to_end(senderId)
+            return entry
+        self.misses += 1
+        entry = SenderCache.describe(msg.sender)
+        if not msg.sender:
+            # Not loaded with this message, a later one may have it
+            return entry
+        self._senders[senderId] = entry
+        if len(self._senders) > self.capacity:
+            self._senders.popitem(last=False)
+        return entry
+
+    def hitRate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def load(self) -> None:
+        """ Restores senders saved by the previous run if any """
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with codecs.open(self.path, 'r', 'utf-8') as ff:
+                data = json.load(ff)
+            for senderId, entry in data.items():
+                self._senders[int(senderId)] = (str(entry[SenderCache.key_name]), entry[SenderCache.key_bot])
+            while len(self._senders) > self.capacity:
+                self._senders.popitem(last=False)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as ex:
+            self._senders.clear()
+            self._logger.debug('Ignore sender cache "%s". %s', self.path, ex)
+
+    def save(self) -> None:
+        """ Persists senders for the next run, the most recently used ones last """
+        if not self.path:
+            return
+        data = OrderedDict((str(senderId), {SenderCache.key_name: name, SenderCache.key_bot: bot})
+                           for senderId, (name, bot) in self._senders.items())
+        try:
+            with codecs.open(self.path + '.tmp', 'w', 'utf-8') as ff:
+                json.dump(data, ff, ensure_ascii=False, indent=4)
+            os.replace(self.path + '.tmp', self.path)
+        except OSError as ex:
+            self._logger.debug('Failed to save sender cache "%s". %s', self.path, ex.strerror)
@@ -1,18 +1,32 @@
 from typing import *
 from .Exporter import Exporter
 from .ExporterContext import ExporterContext
+from .SenderCache import SenderCache
 
-from .list.CsvExporter   import CsvExporter
-from .list.JsonlExporter import JsonlExporter
-from .list.TextExporter  import TextExporter
-from .list.MediaExporter import MediaExporter
+from .list.CsvExporter     import CsvExporter
+from .list.JsonlExporter   import JsonlExporter
+from .list.TextExporter    import TextExporter
+from .list.MediaExporter   import MediaExporter
+from .list.ParquetExporter import ParquetExporter
+from .list.SqliteExporter  import SqliteExporter
+from .shard import ShardingExporter
 
 
 _exporters : Dict[str,lambda : Exporter ] = {
-    'text'  : lambda : TextExporter(),
-    'csv'   : lambda : CsvExporter(),
-    'jsonl' : lambda : JsonlExporter(),
-    'media' : lambda : MediaExporter()
+    'text'    : lambda : TextExporter(),
+    'csv'     : lambda : CsvExporter(),
+    'jsonl'   : lambda : JsonlExporter(),
+    'media'   : lambda : MediaExporter(),
+    'parquet' : lambda : ParquetExporter(),
+    'sqlite'  : lambda : SqliteExporter()
+}
+
+# Exporters whose lines can be written into a sharded dataset (--shard)
+_shardable = ('text', 'csv', 'jsonl', 'media')
+
+# Exporters able to restore metadata from their resulting file
+_recoverable : Dict[str, Type[Exporter]] = {
+    'sqlite' : SqliteExporter,
 }
 
 
@@ -28,3 +42,23 @@ def load(name: str) -> Union[Exporter,None]:
     if name in _exporters:
         return _exporters[name]()
     return None
+
+
+def shardable(name: str) -> bool:
+    return name in _shardable
+
+
+def shard(exporter: Exporter, name: str, maxSize: int) -> Exporter:
+    """ :return exporter that writes lines of 'exporter' into parts of at most 'maxSize' bytes """
+    return ShardingExporter(exporter, name, maxSize)
+
+
+def recover(path: str) -> Union[Tuple[str, str, int], None]:
+    """ :return exporter name, chat name and the latest message id read from resulting file
+                'path', or None if no exporter recognizes it
+    """
+    for name, exporterClass in _recoverable.items():
+        meta = exporterClass.recover_meta(path)
+        if meta is not None:
+            return (name,) + tuple(meta)
+    return None
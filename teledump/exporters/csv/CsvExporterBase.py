@@ -1,3 +1,5 @@
+from typing import Iterable
+from typing import List
 from typing import TextIO
 
 from teledump.exporters.Exporter import Exporter
@@ -33,13 +35,23 @@ class CsvExporterBase(Exporter):
         self.fields.append(key)
 
 
+    @staticmethod
+    def _escape(value) -> str:
+        ss = utils.escape(str(value))
+        if ',' in ss:
+            ss = '"' + ss + '"'
+        return ss
+
     def _strRow(self, values ) -> str:
-        def escape(value):
-            ss = utils.escape(str(value))
-            if (ss.find(",") != -1):
-                ss = '"' + ss + '"'
-            return ss
-        return '\t'.join(escape(values[kk]) for kk in self.fields)
+        escape = self._escape
+        return '\t'.join([escape(values[kk]) for kk in self.fields])
+
+    def _strRows(self, rows: Iterable[dict]) -> List[str]:
+        """ _strRow() of every row, columns are looked up once for all of them """
+        escape = self._escape
+        fields = self.fields
+        join = '\t'.join
+        return [join([escape(values[kk]) for kk in fields]) for values in rows]
 
     def _strHeader(self):
         return '\t'.join(self.headers[kk] for kk in self.fields)
@@ -1,4 +1,5 @@
 from . import Filter
+from ...filters.expr import Predicates
 from typing import Union
 from typing import List
 import re
@@ -21,24 +22,14 @@ class NumFilter(Filter):
         super().__init__(key)
         self.operator = operator
         self.num = num
+        # resolve operator once, not on every row
+        self._test = Predicates.number(operator, num)
 
     def valid(self,data: dict):
         item = data[self.key()]
         if not isinstance(item, int):
             return False
-        if self.operator == "==":
-            return item == self.num
-        if self.operator == "<>":
-            return item != self.num
-        if self.operator == ">":
-            return item > self.num
-        if self.operator == ">=":
-            return item >= self.num
-        if self.operator == "<":
-            return item < self.num
-        if self.operator == "<=":
-            return item <= self.num
-        return False
+        return self._test(item)
 
     def __str__(self):
         return '"key: {}, operator: {} , values : {}"'.format(
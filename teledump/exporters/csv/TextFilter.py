@@ -1,4 +1,5 @@
 from . import Filter
+from ...filters.expr import Predicates
 from typing import Union
 from typing import List
 
@@ -21,41 +22,17 @@ class TextFilter(Filter):
         super().__init__(key)
         self.operator = operator
         self.texts = texts
-        if self.operator == "$=":
-            self.patterns = [re.compile(text) for text in self.texts]
+        # resolve operator and lowercase patterns once, not on every row
+        self._test = Predicates.text(operator, texts)
 
     def valid(self,data: dict):
         item = data[self.key()]
-        if not isinstance(item, int):
-            item = str(item)
-
-        if self.operator == "$=":
-            item = item.lower()
-            for pattern in self.patterns:
-                if pattern.search(item):
-                    return True
-            return False
-
-        if self.operator == "@=":
-            item = item.lower()
-            for text in self.texts:
-                if item == text:
-                    return True
-            return False
-
-        if self.operator == "#=":
-            item = item.lower()
-            for text in self.texts:
-                if item.find(text) != -1:
-                    return True
-                continue
-
-        return False
+        return self._test(str(item))
 
     def __str__(self):
         return '"key: {}, operator: {} , values : {}"'.format(
             self.key(),
             self.operator,
-            self.values
+            self.texts
         )
 
@@ -1,3 +1,5 @@
+from typing import List
+
 from telethon.tl.custom.message import Message
 
 from teledump.exporters.csv.CsvExporterBase import CsvExporterBase
@@ -18,14 +20,14 @@ class CsvExporter(CsvExporterBase):
         self.key_replyId = 3
         self.key_message = 4
 
-        self._addField(self.key_id, "Message-Id")
-        self._addField(self.key_time, "Time")
-        self._addField(self.key_sender, "Sender-Name")
-        self._addField(self.key_replyId, "Reply-Id")
-        self._addField(self.key_message, "Message")
+        self._addHeaderField(self.key_id, "Message-Id")
+        self._addHeaderField(self.key_time, "Time")
+        self._addHeaderField(self.key_sender, "Sender-Name")
+        self._addHeaderField(self.key_replyId, "Reply-Id")
+        self._addHeaderField(self.key_message, "Message")
 
     def format(self, msg: Message, context: ExporterContext) -> str:
-        data = FormatData(msg)
+        data = FormatData(msg, context.senders)
         values = {}
         values[self.key_id     ] = msg.id
         values[self.key_sender ] = data.name
@@ -34,4 +36,24 @@ class CsvExporter(CsvExporterBase):
         values[self.key_time   ] = msg.date.isoformat()
         return self._strRow(values)
 
+    def format_batch(self, messages: List[Message], context: ExporterContext) -> List[str]:
+        # One FormatData and one row of values are refilled for every message of the page
+        data = FormatData()
+        values = {}
+        keyId, keySender, keyReplyId, keyMessage, keyTime = \
+            self.key_id, self.key_sender, self.key_replyId, self.key_message, self.key_time
+        escape = self._escape
+        fields = self.fields
+        join = '\t'.join
+        rows = []
+        for msg in messages:
+            data.parse(msg, context.senders)
+            values[keyId     ] = msg.id
+            values[keySender ] = data.name
+            values[keyReplyId] = data.re_id_str
+            values[keyMessage] = data.content
+            values[keyTime   ] = msg.date.isoformat()
+            rows.append(join([escape(values[kk]) for kk in fields]))
+        return rows
+
 
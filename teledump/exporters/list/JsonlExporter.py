@@ -1,5 +1,6 @@
 import json
 from datetime import date, datetime
+from typing import List
 from typing import TextIO
 
 from telethon.tl.custom.message import Message
@@ -21,7 +22,8 @@ class JsonlExporter(Exporter):
 
     def __init__(self):
         """ constructor """
-        pass
+        # json.dumps() with options builds a new encoder on every call
+        self._encoder = json.JSONEncoder(default=self._json_serial, ensure_ascii=False)
 
     # pylint: disable=unused-argument
     def format(self, msg: Message, context: ExporterContext) -> str:
@@ -32,11 +34,24 @@ class JsonlExporter(Exporter):
             :returns: *one-line* string containing one message data.
         """
         # pylint: disable=line-too-long
-        data = FormatData(msg)
+        return self._encoder.encode(self._dictionary(msg, FormatData(msg, context.senders)))
+
+    def format_batch(self, messages: List[Message], context: ExporterContext) -> List[str]:
+        # One FormatData is refilled for every message of the page
+        data = FormatData()
+        encode = self._encoder.encode
+        dictionary = self._dictionary
+        lines = []
+        for msg in messages:
+            data.parse(msg, context.senders)
+            lines.append(encode(dictionary(msg, data)))
+        return lines
 
-        msgDictionary = {
+    @staticmethod
+    def _dictionary(msg: Message, data: FormatData) -> dict:
+        return {
             'message_id': msg.id,
-            'from_id': msg.from_id,
+            'from_id': getattr(msg, 'sender_id', None),
             'reply_id': data.re_id_str,
             'author': data.name,
             'sent_by_bot': data.is_sent_by_bot,
@@ -45,9 +60,6 @@ class JsonlExporter(Exporter):
             'contains_media': data.is_contains_media,
             'media_content': data.media_content
         }
-        msg_dump_str = json.dumps(
-            msgDictionary, default=self._json_serial, ensure_ascii=False)
-        return msg_dump_str
 
     def begin_final_file(self, output: TextIO, context: ExporterContext) -> None:
         """ Hook executes at the beginning of writing a resulting file.
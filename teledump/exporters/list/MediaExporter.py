@@ -13,6 +13,7 @@ from ..csv import NumFilter
 from ..csv import Filter
 
 
+from typing import Dict
 from typing import List
 
 class MediaExporter(CsvExporterBase):
@@ -21,6 +22,8 @@ class MediaExporter(CsvExporterBase):
         self.filters : List[Filter] = []
         self.init()
         self.values = {}
+        # Values of messages that passed valid() and are not formatted yet, by message id
+        self._parsed : Dict[int, dict] = {}
 
     def init(self):
         self.col_file       = "file"
@@ -39,6 +42,7 @@ class MediaExporter(CsvExporterBase):
         self.col_hash       = "hash"
         self.col_reference  = "reference"
         self.col_mimeType   = "mime-type"
+        self.col_store      = "store"
 
         self._addHeader( self.col_file     )
         self._addHeader( self.col_link     )
@@ -57,10 +61,32 @@ class MediaExporter(CsvExporterBase):
         self._addHeader( self.col_hash     )
         self._addHeader( self.col_reference)
         self._addHeader( self.col_mimeType )
+        self._addHeader( self.col_store    )
 
     def format(self, msg: Message , context: ExporterContext) -> str:
+        self._parsed.pop(msg.id, None)
+        self._download(msg, self.values, context)
         return self._strRow( self.values )
 
+    def format_batch(self, messages: List[Message], context: ExporterContext) -> List[str]:
+        # valid() has parsed the messages already unless a filter of its own is used
+        rows = []
+        for msg in messages:
+            values = self._parsed.pop(msg.id, None)
+            if values is None:
+                self.parse(msg)
+                values = self.values
+            self._download(msg, values, context)
+            rows.append(values)
+        self._parsed.clear()
+        return self._strRows(rows)
+
+    def _download(self, msg: Message, values: dict, context: ExporterContext) -> None:
+        if context.downloader is not None:
+            context.downloader.add(msg.media.document, values[self.col_file], msg)
+            if context.downloader.store is not None:
+                values[self.col_store] = context.downloader.store.relpath(msg.media.document)
+
     def valid(self, msg: Message ) -> bool:
         if not isinstance(msg.media,MessageMediaDocument):
             return False
@@ -68,8 +94,11 @@ class MediaExporter(CsvExporterBase):
         for filter in self.filters:
             if not filter.valid(self.values):
                 return False
+        self._parsed[msg.id] = self.values
         return True
 
+    # Not pushed down: Telegram search for documents leaves out videos, voice notes, stickers and GIFs
+
     def _addFilter(self,filter ):
         self.filters.append(filter)
 
@@ -112,4 +141,5 @@ class MediaExporter(CsvExporterBase):
         self.values[self.col_id      ] = msg.media.document.id
         self.values[self.col_hash    ] = "{: d}".format(msg.media.document.access_hash)
         self.values[self.col_reference]= str(base64.b64encode(msg.media.document.file_reference))[2:-1]
+        self.values[self.col_store   ] = ""
 
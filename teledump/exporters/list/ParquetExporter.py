@@ -0,0 +1,76 @@
+from datetime import timezone
+from typing import TextIO
+
+from telethon.tl.custom.message import Message
+
+from ..Exporter import Exporter
+from ..ExporterContext import ExporterContext
+from ..FormatData import FormatData
+from ..parquet import ParquetDataset
+
+
+class ParquetExporter(Exporter):
+    """ parquet exporter plugin.
+
+    Writes typed columns into a Parquet dataset, the output path is a directory of
+    part-NNNNN.parquet files that pandas/pyarrow read as one table.
+    Every --continue run adds a new file to the dataset.
+
+    Config (--expdata): row-group=<count> - messages per row group (Default: 65536),
+                        part-size=<count> - row groups per file (Default: 16).
+    Requires pyarrow.
+    """
+    # pylint: disable=no-self-use
+
+    def __init__(self):
+        """ constructor """
+        super().__init__()
+        self.rowGroupSize : int = 65536
+        self.partSize : int = 16
+
+    # pylint: disable=unused-argument
+    def format(self, msg: Message, context: ExporterContext) -> list:
+        """ Formatter method. Takes raw msg and converts it to a row of column values,
+            see ParquetDataset.
+        """
+        data = FormatData(msg, context.senders)
+        media = type(msg.media).__name__ if getattr(msg, 'media', None) else None
+        if media is not None and media.startswith('MessageMedia'):
+            media = media[len('MessageMedia'):].lower()
+        row = [
+            msg.id,
+            int(msg.date.replace(tzinfo=msg.date.tzinfo or timezone.utc).timestamp() * 1000000),
+            getattr(msg, 'sender_id', None),
+            getattr(msg, 'reply_to_msg_id', None),
+            data.name,
+            data.is_sent_by_bot is True,
+            data.content,
+            data.is_contains_media,
+            media,
+        ]
+        return row
+
+    def open_final_file(self, path: str, mode: str) -> TextIO:
+        return ParquetDataset(path, mode, self.rowGroupSize, self.partSize)
+
+    def truncate_final_file(self, path: str, size) -> None:
+        ParquetDataset.truncate(path, size, self.rowGroupSize)
+
+    def final_file_size(self, path: str) -> int:
+        parts = ParquetDataset.parts(path)
+        return parts[-1][0] + 1 if parts else 0
+
+    def setConfig(self, value: str):
+        super().setConfig(value)
+        for option in self.config.split(','):
+            key, _, val = option.partition('=')
+            if key.strip() == 'row-group':
+                try:
+                    self.rowGroupSize = max(int(val), 1)
+                except ValueError:
+                    raise ValueError('Invalid row-group value "{}" of parquet exporter'.format(val))
+            elif key.strip() == 'part-size':
+                try:
+                    self.partSize = max(int(val), 1)
+                except ValueError:
+                    raise ValueError('Invalid part-size value "{}" of parquet exporter'.format(val))
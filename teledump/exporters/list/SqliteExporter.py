@@ -0,0 +1,75 @@
+from datetime import timezone
+from typing import TextIO
+from typing import Tuple
+
+from telethon.tl.custom.message import Message
+from telethon.tl.types import DocumentAttributeFilename
+
+from ..Exporter import Exporter
+from ..ExporterContext import ExporterContext
+from ..FormatData import FormatData
+from ..sqlite import SqliteDatabase
+
+
+class SqliteExporter(Exporter):
+    """ sqlite exporter plugin.
+
+    Upserts messages, their senders, chats and media into a SQLite database
+    (tables chats, senders, messages, media), see SqliteDatabase.
+    --continue updates the same database, re-fetched messages never duplicate.
+    """
+    # pylint: disable=no-self-use
+
+    def __init__(self):
+        """ constructor """
+        super().__init__()
+
+    # pylint: disable=unused-argument
+    def format(self, msg: Message, context: ExporterContext) -> dict:
+        """ Formatter method. Takes raw msg and converts it to rows of the tables,
+            see SqliteDatabase.
+        """
+        data = FormatData(msg, context.senders)
+        chat = getattr(msg, 'chat', None)
+        sender = getattr(msg, 'sender', None)
+        chatId = msg.chat_id
+        date = msg.date.replace(tzinfo=msg.date.tzinfo or timezone.utc).astimezone(timezone.utc)
+        row = {
+            'chat': [chatId, getattr(chat, 'title', None), getattr(chat, 'username', None)],
+            'sender': None if sender is None else [
+                msg.sender_id, data.name, getattr(sender, 'username', None), data.is_sent_by_bot is True],
+            'message': [chatId, msg.id, date.strftime('%Y-%m-%d %H:%M:%S'), getattr(msg, 'sender_id', None),
+                        getattr(msg, 'reply_to_msg_id', None), data.content, data.is_contains_media],
+            'media': self._media(chatId, msg),
+        }
+        return row
+
+    def open_final_file(self, path: str, mode: str) -> TextIO:
+        return SqliteDatabase(path, mode)
+
+    def truncate_final_file(self, path: str, size: int) -> None:
+        # Messages written after the checkpoint are upserted again
+        pass
+
+    def final_file_size(self, path: str) -> int:
+        return 0
+
+    @staticmethod
+    def recover_meta(path: str) -> Tuple[str, int]:
+        return SqliteDatabase.latest(path)
+
+    def _media(self, chatId: int, msg: Message) -> list:
+        media = getattr(msg, 'media', None)
+        if not media:
+            return None
+        kind = type(media).__name__
+        if kind.startswith('MessageMedia'):
+            kind = kind[len('MessageMedia'):].lower()
+        document = getattr(media, 'document', None)
+        if document is None:
+            return [chatId, msg.id, kind, None, None, None, None]
+        fileName = None
+        for attr in document.attributes:
+            if isinstance(attr, DocumentAttributeFilename):
+                fileName = attr.file_name
+        return [chatId, msg.id, kind, document.id, fileName, document.mime_type, document.size]
@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 # pylint: disable=missing-docstring
 
-import re
+from typing import List
 from typing import TextIO
 
 from telethon.tl.custom.message import Message
@@ -10,6 +10,7 @@ from telethon.tl.custom.message import Message
 from ..Exporter import Exporter
 from ..ExporterContext import ExporterContext
 from ..FormatData import FormatData
+from ... import utils
 
 
 class TextExporter(Exporter):
@@ -20,18 +21,7 @@ class TextExporter(Exporter):
 
     def __init__(self):
         """ constructor """
-        self.ESCAPE = re.compile(r'[\x00-\x1f\b\f\n\r\t]')
-        self.ESCAPE_DICT = {
-            '\\': '\\\\',
-            # '"': '\\"',
-            '\b': '\\b',
-            '\f': '\\f',
-            '\n': '\\n',
-            '\r': '\\r',
-            '\t': '\\t',
-        }
-        for i in range(0x20):
-            self.ESCAPE_DICT.setdefault(chr(i), '\\u{0:04x}'.format(i))
+        pass
 
     def format(self, msg: Message, context: ExporterContext) -> str:
         """ Formatter method. Takes raw msg and converts it to a *one-line* string.
@@ -41,7 +31,7 @@ class TextExporter(Exporter):
             :returns: *one-line* string containing one message data.
         """
         # pylint: disable=unused-argument
-        data = FormatData(msg)
+        data = FormatData(msg, context.senders)
 
         # Format a message log record
         msg_dump_str = '[{}-{:02d}-{:02d} {:02d}:{:02d}] ID={} {}{}: {}'.format(
@@ -58,6 +48,26 @@ class TextExporter(Exporter):
 
         return msg_dump_str
 
+    def format_batch(self, messages: List[Message], context: ExporterContext) -> List[str]:
+        # One FormatData is refilled for every message of the page
+        data = FormatData()
+        record = '[{}-{:02d}-{:02d} {:02d}:{:02d}] ID={} {}{}: {}'.format
+        escape = utils.escape_text
+        lines = []
+        for msg in messages:
+            data.parse(msg, context.senders)
+            date = msg.date
+            reIdStr = data.re_id_str
+            content = data.content
+            lines.append(record(
+                date.year, date.month, date.day, date.hour, date.minute,
+                msg.id,
+                "RE_ID=%s " % reIdStr if reIdStr else "",
+                data.name,
+                escape(content) if content else content
+            ))
+        return lines
+
     def begin_final_file(self, output: TextIO, context: ExporterContext) -> None:
         """ Hook executes at the beginning of writing a resulting file.
             (After BOM is written in case of --addbom)
@@ -69,6 +79,4 @@ class TextExporter(Exporter):
         """Return a JSON representation of a Python string"""
         if not s:
             return s
-        def replace(match):
-            return self.ESCAPE_DICT[match.group(0)]
-        return self.ESCAPE.sub(replace, s)
+        return utils.escape_text(s)
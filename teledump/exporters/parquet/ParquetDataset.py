@@ -0,0 +1,246 @@
+""" This Module contains the stream that writes formatted messages into a Parquet dataset """
+
+import glob
+import json
+import os
+import os.path
+import re
+from typing import List
+from typing import Tuple
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from ...exceptions import DumpingError
+
+# (column, pyarrow type name) in the order ParquetExporter formats rows
+COLUMNS : List[Tuple[str, str]] = [
+    ('message_id' , 'int64'),
+    ('date'       , 'timestamp'),
+    ('from_id'    , 'int64'),
+    ('reply_id'   , 'int64'),
+    ('author'     , 'dictionary'),
+    ('sent_by_bot', 'bool'),
+    ('content'    , 'string'),
+    ('has_media'  , 'bool'),
+    ('media'      , 'dictionary'),
+]
+
+
+def _schema():
+    types = {
+        'int64'     : pyarrow.int64(),
+        'timestamp' : pyarrow.timestamp('us', tz='UTC'),
+        'dictionary': pyarrow.dictionary(pyarrow.int32(), pyarrow.string()),
+        'bool'      : pyarrow.bool_(),
+        'string'    : pyarrow.string(),
+    }
+    return pyarrow.schema([(name, types[kind]) for name, kind in COLUMNS])
+
+
+class ParquetDataset:
+    """ File-like stream that accepts rows formatted by ParquetExporter (lists of column values)
+        with writeRow(), or lines of them as JSON arrays with write() (temp files), keeps them
+        in typed columns and writes a row group every 'rowGroupSize' rows.
+        Only one row group is kept in memory whatever the history length is.
+
+        The dataset is a directory of part-NNNNN.parquet files. Mode 'w' drops existing files,
+        mode 'a' (--continue) adds a new file to the dataset. A part is complete when it has
+        'partSize' row groups and on close().
+        A part is readable once it is complete, so flush() appends the rows written since
+        the previous flush to the journal of the open part (_part-NNNNN.journal, Arrow IPC
+        stream), which is dropped when the part is complete.
+        tell() is [number of the open part, rows in it], see truncate().
+    """
+    filePattern    : str = 'part-{:05d}.parquet'
+    journalPattern : str = '_part-{:05d}.journal'
+
+    def __init__(self, path: str, mode: str, rowGroupSize: int, partSize: int):
+        if pyarrow is None:
+            raise DumpingError('parquet exporter requires pyarrow package. Run "pip install pyarrow".')
+        self.path : str = path
+        self.rowGroupSize : int = rowGroupSize
+        self.partSize : int = partSize
+        self.schema = _schema()
+
+        os.makedirs(path, exist_ok=True)
+        if 'w' in mode:
+            ParquetDataset.truncate(path, 0, rowGroupSize)
+        parts = ParquetDataset.parts(path)
+        self._index : int = parts[-1][0] + 1 if parts else 0
+
+        # Rows of the next row group, the first '_journaled' of them are in the journal
+        self._columns : List[list] = [[] for _ in COLUMNS]
+        self._rows : int = 0
+        self._journaled : int = 0
+        self._tail : str = ''
+        # The open part and its journal
+        self._file = None
+        self._writer = None
+        self._journal = None
+        self._journalWriter = None
+        self._rowGroups : int = 0
+        self._partRows : int = 0
+        # syncs the directory entries of new files
+        self._dirFd : int = os.open(path, os.O_RDONLY)
+
+    @staticmethod
+    def parts(path: str) -> List[Tuple[int, str]]:
+        """ :return sorted (number, path) of the files of the dataset """
+        parts = []
+        for partPath in glob.glob(os.path.join(glob.escape(path), 'part-*.parquet')):
+            match = re.match(r'part-(\d+)\.parquet$', os.path.basename(partPath))
+            if match:
+                parts.append((int(match.group(1)), partPath))
+        return sorted(parts)
+
+    @staticmethod
+    def truncate(path: str, size, rowGroupSize: int) -> None:
+        """ Drops whatever was written after tell() returned 'size'.
+            The part that was open then is completed with its rows from the journal.
+            :param size: [number of the open part, rows in it], or the number of complete parts
+        """
+        index, rows = (size, 0) if isinstance(size, int) else size
+        partPath = os.path.join(path, ParquetDataset.filePattern.format(index))
+        journalPath = os.path.join(path, ParquetDataset.journalPattern.format(index))
+        table = None
+        if rows > 0 and os.path.exists(partPath):
+            try:
+                table = pyarrow.parquet.read_table(partPath)
+            except pyarrow.ArrowInvalid:
+                # The part was open, it has no footer
+                pass
+        if table is None and rows > 0 and os.path.exists(journalPath):
+            batches, count = [], 0
+            with pyarrow.ipc.open_stream(pyarrow.memory_map(journalPath)) as reader:
+                # The journal may end with a batch written after the checkpoint
+                for batch in reader:
+                    batches.append(batch)
+                    count += batch.num_rows
+                    if count >= rows:
+                        break
+            table = pyarrow.Table.from_batches(batches, schema=_schema())
+        if rows > 0 and (table is None or table.num_rows < rows):
+            raise DumpingError('Part "{}" of the parquet dataset has {} rows, {} expected.'.format(
+                partPath, table.num_rows if table is not None else 0, rows))
+        if table is not None and table.num_rows == rows and not os.path.exists(journalPath):
+            # The part is complete and holds just the rows of the checkpoint
+            table, index = None, index + 1
+        for number, otherPath in ParquetDataset.parts(path):
+            if number >= index:
+                os.remove(otherPath)
+        if table is not None:
+            tempPath = partPath + '.tmp'
+            with open(tempPath, 'wb') as ff:
+                pyarrow.parquet.write_table(table.slice(0, rows), ff, row_group_size=rowGroupSize)
+                ff.flush()
+                os.fsync(ff.fileno())
+            os.replace(tempPath, partPath)
+        for journalPath in glob.glob(os.path.join(glob.escape(path), '_part-*.journal')):
+            os.remove(journalPath)
+
+    def writeRow(self, row: list) -> None:
+        self._append(row)
+
+    def write(self, text: str) -> int:
+        lines = (self._tail + text).split('\n')
+        self._tail = lines.pop()
+        for line in lines:
+            if line:
+                self._append(json.loads(line))
+        return len(text)
+
+    def flush(self) -> None:
+        """ Makes the rows written so far durable, in the journal of the open part """
+        if self._rows > self._journaled:
+            self._writeJournal(self._table())
+        if self._journal is not None:
+            self._journal.flush()
+
+    def fileno(self) -> int:
+        return self._journal.fileno() if self._journal is not None else self._dirFd
+
+    def tell(self) -> list:
+        return [self._index, self._partRows + self._rows]
+
+    def close(self) -> None:
+        if self._tail:
+            self._append(json.loads(self._tail))
+            self._tail = ''
+        self._writeRowGroup()
+        self._complete()
+        if self._dirFd is not None:
+            os.fsync(self._dirFd)
+            os.close(self._dirFd)
+            self._dirFd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _append(self, row: list) -> None:
+        for column, value in zip(self._columns, row):
+            column.append(value)
+        self._rows += 1
+        if self._rows >= self.rowGroupSize:
+            self._writeRowGroup()
+            if self._rowGroups >= self.partSize:
+                self._complete()
+
+    def _table(self):
+        arrays = [pyarrow.array(column, type=field.type) for column, field in zip(self._columns, self.schema)]
+        return pyarrow.Table.from_arrays(arrays, schema=self.schema)
+
+    def _open(self) -> None:
+        self._file = open(os.path.join(self.path, self.filePattern.format(self._index)), 'wb')
+        self._writer = pyarrow.parquet.ParquetWriter(self._file, self.schema)
+        self._journal = open(os.path.join(self.path, self.journalPattern.format(self._index)), 'wb')
+        self._journalWriter = pyarrow.ipc.new_stream(self._journal, self.schema)
+        os.fsync(self._dirFd)
+        self._rowGroups = 0
+        self._partRows = 0
+
+    def _writeJournal(self, table) -> None:
+        if self._writer is None:
+            self._open()
+        for batch in table.slice(self._journaled).to_batches():
+            self._journalWriter.write_batch(batch)
+        self._journaled = self._rows
+
+    def _writeRowGroup(self) -> None:
+        if self._rows == 0:
+            return
+        table = self._table()
+        self._writeJournal(table)
+        self._writer.write_table(table, row_group_size=self._rows)
+        self._rowGroups += 1
+        self._partRows += self._rows
+        self._columns = [[] for _ in COLUMNS]
+        self._rows = 0
+        self._journaled = 0
+
+    def _complete(self) -> None:
+        """ Closes the open part, it does not need the journal anymore """
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        self._journalWriter.close()
+        self._journalWriter = None
+        self._journal.close()
+        self._journal = None
+        os.remove(os.path.join(self.path, self.journalPattern.format(self._index)))
+        os.fsync(self._dirFd)
+        self._index += 1
+        self._rowGroups = 0
+        self._partRows = 0
@@ -0,0 +1 @@
+from .ParquetDataset import ParquetDataset
@@ -0,0 +1,91 @@
+""" This Module contains the manifest of a sharded dataset """
+
+import codecs
+import json
+import os
+import os.path
+from collections import OrderedDict
+from typing import List
+
+from ...exceptions import DumpingError
+
+
+class ShardManifest:
+    """ _manifest.json in the root of a sharded dataset. Lists every complete shard in the
+        order it was written:
+            {"version": 1, "shards": [{"path": "chat=1/date=2023-05/part-00000.log", "partition": "chat=1/date=2023-05",
+                                       "first-id": 10, "last-id": 900, "first-date": "2023-05-01T08:00:00",
+                                       "last-date": "2023-05-31T22:10:03", "rows": 880, "bytes": 91234,
+                                       "sha256": "..."}, ...]}
+        A shard is never changed once it is listed, so downstream jobs may process the listed
+        shards in parallel and skip the ones they have seen. Files of the dataset that are not
+        listed are incomplete. The file is replaced atomically.
+        A dump resumed from a checkpoint goes on writing the part that was open at the checkpoint,
+        it is kept under "open" with its size on disk and of its text until it is complete.
+    """
+    fileName : str = '_manifest.json'
+
+    key_version   : str = 'version'
+    key_shards    : str = 'shards'
+    key_path      : str = 'path'
+    key_partition : str = 'partition'
+    key_firstId   : str = 'first-id'
+    key_lastId    : str = 'last-id'
+    key_firstDate : str = 'first-date'
+    key_lastDate  : str = 'last-date'
+    key_rows      : str = 'rows'
+    key_bytes     : str = 'bytes'
+    key_sha256    : str = 'sha256'
+    key_open      : str = 'open'
+    key_textBytes : str = 'text-bytes'
+
+    def __init__(self, root: str):
+        self.root : str = root
+        self.path : str = os.path.join(root, ShardManifest.fileName)
+        self.shards : List[dict] = []
+        # The part to go on with, see ShardedDataset.truncate()
+        self.open : dict = None
+
+    def load(self) -> 'ShardManifest':
+        """ Loads the shards listed in the manifest, if any """
+        self.shards = []
+        self.open = None
+        if not os.path.exists(self.path):
+            return self
+        try:
+            with codecs.open(self.path, 'r', 'utf-8') as ff:
+                data = json.load(ff)
+            self.shards = data[ShardManifest.key_shards]
+            self.open = data.get(ShardManifest.key_open)
+        except (OSError, ValueError, KeyError, TypeError) as ex:
+            raise DumpingError('Unable to load the shard manifest "{}". {}'.format(self.path, ex)) from ex
+        return self
+
+    def save(self) -> None:
+        data = OrderedDict([(ShardManifest.key_version, 1), (ShardManifest.key_shards, self.shards)])
+        if self.open is not None:
+            data[ShardManifest.key_open] = self.open
+        tempPath = self.path + '.tmp'
+        with codecs.open(tempPath, 'w', 'utf-8') as ff:
+            json.dump(data, ff, indent=4, ensure_ascii=False)
+            ff.flush()
+            os.fsync(ff.fileno())
+        os.replace(tempPath, self.path)
+
+    def add(self, path: str, partition: str, firstId: int, lastId: int, firstDate: str, lastDate: str,
+            rows: int, size: int, sha256: str) -> None:
+        self.shards.append(OrderedDict([
+            (ShardManifest.key_path     , path),
+            (ShardManifest.key_partition, partition),
+            (ShardManifest.key_firstId  , firstId),
+            (ShardManifest.key_lastId   , lastId),
+            (ShardManifest.key_firstDate, firstDate),
+            (ShardManifest.key_lastDate , lastDate),
+            (ShardManifest.key_rows     , rows),
+            (ShardManifest.key_bytes    , size),
+            (ShardManifest.key_sha256   , sha256),
+        ]))
+
+    def nextPart(self, partition: str) -> int:
+        """ :return number of the next part of the partition """
+        return sum(1 for shard in self.shards if shard[ShardManifest.key_partition] == partition)
@@ -0,0 +1,199 @@
+""" This Module contains the stream that writes formatted messages into a sharded dataset """
+
+import hashlib
+import os
+import os.path
+from collections import OrderedDict
+from typing import TextIO
+
+from ...utils import Compression
+from .ShardManifest import ShardManifest
+
+
+class ShardedDataset:
+    """ File-like stream that accepts lines prefixed by ShardingExporter with their partition,
+        message id and date ('<partition>\\t<id>\\t<date>\\t<line>') and writes every line into
+        the current part of its partition: <root>/<partition>/part-NNNNN<extension>.
+
+        A part is complete when the next line would take it over 'maxSize' bytes of text
+        (a line larger than that gets a part of its own), when lines of another partition come
+        and on close(). Complete parts are listed in ShardManifest.
+        flush() syncs the open part to disk as it is.
+        Mode 'w' drops the shards of the dataset, mode 'a' (--continue) adds new parts,
+        so an incremental run writes only the partitions of the new messages.
+        tell() is [the number of complete shards, the open part as of the last flush() or None],
+        see truncate(). A resumed dump goes on with the open part.
+    """
+    filePattern : str = 'part-{:05d}{}'
+
+    def __init__(self, path: str, mode: str, maxSize: int, extension: str, compression: Compression):
+        self.path : str = path
+        self.maxSize : int = maxSize
+        self.compression : Compression = compression
+        self.extension : str = extension + compression.suffix
+        # Written at the beginning of every part, e.g. csv header
+        self.preamble : str = ''
+
+        os.makedirs(path, exist_ok=True)
+        if 'w' in mode:
+            ShardedDataset.truncate(path, 0)
+        self.manifest : ShardManifest = ShardManifest(path).load()
+
+        self._tail : str = ''
+        # The part being written and what it holds so far
+        self._part : TextIO = None
+        self._partPath : str = ''
+        self._partition : str = ''
+        self._ids = None
+        self._dates = None
+        self._rows : int = 0
+        self._size : int = 0
+        # The open part as of the last flush
+        self._flushed : dict = None
+        # syncs the directory entries of new files
+        self._dirFd : int = os.open(path, os.O_RDONLY)
+        if 'a' in mode and self.manifest.open is not None:
+            self._reopen(self.manifest.open)
+            # Only the dump resumed from the checkpoint goes on with it
+            self.manifest.open = None
+            self.manifest.save()
+
+    @staticmethod
+    def truncate(path: str, size) -> None:
+        """ Removes shards of the dataset starting with number 'size', and their files.
+            :param size: as of tell(). The part that was open then is cut where it was flushed,
+                         the dataset opened with mode 'a' goes on with it
+        """
+        shards, state = (size, None) if isinstance(size, int) else size
+        manifest = ShardManifest(path).load()
+        openPath = os.path.join(path, state[ShardManifest.key_path]) if state is not None else None
+        leftovers = [shard[ShardManifest.key_path] for shard in manifest.shards[shards:]]
+        if manifest.open is not None:
+            leftovers.append(manifest.open[ShardManifest.key_path])
+        for partPath in leftovers:
+            partPath = os.path.join(path, partPath)
+            if partPath == openPath or not os.path.exists(partPath):
+                continue
+            os.remove(partPath)
+            try:
+                # the partition directory, if it is empty now
+                os.rmdir(os.path.dirname(partPath))
+            except OSError:
+                pass
+        if state is not None:
+            Compression(Compression.detect(openPath)).truncate(openPath, state[ShardManifest.key_bytes])
+        if len(manifest.shards) > shards or manifest.open != state or not os.path.exists(manifest.path):
+            manifest.shards = manifest.shards[:shards]
+            manifest.open = state
+            manifest.save()
+
+    def write(self, text: str) -> int:
+        lines = (self._tail + text).split('\n')
+        self._tail = lines.pop()
+        for line in lines:
+            if line:
+                self._append(line)
+        return len(text)
+
+    def flush(self) -> None:
+        """ Syncs the open part, it stays open """
+        if self._part is None:
+            return
+        self._part.flush()
+        fd = self._part.fileno()
+        os.fsync(fd)
+        os.fsync(self._dirFd)
+        self._flushed = self._state(os.fstat(fd).st_size)
+
+    def fileno(self) -> int:
+        return self._dirFd
+
+    def tell(self) -> list:
+        return [len(self.manifest.shards), self._flushed]
+
+    def close(self) -> None:
+        if self._tail:
+            self._append(self._tail)
+            self._tail = ''
+        self._complete()
+        if self._dirFd is not None:
+            os.fsync(self._dirFd)
+            os.close(self._dirFd)
+            self._dirFd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _append(self, line: str) -> None:
+        partition, id, date, text = line.split('\t', 3)
+        size = len(text.encode('utf-8')) + 1
+        if self._part is not None and (partition != self._partition
+                                       or self._rows > 0 and self._size + size > self.maxSize):
+            self._complete()
+        if self._part is None:
+            self._open(partition)
+            self._ids = [id, id]
+            self._dates = [date, date]
+        else:
+            self._ids[1] = id
+            self._dates[1] = date
+        self._part.write(text)
+        self._part.write('\n')
+        self._rows += 1
+        self._size += size
+
+    def _state(self, offset: int) -> dict:
+        """ The open part, as ShardManifest keeps it """
+        return OrderedDict([
+            (ShardManifest.key_path     , self._partPath),
+            (ShardManifest.key_partition, self._partition),
+            (ShardManifest.key_firstId  , int(self._ids[0])),
+            (ShardManifest.key_lastId   , int(self._ids[1])),
+            (ShardManifest.key_firstDate, self._dates[0]),
+            (ShardManifest.key_lastDate , self._dates[1]),
+            (ShardManifest.key_rows     , self._rows),
+            (ShardManifest.key_bytes    , offset),
+            (ShardManifest.key_textBytes, self._size),
+        ])
+
+    def _reopen(self, state: dict) -> None:
+        """ Goes on with the part that was open at the checkpoint """
+        self._partition = state[ShardManifest.key_partition]
+        self._partPath = state[ShardManifest.key_path]
+        self._part = self.compression.open(os.path.join(self.path, self._partPath), 'a')
+        self._ids = [state[ShardManifest.key_firstId], state[ShardManifest.key_lastId]]
+        self._dates = [state[ShardManifest.key_firstDate], state[ShardManifest.key_lastDate]]
+        self._rows = state[ShardManifest.key_rows]
+        self._size = state[ShardManifest.key_textBytes]
+        self._flushed = state
+
+    def _open(self, partition: str) -> None:
+        os.makedirs(os.path.join(self.path, partition), exist_ok=True)
+        self._partition = partition
+        self._partPath = '{}/{}'.format(partition, self.filePattern.format(self.manifest.nextPart(partition),
+                                                                         self.extension))
+        self._part = self.compression.open(os.path.join(self.path, self._partPath), 'w')
+        self._part.write(self.preamble)
+        self._rows = 0
+        self._size = len(self.preamble.encode('utf-8'))
+
+    def _complete(self) -> None:
+        """ Closes the current part and lists it in the manifest """
+        if self._part is None:
+            return
+        self._part.close()
+        self._part = None
+        self._flushed = None
+        digest = hashlib.sha256()
+        with open(os.path.join(self.path, self._partPath), 'rb') as ff:
+            for chunk in iter(lambda: ff.read(1024 * 1024), b''):
+                digest.update(chunk)
+            os.fsync(ff.fileno())
+            size = ff.tell()
+        self.manifest.add(self._partPath, self._partition, int(self._ids[0]), int(self._ids[1]),
+                          self._dates[0], self._dates[1], self._rows, size, digest.hexdigest())
+        self.manifest.open = None
+        self.manifest.save()
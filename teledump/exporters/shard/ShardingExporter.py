@@ -0,0 +1,85 @@
+import io
+from typing import List
+from typing import TextIO
+from typing import Tuple
+
+from telethon.tl.custom.message import Message
+from telethon.utils import get_peer_id
+
+from ...filters import Filter
+from ...filters import SearchQuery
+from ..Exporter import Exporter
+from ..ExporterContext import ExporterContext
+from .ShardManifest import ShardManifest
+from .ShardedDataset import ShardedDataset
+
+
+class ShardingExporter(Exporter):
+    """ Writes lines of a line based exporter (text, csv, jsonl, media) into a dataset of
+        Hive-style partitions by chat and month, capped in size (--shard):
+            <out>/chat=<chat id>/date=<YYYY-MM>/part-NNNNN.<ext>
+        See ShardedDataset and ShardManifest.
+    """
+    # Extension of the parts, by exporter name
+    extensions = {'text': '.log', 'csv': '.csv', 'jsonl': '.jsonl', 'media': '.csv'}
+
+    def __init__(self, exporter: Exporter, name: str, maxSize: int):
+        """ constructor
+            :param exporter: Exporter that formats messages
+            :param name:     Its name
+            :param maxSize:  Size a part is completed at, bytes of text
+        """
+        super().__init__()
+        self.exporter : Exporter = exporter
+        self.maxSize : int = maxSize
+        self.extension : str = self.extensions.get(name, '.txt')
+        # Parts are compressed one by one, the dataset is not a compressed stream itself
+        self.partCompression = exporter.compression
+
+    def valid(self, msg: Message) -> bool:
+        return self.exporter.valid(msg)
+
+    def pushdown(self) -> Tuple[SearchQuery, Filter]:
+        return self.exporter.pushdown()
+
+    def format(self, msg: Message, context: ExporterContext) -> str:
+        return self._prefix(msg, self._partitionOf(msg)) + self.exporter.format(msg, context)
+
+    def format_batch(self, messages: List[Message], context: ExporterContext) -> List[str]:
+        lines = self.exporter.format_batch(messages, context)
+        if not messages:
+            return lines
+        # All messages of a page come from one chat
+        chat = self._partitionOf(messages[0])
+        return [self._prefix(msg, chat) + line for msg, line in zip(messages, lines)]
+
+    def begin_final_file(self, output: TextIO, context: ExporterContext) -> None:
+        # Every part begins the way a new resulting file does, e.g. with csv header
+        preamble = io.StringIO()
+        isContinue = context.isContinue
+        context.isContinue = False
+        try:
+            self.exporter.begin_final_file(preamble, context)
+        finally:
+            context.isContinue = isContinue
+        output.preamble = preamble.getvalue()
+
+    def open_final_file(self, path: str, mode: str) -> TextIO:
+        return ShardedDataset(path, mode, self.maxSize, self.extension, self.partCompression)
+
+    def truncate_final_file(self, path: str, size: int) -> None:
+        ShardedDataset.truncate(path, size)
+
+    def final_file_size(self, path: str) -> int:
+        return len(ShardManifest(path).load().shards)
+
+    @staticmethod
+    def _partitionOf(msg: Message) -> str:
+        peer = getattr(msg, 'peer_id', None)
+        return 'chat={}'.format(get_peer_id(peer, add_mark=False) if peer is not None else 0)
+
+    @staticmethod
+    def _prefix(msg: Message, chat: str) -> str:
+        date = msg.date
+        return '{}/date={:04d}-{:02d}\t{}\t{}\t'.format(chat, date.year, date.month, msg.id,
+                                                        date.strftime('%Y-%m-%dT%H:%M:%S'))
@@ -0,0 +1,3 @@
+from .ShardManifest import ShardManifest
+from .ShardedDataset import ShardedDataset
+from .ShardingExporter import ShardingExporter
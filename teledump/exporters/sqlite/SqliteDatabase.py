@@ -0,0 +1,195 @@
+""" This Module contains the stream that upserts formatted messages into a SQLite database """
+
+import errno
+import json
+import os
+import os.path
+import sqlite3
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+SCHEMA : str = """
+    CREATE TABLE IF NOT EXISTS chats (
+        chat_id     INTEGER PRIMARY KEY,
+        title       TEXT,
+        username    TEXT
+    );
+    CREATE TABLE IF NOT EXISTS senders (
+        sender_id   INTEGER PRIMARY KEY,
+        name        TEXT,
+        username    TEXT,
+        is_bot      INTEGER
+    );
+    CREATE TABLE IF NOT EXISTS messages (
+        chat_id     INTEGER NOT NULL,
+        message_id  INTEGER NOT NULL,
+        date        TEXT NOT NULL,
+        sender_id   INTEGER,
+        reply_id    INTEGER,
+        content     TEXT,
+        has_media   INTEGER NOT NULL,
+        PRIMARY KEY (chat_id, message_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS messages_date   ON messages (date);
+    CREATE INDEX IF NOT EXISTS messages_sender ON messages (sender_id);
+    CREATE TABLE IF NOT EXISTS media (
+        chat_id     INTEGER NOT NULL,
+        message_id  INTEGER NOT NULL,
+        kind        TEXT NOT NULL,
+        document_id INTEGER,
+        file_name   TEXT,
+        mime_type   TEXT,
+        size        INTEGER,
+        PRIMARY KEY (chat_id, message_id)
+    ) WITHOUT ROWID;
+"""
+
+UPSERT_CHAT : str = """
+    INSERT INTO chats (chat_id, title, username) VALUES (?, ?, ?)
+    ON CONFLICT (chat_id) DO UPDATE SET title = excluded.title, username = excluded.username
+"""
+UPSERT_SENDER : str = """
+    INSERT INTO senders (sender_id, name, username, is_bot) VALUES (?, ?, ?, ?)
+    ON CONFLICT (sender_id) DO UPDATE SET
+        name = excluded.name, username = excluded.username, is_bot = excluded.is_bot
+"""
+UPSERT_MESSAGE : str = """
+    INSERT INTO messages (chat_id, message_id, date, sender_id, reply_id, content, has_media)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (chat_id, message_id) DO UPDATE SET
+        date = excluded.date, sender_id = excluded.sender_id, reply_id = excluded.reply_id,
+        content = excluded.content, has_media = excluded.has_media
+"""
+UPSERT_MEDIA : str = """
+    INSERT INTO media (chat_id, message_id, kind, document_id, file_name, mime_type, size)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (chat_id, message_id) DO UPDATE SET
+        kind = excluded.kind, document_id = excluded.document_id, file_name = excluded.file_name,
+        mime_type = excluded.mime_type, size = excluded.size
+"""
+
+
+class SqliteDatabase:
+    """ File-like stream that accepts rows formatted by SqliteExporter (dicts with 'chat',
+        'sender', 'message' and 'media' rows of the tables) with writeRow(), or lines of them
+        as JSON objects with write() (temp files), and upserts them into a SQLite database.
+
+        Rows are collected into batches of 'batchSize' messages, every batch is written with
+        one prepared statement per table in a single transaction. The database runs in WAL mode.
+        Upserts make re-written messages (--continue overlap, --resume) replace the old rows.
+
+        Mode 'w' recreates the database, mode 'a' adds messages to it.
+        flush() writes and commits the current batch.
+    """
+    batchSize : int = 10000
+
+    def __init__(self, path: str, mode: str):
+        self.path : str = path
+        if 'w' in mode:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        try:
+            self._conn = sqlite3.connect(path, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode = WAL')
+            # every commit ends a batch, so syncing each of them is cheap
+            self._conn.execute('PRAGMA synchronous = FULL')
+            self._conn.executescript(SCHEMA)
+        except sqlite3.Error as ex:
+            raise OSError(errno.EIO, 'Unable to open SQLite database. {}'.format(ex)) from ex
+        # fsync() target of ChatDumpOutput, commits are already durable
+        self._fd : int = os.open(path, os.O_RDONLY)
+
+        self._chats   : Dict[int, tuple] = {}
+        self._senders : Dict[int, tuple] = {}
+        self._messages : List[tuple] = []
+        self._media    : List[tuple] = []
+        self._tail : str = ''
+
+    @staticmethod
+    def latest(path: str) -> Tuple[str, int]:
+        """ :return name of the only chat in the database and its latest message id,
+                    or None if the file is not such a database.
+                    A chat with neither username nor title is named by its id.
+        """
+        if not os.path.isfile(path):
+            return None
+        try:
+            conn = sqlite3.connect('file:{}?mode=ro'.format(path), uri=True)
+            try:
+                rows = conn.execute("""
+                    SELECT messages.chat_id, MAX(message_id), title, username
+                    FROM messages LEFT JOIN chats ON chats.chat_id = messages.chat_id
+                    GROUP BY messages.chat_id""").fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return None
+        if len(rows) != 1:
+            return None
+        chatId, idLastMessage, title, username = rows[0]
+        return ('@' + username) if username else (title or str(chatId)), idLastMessage
+
+    def writeRow(self, row: dict) -> None:
+        self._append(row)
+
+    def write(self, text: str) -> int:
+        lines = (self._tail + text).split('\n')
+        self._tail = lines.pop()
+        for line in lines:
+            if line:
+                self._append(json.loads(line))
+        return len(text)
+
+    def flush(self) -> None:
+        if not self._messages:
+            return
+        cursor = self._conn.cursor()
+        cursor.execute('BEGIN')
+        try:
+            cursor.executemany(UPSERT_CHAT, self._chats.values())
+            cursor.executemany(UPSERT_SENDER, self._senders.values())
+            cursor.executemany(UPSERT_MESSAGE, self._messages)
+            cursor.executemany(UPSERT_MEDIA, self._media)
+            cursor.execute('COMMIT')
+        except BaseException:
+            cursor.execute('ROLLBACK')
+            raise
+        self._chats = {}
+        self._senders = {}
+        self._messages = []
+        self._media = []
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def tell(self) -> int:
+        return 0
+
+    def close(self) -> None:
+        if self._tail:
+            self._append(json.loads(self._tail))
+            self._tail = ''
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            os.close(self._fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _append(self, row: dict) -> None:
+        chat, sender, message, media = row['chat'], row['sender'], row['message'], row['media']
+        self._chats[chat[0]] = tuple(chat)
+        if sender is not None:
+            self._senders[sender[0]] = tuple(sender)
+        self._messages.append(tuple(message))
+        if media is not None:
+            self._media.append(tuple(media))
+        if len(self._messages) >= self.batchSize:
+            self.flush()
@@ -0,0 +1 @@
+from .SqliteDatabase import SqliteDatabase
@@ -1,7 +1,10 @@
 from typing import TextIO
+from typing import Tuple
 
 from telethon.tl.custom.message import Message
 
+from .SearchQuery import SearchQuery
+
 
 class Filter(object):
     def valid(self, msg: Message ) -> bool:
@@ -10,3 +13,15 @@ class Filter(object):
             :returns: whether to include this msg
         """
         return True
+
+    def setSenders(self, senders) -> None:
+        """ Lets the filter take sender names from the cache of the run
+            :param senders: SenderCache shared by exporters
+        """
+
+    def pushdown(self) -> Tuple[SearchQuery, 'Filter']:
+        """ Splits filter into the part Telegram can evaluate on server and the residual one
+            :returns: query for messages.search (None if nothing can be pushed down)
+                      and the filter that still has to be checked locally
+        """
+        return None, self
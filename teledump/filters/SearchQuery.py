@@ -0,0 +1,78 @@
+""" This Module contains the part of a filter that is evaluated by Telegram """
+
+import math
+from typing import List
+
+from telethon.tl.types import PeerUser
+from telethon.tl.types import TypeMessagesFilter
+
+
+class SearchQuery:
+    """ Conditions that Telegram checks on its side (messages.search), so messages that do not
+        match them are never fetched:
+            filter   - InputMessagesFilter* kind of messages (documents, photos, urls ...)
+            fromUser - id of the sender
+            search   - text the messages contain
+        Conditions are and-ed. A filter that declares a query still gets a residual filter
+        for whatever Telegram can not check exactly.
+    """
+
+    def __init__(self, filter: TypeMessagesFilter = None, fromUser: int = None, search: str = None,
+                 part: str = ''):
+        self.filter   : TypeMessagesFilter = filter
+        self.fromUser : int = fromUser
+        self.search   : str = search
+        # Human readable conditions that were pushed down
+        self.parts : List[str] = [part] if part else []
+
+        # Messages in the chat, counted by resolve()
+        self.total : int = 0
+        # Messages matching the query, reported with the first page or -1
+        self.matched : int = -1
+
+        self._fromPeer = None
+
+    def merge(self, other: 'SearchQuery') -> bool:
+        """ Adds conditions of 'other' query.
+            :return False if both queries set the same condition and can not be combined
+        """
+        if (self.filter is not None and other.filter is not None) \
+                or (self.fromUser is not None and other.fromUser is not None) \
+                or (self.search is not None and other.search is not None):
+            return False
+        if other.filter is not None:
+            self.filter = other.filter
+        if other.fromUser is not None:
+            self.fromUser = other.fromUser
+        if other.search is not None:
+            self.search = other.search
+        self.parts.extend(other.parts)
+        return True
+
+    async def resolve(self, client, peer) -> None:
+        """ Resolves the sender and counts messages in the chat.
+            Raises ValueError when the sender is unknown to the session.
+        """
+        if self.fromUser is not None:
+            self._fromPeer = await client.get_input_entity(PeerUser(self.fromUser))
+        self.total = (await client.get_messages(peer, limit=0)).total
+
+    def kwargs(self) -> dict:
+        """ Keyword arguments of TelegramClient.get_messages() """
+        kwargs = {}
+        if self.filter is not None:
+            kwargs['filter'] = self.filter
+        if self._fromPeer is not None:
+            kwargs['from_user'] = self._fromPeer
+        if self.search is not None:
+            kwargs['search'] = self.search
+        return kwargs
+
+    def savedPages(self, pageSize: int) -> int:
+        """ Estimated number of pages that were not fetched thanks to the query """
+        if self.matched < 0:
+            return 0
+        return max(math.ceil(self.total / pageSize) - math.ceil(self.matched / pageSize), 0)
+
+    def __str__(self):
+        return ', '.join(self.parts)
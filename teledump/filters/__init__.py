@@ -1,8 +1,10 @@
 from typing import *
 from .Filter import Filter
+from .SearchQuery import SearchQuery
 from .list.HasMedia import HasMedia
 
 from .list.All import All
+from .list.Expression import Expression
 from .list.HasMedia import HasMedia
 
 
@@ -20,9 +22,15 @@ def exist( name : str) -> bool:
     return name in _filters
 
 
+def check( name : str) -> None:
+    """ Raises FilterError unless name is a known filter or a valid filter expression """
+    if name not in _filters:
+        Expression(name)
+
+
 def load(name: str, filter : Filter) -> Union[Filter,None]:
     if name in _filters:
         return _filters[name]()
     if name == '':
         return filter
-    return None
+    return Expression(name, filter)
@@ -0,0 +1,168 @@
+""" This Module contains the parser of filter expressions """
+
+import re
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from ...exceptions import FilterError
+from . import Fields
+from . import Predicates
+from .Fields import Field
+from .Nodes import And
+from .Nodes import Compare
+from .Nodes import Node
+from .Nodes import Not
+from .Nodes import Or
+
+
+class ExpressionParser:
+    """ Parses filter expression into a tree of nodes.
+
+        expr       := term ( ('or' | '||') term )*
+        term       := factor ( ('and' | '&&') factor )*
+        factor     := ('not' | '!') factor | '(' expr ')' | comparison
+        comparison := field op value | field 'in' value '..' value | field
+        op         := == | != | <> | > | >= | < | <= | @= | #= | $=
+
+        Text values may list alternatives separated by '|', e.g. ext @= pdf|zip.
+        Values with spaces or special characters must be quoted.
+    """
+    _TOKEN = re.compile(r'''
+        \s*(?:
+            (?P<str>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+           |(?P<op>==|!=|<>|>=|<=|@=|\#=|\$=|&&|\|\||\.\.|[()<>!])
+           |(?P<word>(?:[^\s()"'<>=!&|.@\#$]|[@\#$](?!=)|\|(?!\|)|\.(?!\.))+)
+        )''', re.VERBOSE)
+    _COMPARE_OPS = ('==', '!=', '<>', '>', '>=', '<', '<=', '@=', '#=', '$=')
+
+    def __init__(self, fields: Dict[str, Field] = None):
+        self.fields : Dict[str, Field] = Fields.FIELDS if fields is None else fields
+        self._tokens : List[Tuple[str, str]] = []
+        self._pos : int = 0
+
+    def parse(self, text: str) -> Node:
+        self._tokens = self._tokenize(text)
+        self._pos = 0
+        if not self._tokens:
+            raise FilterError('Filter expression is empty')
+        node = self._expr()
+        if self._pos < len(self._tokens):
+            raise FilterError('Unexpected "{}" in filter expression'.format(self._tokens[self._pos][1]))
+        return node
+
+    def _tokenize(self, text: str) -> List[Tuple[str, str]]:
+        tokens = []
+        pos = 0
+        text = text.rstrip()
+        while pos < len(text):
+            match = self._TOKEN.match(text, pos)
+            if match is None or match.end() == pos:
+                raise FilterError('Unexpected "{}" in filter expression'.format(text[pos:].strip()))
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == 'str':
+                value = re.sub(r'\\(.)', r'\1', value[1:-1])
+            tokens.append((kind, value))
+            pos = match.end()
+        return tokens
+
+    def _peek(self) -> Tuple[str, str]:
+        return self._tokens[self._pos] if self._pos < len(self._tokens) else (None, None)
+
+    def _isKeyword(self, *keywords: str) -> bool:
+        kind, value = self._peek()
+        if kind == 'op':
+            return value in keywords
+        return kind == 'word' and value.lower() in keywords
+
+    def _next(self) -> Tuple[str, str]:
+        token = self._peek()
+        if token[0] is None:
+            raise FilterError('Unexpected end of filter expression')
+        self._pos += 1
+        return token
+
+    def _expr(self) -> Node:
+        children = [self._term()]
+        while self._isKeyword('or', '||'):
+            self._next()
+            children.append(self._term())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def _term(self) -> Node:
+        children = [self._factor()]
+        while self._isKeyword('and', '&&'):
+            self._next()
+            children.append(self._factor())
+        return children[0] if len(children) == 1 else And(children)
+
+    def _factor(self) -> Node:
+        if self._isKeyword('not', '!'):
+            self._next()
+            return Not(self._factor())
+        if self._isKeyword('('):
+            self._next()
+            node = self._expr()
+            if not self._isKeyword(')'):
+                raise FilterError('Missing ")" in filter expression')
+            self._next()
+            return node
+        return self._comparison()
+
+    def _comparison(self) -> Node:
+        kind, name = self._next()
+        if kind != 'word':
+            raise FilterError('Expected field name instead of "{}"'.format(name))
+        field = self.fields.get(name.lower())
+        if field is None:
+            raise FilterError('Unknown field "{}". Known fields: {}'.format(name, ', '.join(sorted(self.fields))))
+
+        if self._isKeyword('in'):
+            self._next()
+            low = self._value()
+            if not self._isKeyword('..'):
+                raise FilterError('Expected ".." in range of "{}"'.format(name))
+            self._next()
+            high = self._value()
+            return self._range(field, low, high)
+
+        kind, op = self._peek()
+        if kind == 'op' and op in self._COMPARE_OPS:
+            self._next()
+            return self._compare(field, op, self._value())
+
+        # bare flag, e.g. has-media
+        if field.type != Fields.TYPE_BOOL:
+            raise FilterError('Field "{}" must be compared to a value'.format(name))
+        return Compare(field, '==', ['true'], Predicates.boolean('==', True), Predicates.COST_NUMBER)
+
+    def _value(self) -> str:
+        kind, value = self._next()
+        if kind not in ('word', 'str'):
+            raise FilterError('Expected value instead of "{}"'.format(value))
+        return value
+
+    def _compare(self, field: Field, op: str, value: str) -> Node:
+        if field.type == Fields.TYPE_INT:
+            predicate = Predicates.number(op, Predicates.parseNumber(value))
+            cost = Predicates.COST_NUMBER
+        elif field.type == Fields.TYPE_DATE:
+            predicate = Predicates.date(op, Predicates.parseDate(value))
+            cost = Predicates.COST_NUMBER
+        elif field.type == Fields.TYPE_BOOL:
+            predicate = Predicates.boolean(op, Predicates.parseBool(value))
+            cost = Predicates.COST_NUMBER
+        else:
+            predicate = Predicates.text(op, value.split('|'))
+            cost = Predicates.textCost(op)
+        return Compare(field, op, [value], predicate, cost)
+
+    def _range(self, field: Field, low: str, high: str) -> Node:
+        if field.type == Fields.TYPE_INT:
+            predicate = Predicates.numberRange(Predicates.parseNumber(low), Predicates.parseNumber(high))
+        elif field.type == Fields.TYPE_DATE:
+            predicate = Predicates.dateRange(Predicates.parseDate(low), Predicates.parseDate(high))
+        else:
+            raise FilterError('Field "{}" does not support ranges'.format(field.name))
+        return Compare(field, 'in', [low, high], predicate, Predicates.COST_NUMBER)
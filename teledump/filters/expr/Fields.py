@@ -0,0 +1,140 @@
+""" This Module contains message fields that filter expressions can refer to """
+
+import os.path
+import re
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from telethon.tl.custom.message import Message
+from telethon.tl.types import DocumentAttributeFilename
+from telethon.tl.types import InputMessagesFilterPhotos
+from telethon.tl.types import InputMessagesFilterUrl
+
+from ..SearchQuery import SearchQuery
+from . import Predicates
+
+
+TYPE_INT  : str = 'int'
+TYPE_TEXT : str = 'text'
+TYPE_DATE : str = 'date'
+TYPE_BOOL : str = 'bool'
+
+
+# (op, values) -> query Telegram evaluates instead, whether it is exact
+Pushdown = Callable[[str, List[str]], Tuple[SearchQuery, bool]]
+
+
+class Field:
+    """ Named message attribute of a known type.
+        'cost' is relative price of getting the value, cheaper fields are checked first.
+        'pushdown' turns a comparison into SearchQuery, if Telegram can evaluate it.
+    """
+
+    # pylint: disable=too-few-public-methods
+    def __init__(self, name: str, type: str, getter: Callable[[Message], object], cost: int,
+                 pushdown: Pushdown = None):
+        self.name   : str = name
+        self.type   : str = type
+        self.getter : Callable[[Message], object] = getter
+        self.cost   : int = cost
+        self.pushdown : Pushdown = pushdown
+
+
+def _document(msg: Message):
+    return getattr(getattr(msg, 'media', None), 'document', None)
+
+
+def _fileName(msg: Message) -> str:
+    document = _document(msg)
+    if document is not None:
+        for attr in document.attributes:
+            if isinstance(attr, DocumentAttributeFilename):
+                return attr.file_name
+    return ''
+
+
+def _mediaName(msg: Message) -> str:
+    media = getattr(msg, 'media', None)
+    if not media:
+        return ''
+    name = type(media).__name__
+    return name[len('MessageMedia'):].lower() if name.startswith('MessageMedia') else name.lower()
+
+
+def _senderName(msg: Message, senders=None) -> str:
+    # imported here, exporters package depends on filters
+    from ...exporters.FormatData import FormatData
+    return FormatData(msg, senders).name
+
+
+def _pushSender(op: str, values: List[str]) -> Tuple[SearchQuery, bool]:
+    if op != '==':
+        return None, False
+    return SearchQuery(fromUser=Predicates.parseNumber(values[0]), part='sender-id == ' + values[0]), True
+
+
+def _pushText(op: str, values: List[str]) -> Tuple[SearchQuery, bool]:
+    # Telegram searches whole words and their prefixes, so only a text equal to one word is
+    # sure to be found, not a substring (#=). The exact match is checked locally
+    if op not in ('==', '@=') or not re.fullmatch(r'\w+', values[0]):
+        return None, False
+    return SearchQuery(search=values[0], part='text {} {}'.format(op, values[0])), False
+
+
+# Telegram search for documents leaves out videos, voice notes, stickers and GIFs,
+# so media == document is checked locally only
+_MEDIA_FILTERS = {
+    'photo'   : InputMessagesFilterPhotos,
+    'webpage' : InputMessagesFilterUrl,
+}
+
+
+def _pushMedia(op: str, values: List[str]) -> Tuple[SearchQuery, bool]:
+    kind = _MEDIA_FILTERS.get(values[0].lower()) if op in ('==', '@=') else None
+    if kind is None:
+        return None, False
+    return SearchQuery(filter=kind(), part='media == ' + values[0]), False
+
+
+def _fields(*fields: Field) -> Dict[str, Field]:
+    return {field.name: field for field in fields}
+
+
+FIELDS : Dict[str, Field] = _fields(
+    Field('id'        , TYPE_INT , lambda msg: msg.id, 1),
+    Field('date'      , TYPE_DATE, lambda msg: msg.date, 1),
+    Field('sender-id' , TYPE_INT , lambda msg: getattr(msg, 'sender_id', None) or 0, 1, _pushSender),
+    Field('reply-id'  , TYPE_INT , lambda msg: getattr(msg, 'reply_to_msg_id', None) or 0, 1),
+    Field('is-reply'  , TYPE_BOOL, lambda msg: getattr(msg, 'reply_to_msg_id', None) is not None, 1),
+    Field('is-forward', TYPE_BOOL, lambda msg: getattr(msg, 'fwd_from', None) is not None, 1),
+    Field('views'     , TYPE_INT , lambda msg: getattr(msg, 'views', None) or 0, 1),
+    Field('forwards'  , TYPE_INT , lambda msg: getattr(msg, 'forwards', None) or 0, 1),
+    Field('has-media' , TYPE_BOOL, lambda msg: bool(getattr(msg, 'media', None)), 1),
+    Field('text'      , TYPE_TEXT, lambda msg: getattr(msg, 'message', None) or '', 1, _pushText),
+    Field('media'     , TYPE_TEXT, _mediaName, 2, _pushMedia),
+    Field('size'      , TYPE_INT , lambda msg: getattr(_document(msg), 'size', 0), 2),
+    Field('mime-type' , TYPE_TEXT, lambda msg: getattr(_document(msg), 'mime_type', None) or '', 2),
+    Field('file'      , TYPE_TEXT, _fileName, 3),
+    Field('ext'       , TYPE_TEXT, lambda msg: os.path.splitext(_fileName(msg))[1][1:], 3),
+    Field('sender'    , TYPE_TEXT, _senderName, 10),
+)
+
+
+class SenderNames:
+    """ Getter of the sender field that takes names from SenderCache of the run once it is set """
+
+    # pylint: disable=too-few-public-methods
+    def __init__(self):
+        self.senders = None
+
+    def __call__(self, msg: Message) -> str:
+        return _senderName(msg, self.senders)
+
+
+def withSenders(names: SenderNames) -> Dict[str, Field]:
+    """ FIELDS whose sender field is 'names' """
+    fields = dict(FIELDS)
+    fields['sender'] = Field('sender', TYPE_TEXT, names, 10)
+    return fields
@@ -0,0 +1,141 @@
+""" This Module contains the syntax tree of filter expressions """
+
+from typing import Callable
+from typing import List
+from typing import Tuple
+
+from telethon.tl.custom.message import Message
+
+from ..SearchQuery import SearchQuery
+from .Fields import Field
+from .Predicates import Predicate
+
+Compiled = Callable[[Message], bool]
+
+
+class Node:
+    """ Expression node. Compiles into a closure msg -> bool """
+
+    def cost(self) -> int:
+        return 0
+
+    def compile(self) -> Compiled:
+        return lambda msg: True
+
+    def pushdown(self) -> Tuple[SearchQuery, 'Node']:
+        """ :return query Telegram can evaluate instead of the node (or None)
+                    and the residual node to check locally (None if the query is exact)
+        """
+        return None, self
+
+
+class Compare(Node):
+    """ Applies predicate to a message field, e.g. size > 10m """
+
+    def __init__(self, field: Field, op: str, values: List[str], predicate: Predicate, cost: int):
+        self.field : Field = field
+        self.op : str = op
+        self.values : List[str] = values
+        self.predicate : Predicate = predicate
+        self._cost : int = cost
+
+    def cost(self) -> int:
+        return self.field.cost + self._cost
+
+    def compile(self) -> Compiled:
+        getter = self.field.getter
+        predicate = self.predicate
+        return lambda msg: predicate(getter(msg))
+
+    def pushdown(self) -> Tuple[SearchQuery, Node]:
+        if self.field.pushdown is None or self.op == 'in':
+            return None, self
+        query, isExact = self.field.pushdown(self.op, self.values)
+        if query is None:
+            return None, self
+        return query, None if isExact else self
+
+    def __str__(self):
+        return '{} {} {}'.format(self.field.name, self.op, '..'.join(self.values))
+
+
+class Not(Node):
+    def __init__(self, child: Node):
+        self.child : Node = child
+
+    def cost(self) -> int:
+        return self.child.cost()
+
+    def compile(self) -> Compiled:
+        child = self.child.compile()
+        return lambda msg: not child(msg)
+
+    def __str__(self):
+        return 'not ({})'.format(self.child)
+
+
+class _Chain(Node):
+    """ Short-circuiting chain of children, ordered from the cheapest to the most expensive """
+    keyword : str = ''
+
+    def __init__(self, children: List[Node]):
+        self.children : List[Node] = []
+        for child in children:
+            # flatten (a and b) and c into a and b and c
+            if type(child) is type(self):
+                self.children.extend(child.children)
+            else:
+                self.children.append(child)
+        self.children.sort(key=lambda child: child.cost())
+
+    def cost(self) -> int:
+        return sum(child.cost() for child in self.children)
+
+    def compile(self) -> Compiled:
+        compiled = [child.compile() for child in self.children]
+        result = compiled[-1]
+        for child in reversed(compiled[:-1]):
+            result = self._link(child, result)
+        return result
+
+    def _link(self, first: Compiled, rest: Compiled) -> Compiled:
+        return rest
+
+    def __str__(self):
+        return ' {} '.format(self.keyword).join('({})'.format(child) for child in self.children)
+
+
+class And(_Chain):
+    keyword : str = 'and'
+
+    def pushdown(self) -> Tuple[SearchQuery, Node]:
+        """ Pushes down every child whose query can be combined with the others """
+        query = None
+        residual = []
+        for child in self.children:
+            childQuery, childResidual = child.pushdown()
+            if childQuery is None:
+                residual.append(child)
+                continue
+            if query is None:
+                query = childQuery
+            elif not query.merge(childQuery):
+                residual.append(child)
+                continue
+            if childResidual is not None:
+                residual.append(childResidual)
+        if query is None:
+            return None, self
+        if not residual:
+            return query, None
+        return query, residual[0] if len(residual) == 1 else And(residual)
+
+    def _link(self, first: Compiled, rest: Compiled) -> Compiled:
+        return lambda msg: first(msg) and rest(msg)
+
+
+class Or(_Chain):
+    keyword : str = 'or'
+
+    def _link(self, first: Compiled, rest: Compiled) -> Compiled:
+        return lambda msg: first(msg) or rest(msg)
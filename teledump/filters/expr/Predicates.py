@@ -0,0 +1,154 @@
+""" This Module contains value predicates of filter expressions.
+    Every function validates its operands once and returns a closure that only compares.
+"""
+
+import operator
+import re
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from typing import Callable
+from typing import List
+from typing import Tuple
+
+from ...exceptions import FilterError
+
+Predicate = Callable[[object], bool]
+
+# Relative cost of the predicate kinds, cheaper predicates are evaluated first
+COST_NUMBER : int = 1
+COST_TEXT   : int = 2
+COST_REGEX  : int = 5
+
+_NUM_OPS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<>': operator.ne,
+    '>' : operator.gt,
+    '>=': operator.ge,
+    '<' : operator.lt,
+    '<=': operator.le,
+}
+
+_SUFFIXES = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+def parseNumber(ss: str) -> int:
+    """ Parses integer, optionally with k/m/g (binary) suffix """
+    ss = ss.strip().lower()
+    factor = 1
+    if ss and ss[-1] in _SUFFIXES:
+        factor = _SUFFIXES[ss[-1]]
+        ss = ss[:-1]
+    try:
+        return int(ss) * factor
+    except ValueError:
+        raise FilterError('"{}" is not a number'.format(ss))
+
+
+def parseDate(ss: str) -> Tuple[datetime, datetime]:
+    """ Parses YYYY-MM-DD[THH:MM[:SS]] (UTC) into the [start, end) interval it denotes """
+    formats = (
+        ('%Y-%m-%d'         , timedelta(days=1)),
+        ('%Y-%m-%dT%H:%M'   , timedelta(minutes=1)),
+        ('%Y-%m-%dT%H:%M:%S', timedelta(seconds=1)),
+        ('%Y-%m'            , None),
+    )
+    for fmt, length in formats:
+        try:
+            start = datetime.strptime(ss.strip(), fmt).replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+        if length is None:
+            # a whole month
+            end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+        else:
+            end = start + length
+        return start, end
+    raise FilterError('"{}" is not a date, expected YYYY-MM-DD[THH:MM[:SS]]'.format(ss))
+
+
+def number(op: str, num: int) -> Predicate:
+    if op not in _NUM_OPS:
+        raise FilterError('Operator "{}" is not applicable to numbers'.format(op))
+    compare = _NUM_OPS[op]
+    return lambda value: compare(value, num)
+
+
+def numberRange(low: int, high: int) -> Predicate:
+    return lambda value: low <= value <= high
+
+
+def date(op: str, interval: Tuple[datetime, datetime]) -> Predicate:
+    start, end = interval
+    if op == '==':
+        return lambda value: start <= value < end
+    if op in ('!=', '<>'):
+        return lambda value: not start <= value < end
+    if op == '<':
+        return lambda value: value < start
+    if op == '<=':
+        return lambda value: value < end
+    if op == '>':
+        return lambda value: value >= end
+    if op == '>=':
+        return lambda value: value >= start
+    raise FilterError('Operator "{}" is not applicable to dates'.format(op))
+
+
+def dateRange(low: Tuple[datetime, datetime], high: Tuple[datetime, datetime]) -> Predicate:
+    start, end = low[0], high[1]
+    return lambda value: start <= value < end
+
+
+def text(op: str, texts: List[str]) -> Predicate:
+    """ Case insensitive text predicates.
+        ==, @= : equals any of 'texts'
+        #=     : contains any of 'texts'
+        $=     : matches any of regular expressions 'texts'
+        !=, <> : equals none of 'texts'
+    """
+    texts = [tt.lower() for tt in texts]
+    if op in ('==', '@='):
+        if len(texts) == 1:
+            single = texts[0]
+            return lambda value: value.lower() == single
+        choices = frozenset(texts)
+        return lambda value: value.lower() in choices
+    if op in ('!=', '<>'):
+        choices = frozenset(texts)
+        return lambda value: value.lower() not in choices
+    if op == '#=':
+        if len(texts) == 1:
+            single = texts[0]
+            return lambda value: single in value.lower()
+        return lambda value: any(tt in value.lower() for tt in texts)
+    if op == '$=':
+        try:
+            pattern = re.compile('|'.join('(?:{})'.format(tt) for tt in texts), re.IGNORECASE)
+        except re.error as ex:
+            raise FilterError('Invalid regular expression "{}". {}'.format('|'.join(texts), ex))
+        search = pattern.search
+        return lambda value: search(value) is not None
+    raise FilterError('Operator "{}" is not applicable to text'.format(op))
+
+
+def textCost(op: str) -> int:
+    return COST_REGEX if op == '$=' else COST_TEXT
+
+
+def boolean(op: str, flag: bool) -> Predicate:
+    if op == '==':
+        return (lambda value: bool(value)) if flag else (lambda value: not value)
+    if op in ('!=', '<>'):
+        return (lambda value: not value) if flag else (lambda value: bool(value))
+    raise FilterError('Operator "{}" is not applicable to flags'.format(op))
+
+
+def parseBool(ss: str) -> bool:
+    ss = ss.strip().lower()
+    if ss in ('true', 'yes', '1'):
+        return True
+    if ss in ('false', 'no', '0'):
+        return False
+    raise FilterError('"{}" is not a flag, expected true or false'.format(ss))
@@ -0,0 +1,2 @@
+from .Nodes import Node
+from .ExpressionParser import ExpressionParser
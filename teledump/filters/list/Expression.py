@@ -0,0 +1,47 @@
+from telethon.tl.custom.message import Message
+
+from ..Filter import Filter
+from ..expr import ExpressionParser
+from ..expr import Fields
+from ..expr import Node
+from .All import All
+
+
+class Expression(Filter):
+    """ Filter defined by a boolean expression, e.g.
+            has-media and (ext @= pdf|epub or size in 1m..50m) and date >= 2023-01-01
+        The expression is compiled once into short-circuiting closures.
+        'base' filter (the exporter) is checked before the expression.
+    """
+    def __init__(self, text: str, base: Filter = None, tree: Node = None, senderNames: Fields.SenderNames = None):
+        self.text : str = text
+        # Shared with the residual filter of pushdown(), its tree refers to it
+        self._senderNames : Fields.SenderNames = Fields.SenderNames() if senderNames is None else senderNames
+        self.tree : Node = ExpressionParser(Fields.withSenders(self._senderNames)).parse(text) if tree is None else tree
+        self.base : Filter = base
+        self._valid = self.tree.compile()
+
+    def setSenders(self, senders) -> None:
+        if self.base is not None:
+            self.base.setSenders(senders)
+        self._senderNames.senders = senders
+
+    def valid(self, msg: Message ) -> bool:
+        if self.base is not None and not self.base.valid(msg):
+            return False
+        return self._valid(msg)
+
+    def pushdown(self):
+        query, base = self.base.pushdown() if self.base is not None else (None, None)
+        treeQuery, tree = self.tree.pushdown()
+        if treeQuery is None:
+            tree = self.tree
+        elif query is None:
+            query = treeQuery
+        elif not query.merge(treeQuery):
+            tree = self.tree
+        if query is None:
+            return None, self
+        if tree is None:
+            return query, base if base is not None else All()
+        return query, Expression(str(tree), base, tree, self._senderNames)
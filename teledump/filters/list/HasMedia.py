@@ -8,3 +8,4 @@ class HasMedia(Filter):
     def valid(self, msg: Message ) -> bool:
         return isinstance(msg.media,telethon.tl.types.MessageMediaDocument)
 
+    # Not pushed down: Telegram search for documents leaves out videos, voice notes, stickers and GIFs
@@ -5,28 +5,98 @@ Normal mode:
   telegram-messages-dump -c <chat_name> -p <phone_num> [-l <count>] [-o <file>] [-cl] [...]
   telegram-messages-dump --chat=<chat_name> --phone=<phone_num> [--limit=<count>] [--out <file>]
 
+Resume mode:
+  telegram-messages-dump --resume -p <phone_num> -o <file> [...]
+
+Batch mode:
+  telegram-messages-dump --batch <manifest> -p <phone_num> [--jobs <count>] [...]
+
+Offline mode:
+  telegram-messages-dump --from-archive <dir> -o <file> [-e <exporter>] [-f <filter>] [-l <count>]
+
 Continuous mode:
   telegram-messages-dump --continue -p <phone_num> -o <file> [-cl] [...]
   telegram-messages-dump --continue=<MSG_ID> -p <phone_num> -o <file> -e <exporter> -c <chat_name>
 
+Follow mode:
+  telegram-messages-dump --continue --follow -p <phone_num> -o <file> [--flush-interval <sec>]
+
 Where:
     -c,  --chat      Unique name of a channel/chat. E.g. @python.
     -p,  --phone     Phone number. E.g. +380503211234.
     -o,  --out       Output file name or full path. (Default: telegram_<chatName>.log)
-    -e,  --exp       Exporter name. text | jsonl | csv (Default: 'text')
+    -e,  --exp       Exporter name. text | jsonl | csv | media | parquet | sqlite (Default: 'text')
+                     parquet writes a dataset directory of part-NNNNN.parquet files (requires pyarrow),
+                     --expdata "row-group=<count>" sets messages per row group. (Default: 65536)
+                     --expdata "part-size=<count>" sets row groups per file. (Default: 16)
+                     sqlite upserts messages, senders and media into a database, --continue reads
+                     the latest message id from it when .meta file is missing.
+    -f,  --filter    Filter name (all | has-media) or expression, e.g.
+                     "has-media and (ext @= pdf|epub or size in 1m..50m) and date >= 2023-01-01"
+                     Fields: id, date, sender, sender-id, reply-id, is-reply, is-forward, views, forwards,
+                     text, has-media, media, size, mime-type, file, ext.
+                     Operators: == != > >= < <=, in A..B, @= (equals), #= (contains), $= (regex),
+                     and, or, not, parentheses.
+      ,  --pushdown  Let Telegram search evaluate media == photo|webpage, sender-id and whole-word text
+                     conditions, so fewer pages are fetched. The messages dumped are the same.
+                     (Default: every message is checked locally)
       ,  --continue  Continue previous dump. Supports optional integer param <message_id>.
     -l,  --limit     Number of the latest messages to dump, 0 means no limit. (Default: 100)
     -cl, --clean     Clean session sensitive data (e.g. auth token) on exit. (Default: False)
     -v,  --verbose   Verbose mode. (Default: False)
       ,  --addbom    Add BOM to the beginning of the output file. (Default: False)
+      ,  --compress  gzip | zstd | none. Compress the output file and temp files as they are written,
+                     --continue appends a new gzip member (zstd frame). zstd requires zstandard.
+                     (Default: by extension of the output file, .gz or .zst)
+      ,  --shard     Write a directory of parts of at most this size (e.g. 256m) partitioned by month:
+                     <out>/chat=<id>/date=<YYYY-MM>/part-NNNNN.<ext>, listed with their message id
+                     and date ranges, row counts and checksums in <out>/_manifest.json.
+                     --continue adds new parts. Not applicable to parquet and sqlite exporters.
+      ,  --pipeline  Fetch, format and write messages concurrently. (Default: False)
+      ,  --prefetch  Number of pages fetched ahead in --pipeline mode. (Default: 4)
+      ,  --parallel  Split ids of the chat into this many ranges fetched concurrently, as far as
+                     the request rate allows. Dumps the whole history (or --since window),
+                     not allowed with --limit and --ascending. (Default: 1)
+      ,  --ascending Fetch oldest messages first and append them straight to the output file.
+      ,  --takeout   Fetch history within a takeout (data export) session, which has
+                     looser flood limits. Telegram may ask to confirm it in another app first,
+                     until then the dump goes on in the normal session.
+      ,  --since     Dump messages dated from this UTC date on: YYYY-MM[-DD[THH:MM[:SS]]].
+      ,  --until     Dump messages dated up to the end of this UTC date. Paging starts right at it.
+                     Both imply --limit 0 unless it is given. --continue keeps the bounds of
+                     the dump unless they are given again, e.g. a later --until rolls the window.
+      ,  --resume    Resume an interrupted dump from its checkpoint.
+      ,  --follow    Once the history is dumped, keep running and append new messages of the chat
+                     as they come, until interrupted. Runs with --continue the same way.
+                     Not allowed with --until, --download, --store and --batch.
+      ,  --flush-interval  Seconds new messages are collected before they are appended to the
+                     output file and .meta is updated, in --follow mode. (Default: 5)
+      ,  --download  Download documents exported by media exporter into this directory.
+      ,  --download-workers  Number of files downloaded at a time. (Default: 4)
+      ,  --download-parts    Number of parallel chunk streams per file. (Default: 4)
+      ,  --bandwidth Total download rate cap in KB/sec, 0 means no limit. (Default: 0)
+      ,  --store     Keep downloaded documents once in this content-addressed store, shared by all chats.
+      ,  --archive   Also keep raw fetched messages with their senders and chats in this archive directory.
+      ,  --from-archive  Export messages of the archive directory without connecting to Telegram.
+      ,  --sender-cache  Keep resolved sender names in this file between runs, so --continue
+                     writes senders under the names of the previous runs.
+      ,  --stats     Write per-stage timings, page latencies and counters of the run into this JSON file.
+      ,  --prometheus  Write the same statistics into this Prometheus textfile collector file.
+      ,  --batch     JSON manifest of chats to dump concurrently over one session.
+      ,  --jobs      Number of chats dumped at a time in --batch mode. (Default: 4)
     -h,  --help      Show this help message and exit.
 """
 import os
 import sys
 import logging
 from .TelegramDumper import TelegramDumper
+from .archive import ArchiveExporter
+from .batch import BatchDumper
+from .batch import BatchManifest
 from .settings import ChatDumpSettings
+from .settings import ChatDumpCheckpoint
 from .settings import ChatDumpMetaFile
+from .exceptions import ManifestError
 from .exceptions import MetaFileError
 from . import exporters
 from . import filters
@@ -41,9 +111,13 @@ class Main:
     def main(self):
         self.loadSettings()
         self.loadLogger()
+        if self.settings.batchFile:
+            self.batch()
         self.loadMetaData()
         self.loadExporter()
         self.loadFilter()
+        if self.settings.archiveSource:
+            self.export()
 
         dumper = TelegramDumper(
             os.path.basename(__file__),
@@ -54,6 +128,20 @@ class Main:
         rc = dumper.run()
         sys.exit(rc)
 
+    def export(self):
+        rc = ArchiveExporter(self.settings, self.metadata, self.exporter, self.filter).run()
+        sys.exit(rc)
+
+    def batch(self):
+        try:
+            jobs = BatchManifest(self.settings.batchFile).load(self.settings)
+        except ManifestError as ex:
+            print("ERROR: {}".format(ex))
+            sys.exit(1)
+        dumper = BatchDumper(os.path.basename(__file__), self.settings, jobs)
+        rc = dumper.run()
+        sys.exit(rc)
+
     def loadLogger(self):
         default_format = '%(levelname)s:%(message)s'
         level = logging.INFO
@@ -65,7 +153,9 @@ class Main:
         self.metadata = ChatDumpMetaFile(self.settings.outFile)
         # when user specified --continue
         try:
-            if self.settings.isIncremental and self.settings.idLastMessage == -1:
+            if self.settings.isResumed:
+                ChatDumpCheckpoint(self.settings.outFile).merge(self.settings)
+            elif self.settings.isIncremental and self.settings.idLastMessage == -1:
                 self.metadata.merge(self.settings)
         except MetaFileError as ex:
             print("ERROR: {}".format(ex))
@@ -74,6 +164,9 @@ class Main:
     def loadExporter(self):
         self.exporter = exporters.load(self.settings.exporter)
         self.exporter.setConfig(self.settings.exporterConfig)
+        self.exporter.setCompression(self.settings.compression)
+        if self.settings.shardSize:
+            self.exporter = exporters.shard(self.exporter, self.settings.exporter, self.settings.shardSize)
 
     def loadFilter(self):
         self.filter = filters.load(self.settings.filter, self.exporter)
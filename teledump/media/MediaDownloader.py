@@ -0,0 +1,287 @@
+""" This Module contains concurrent, resumable downloader of media documents """
+
+import asyncio
+import codecs
+import json
+import logging
+import math
+import os
+import os.path
+import re
+from typing import Dict
+from typing import List
+from typing import Set
+
+from telethon import TelegramClient
+from telethon import utils
+from telethon.errors import FileReferenceExpiredError
+from telethon.errors import FloodWaitError
+from telethon.errors import RPCError
+from telethon.tl.custom.message import Message
+from telethon.tl.functions.upload import GetFileHashesRequest
+from telethon.tl.types import Document
+from telethon.tl.types import FileHash
+from telethon.tl.types import MessageMediaDocument
+
+from ..network import BandwidthLimiter
+from ..settings import ChatDumpSettings
+from .MediaStore import MediaStore
+
+
+class MediaFile:
+    """ A document to download, the path it is saved into
+        and the paths that are linked to it when it is kept in MediaStore.
+        The chat and id of the message it came from let its expired file reference be renewed.
+    """
+
+    # pylint: disable=too-few-public-methods
+    def __init__(self, document: Document, path: str, isStored: bool = False, chat=None, msgId: int = 0):
+        self.document : Document = document
+        self.path : str = path
+        self.size : int = document.size
+        self.isStored : bool = isStored
+        self.links : Set[str] = set()
+        self.chat = chat
+        self.msgId : int = msgId
+
+
+class MediaDownloader:
+    """ Downloads documents exported by MediaExporter.
+        'workers' files are downloaded at a time, each of them in 'parts' parallel chunk streams.
+        At most 'dcRequests' chunk requests are in flight per data center, and the total rate
+        of all downloads is capped by BandwidthLimiter.
+
+        A file is written into '<path>.part' and the indexes of its completed chunks are kept
+        in '<path>.part.json', so an interrupted download resumes from the last completed chunk.
+        Finished files (existing file of the document size) are skipped.
+
+        With MediaStore documents are downloaded into the store and hardlinked into 'directory',
+        so a document that is already stored is never downloaded again. A downloaded document
+        is verified against the part hashes Telegram gives for it before it joins the store.
+    """
+    chunkSize  : int = 512 * 1024
+    dcRequests : int = 8
+
+    def __init__(self, client: TelegramClient, settings: ChatDumpSettings, bandwidth: BandwidthLimiter,
+                 store: MediaStore = None):
+        self.logger = logging.getLogger(__name__)
+        self.client    : TelegramClient = client
+        self.directory : str = settings.downloadDir
+        self.workers   : int = settings.downloadWorkers
+        self.parts     : int = settings.downloadParts
+        self.bandwidth : BandwidthLimiter = bandwidth
+        self.store     : MediaStore = store
+
+        # Queued files by the path they are saved into
+        self.files : Dict[str, MediaFile] = {}
+        # Statistics of the last run
+        self.totalDownloaded : int = 0
+        self.totalSkipped : int = 0
+        self.totalFailed : int = 0
+        self.bytesDownloaded : int = 0
+
+        self._dcSlots : Dict[int, asyncio.Semaphore] = {}
+
+    def add(self, document: Document, fileName: str, msg: Message = None) -> None:
+        """ Queues document for download unless it is already downloaded
+            :param msg: the message of the document, its file reference is renewed from it
+        """
+        target = os.path.join(self.directory, self.fileName(document, fileName)) if self.directory else None
+        path = target if self.store is None else self.store.path(document)
+        mediaFile = self.files.get(path)
+        if mediaFile is None:
+            if self.store is None:
+                isStored = os.path.isfile(path) and os.path.getsize(path) == document.size
+            else:
+                isStored = self.store.has(document)
+            chat = (getattr(msg, 'input_chat', None) or msg.peer_id) if msg is not None else None
+            mediaFile = self.files[path] = MediaFile(document, path, isStored, chat, msg.id if msg is not None else 0)
+            if isStored:
+                self.totalSkipped += 1
+        if self.store is not None and target is not None:
+            mediaFile.links.add(target)
+
+    @property
+    def pending(self) -> int:
+        """ Number of queued files that are not downloaded yet """
+        return sum(1 for mediaFile in self.files.values() if not mediaFile.isStored)
+
+    @staticmethod
+    def fileName(document: Document, fileName: str) -> str:
+        """ Name of the downloaded file, document id keeps it unique """
+        fileName = re.sub(r'[\x00-\x1f<>:"/\\|?*]', '_', os.path.basename(fileName)).strip()
+        return '{}-{}'.format(document.id, fileName) if fileName else str(document.id)
+
+    async def run(self) -> None:
+        """ Downloads all queued files """
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue()
+        for mediaFile in self.files.values():
+            if mediaFile.isStored and self.store is not None \
+                    and not await loop.run_in_executor(None, self.store.verify, mediaFile.document):
+                # Corrupted object
+                mediaFile.isStored = False
+                self.totalSkipped -= 1
+            if mediaFile.isStored:
+                if self.store is not None:
+                    self._link(mediaFile)
+            else:
+                queue.put_nowait(mediaFile)
+        self.files = {}
+        await asyncio.gather(*[self._worker(queue) for _ in range(self.workers)])
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_event_loop()
+        while not queue.empty():
+            mediaFile = queue.get_nowait()
+            try:
+                if self.store is not None:
+                    self.store.prepare(mediaFile.document)
+                await self._download(mediaFile)
+                if self.store is not None:
+                    hashes = await self._fileHashes(mediaFile)
+                    await loop.run_in_executor(None, self.store.commit, mediaFile.document, hashes)
+                    self._link(mediaFile)
+                self.totalDownloaded += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:  # pylint: disable=broad-except
+                self.totalFailed += 1
+                self.logger.error('Failed to download "%s". %s', mediaFile.path, ex,
+                                  exc_info=self.logger.level > logging.INFO)
+
+    async def _download(self, mediaFile: MediaFile) -> None:
+        partPath = mediaFile.path + '.part'
+        chunksPath = partPath + '.json'
+        chunkCount = max(math.ceil(mediaFile.size / self.chunkSize), 1)
+        done = self._loadChunks(chunksPath) if os.path.exists(partPath) else set()
+        pending = asyncio.Queue()
+        for index in range(chunkCount):
+            if index not in done:
+                pending.put_nowait(index)
+        self.logger.debug('Download "%s", %s of %s chunks left.', mediaFile.path, pending.qsize(), chunkCount)
+        loop = asyncio.get_event_loop()
+
+        mode = 'r+b' if os.path.exists(partPath) else 'w+b'
+        with open(partPath, mode) as ff:
+            ff.truncate(mediaFile.size)
+            saving = asyncio.Lock()
+            saved = [len(done)]
+
+            async def part() -> None:
+                while not pending.empty():
+                    index = pending.get_nowait()
+                    data = await self._chunk(mediaFile, index)
+                    ff.seek(index * self.chunkSize)
+                    ff.write(data)
+                    done.add(index)
+                    self.bytesDownloaded += len(data)
+                    async with saving:
+                        # One save covers the chunks that completed while the previous one ran
+                        if len(done) > saved[0]:
+                            ff.flush()
+                            snapshot = sorted(done)
+                            await loop.run_in_executor(None, self._saveChunks, chunksPath, ff.fileno(), snapshot)
+                            saved[0] = len(snapshot)
+
+            parts = [asyncio.ensure_future(part()) for _ in range(self.parts)]
+            try:
+                await asyncio.gather(*parts)
+            finally:
+                # Stop sibling parts before the file is closed
+                for task in parts:
+                    task.cancel()
+                await asyncio.gather(*parts, return_exceptions=True)
+
+        os.replace(partPath, mediaFile.path)
+        os.remove(chunksPath)
+
+    async def _chunk(self, mediaFile: MediaFile, index: int) -> bytes:
+        """ Downloads one chunk of a document """
+        document = mediaFile.document
+        offset = index * self.chunkSize
+        size = min(self.chunkSize, document.size - offset)
+        dcSlots = self._dcSlots.setdefault(document.dc_id, asyncio.Semaphore(self.dcRequests))
+        await self.bandwidth.consume(size)
+        # make 5 attempts
+        for attempt in range(0, 5):
+            try:
+                async with dcSlots:
+                    data = b''
+                    async for data in self.client.iter_download(
+                            document, offset=offset, limit=1, request_size=self.chunkSize,
+                            file_size=document.size, dc_id=document.dc_id):
+                        break
+                return data
+            except FloodWaitError as ex:
+                if attempt == 4:
+                    raise
+                self.logger.info('FloodWaitError detected. Retry chunk in %s sec.', ex.seconds)
+                await asyncio.sleep(ex.seconds)
+            except FileReferenceExpiredError:
+                if attempt == 4 or not await self._renew(mediaFile, document):
+                    raise
+                document = mediaFile.document
+        return b''
+
+    async def _fileHashes(self, mediaFile: MediaFile) -> List[FileHash]:
+        """ :return sha256 of all parts of the document as Telegram has them,
+                    empty if Telegram does not give them (e.g. the document is in another data center)
+        """
+        document = mediaFile.document
+        _, location = utils.get_input_location(document)
+        hashes = []
+        offset = 0
+        while offset < document.size:
+            try:
+                page = await self.client(GetFileHashesRequest(location, offset))
+            except RPCError as ex:
+                self.logger.debug('Failed to get hashes of "%s". %s', mediaFile.path, ex)
+                return []
+            if not page or page[-1].offset + page[-1].limit <= offset:
+                break
+            hashes.extend(page)
+            offset = page[-1].offset + page[-1].limit
+        return hashes
+
+    async def _renew(self, mediaFile: MediaFile, expired: Document) -> bool:
+        """ Fetches the message of the document again for a fresh file reference,
+            unless a sibling chunk stream did it already
+            :return False if the message no longer has the document
+        """
+        if mediaFile.document is not expired:
+            return True
+        if mediaFile.chat is None:
+            return False
+        self.logger.debug('File reference of "%s" expired, fetch message %s again.', mediaFile.path, mediaFile.msgId)
+        msg = await self.client.get_messages(mediaFile.chat, ids=mediaFile.msgId)
+        media = getattr(msg, 'media', None)
+        if not isinstance(media, MessageMediaDocument) or media.document is None \
+                or media.document.id != expired.id:
+            return False
+        mediaFile.document = media.document
+        return True
+
+    def _link(self, mediaFile: MediaFile) -> None:
+        """ Makes stored document available under the names it has in the chats """
+        for target in mediaFile.links:
+            if not self.store.link(mediaFile.document, target):
+                self.logger.warning('Unable to link "%s", it is available in the store as "%s".',
+                                    target, mediaFile.path)
+
+    def _loadChunks(self, path: str) -> Set[int]:
+        try:
+            with codecs.open(path, 'r', 'utf-8') as ff:
+                return set(json.load(ff))
+        except (OSError, ValueError):
+            return set()
+
+    @staticmethod
+    def _saveChunks(path: str, fd: int, done: List[int]) -> None:
+        """ Records completed chunks once their data reached the disk, runs in executor """
+        os.fsync(fd)
+        with open(path + '.tmp', 'w') as ff:
+            json.dump(done, ff)
+        os.replace(path + '.tmp', path)
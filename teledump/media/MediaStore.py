@@ -0,0 +1,150 @@
+""" This Module contains content-addressed local store of media documents """
+
+import codecs
+import hashlib
+import json
+import logging
+import os
+import os.path
+
+from typing import List
+from typing import Set
+
+from telethon.tl.types import Document
+from telethon.tl.types import FileHash
+
+
+class MediaStore:
+    """ Keeps one copy of every downloaded document, whatever chat it came from.
+        An object is keyed on Telegram document id and access hash:
+            <root>/objects/<last 2 digits of document id>/<document id>-<access hash>
+        and has '<object>.json' sidecar with its size and sha256 checksum, that is written only
+        after the downloaded object was verified against the part hashes Telegram keeps for it
+        (upload.getFileHashes). Objects Telegram gives no hashes for are checked by size only.
+        A stored object is checked against its checksum once per run before it is reused.
+    """
+    key_size   : str = 'size'
+    key_sha256 : str = 'sha256'
+    key_mime   : str = 'mime-type'
+
+    def __init__(self, root: str):
+        self.logger = logging.getLogger(__name__)
+        self.root : str = root
+        # Keys of objects whose checksum was verified by this run
+        self._verified : Set[str] = set()
+
+    @staticmethod
+    def key(document: Document) -> str:
+        return '{}-{:016x}'.format(document.id, document.access_hash & 0xFFFFFFFFFFFFFFFF)
+
+    def relpath(self, document: Document) -> str:
+        """ Path of the object relative to the store root """
+        return '/'.join(('objects', '{:02d}'.format(document.id % 100), MediaStore.key(document)))
+
+    def path(self, document: Document) -> str:
+        return os.path.join(self.root, *self.relpath(document).split('/'))
+
+    def has(self, document: Document) -> bool:
+        """ Whether the store holds a copy of the document of the right size, see verify() """
+        path = self.path(document)
+        if not os.path.isfile(path) or os.path.getsize(path) != document.size:
+            return False
+        sidecar = self._sidecar(path)
+        return sidecar is not None and sidecar.get(MediaStore.key_size) == document.size
+
+    def verify(self, document: Document) -> bool:
+        """ Checks the stored object against its checksum, once per run.
+            A corrupted object is removed along with its sidecar.
+            :return False if the document has to be downloaded again
+        """
+        key = MediaStore.key(document)
+        if key in self._verified:
+            return True
+        path = self.path(document)
+        sidecar = self._sidecar(path)
+        if sidecar is not None and os.path.isfile(path) and MediaStore.digest(path) == sidecar.get(MediaStore.key_sha256):
+            self._verified.add(key)
+            return True
+        self.logger.warning('Stored object "%s" does not match its checksum, download it again.', path)
+        for stale in (path + '.json', path):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+        return False
+
+    @staticmethod
+    def digest(path: str) -> str:
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as ff:
+            for block in iter(lambda: ff.read(1024 * 1024), b''):
+                sha256.update(block)
+        return sha256.hexdigest()
+
+    def _sidecar(self, path: str) -> dict:
+        try:
+            with codecs.open(path + '.json', 'r', 'utf-8') as ff:
+                data = json.load(ff)
+            return data if isinstance(data, dict) else None
+        except (OSError, ValueError):
+            return None
+
+    def prepare(self, document: Document) -> str:
+        """ Creates directory of the object. :return path of the object """
+        path = self.path(document)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def commit(self, document: Document, hashes: List[FileHash]) -> None:
+        """ Verifies downloaded object and records its checksum. Blocks on hashing, runs in executor
+            :param hashes: sha256 of the parts of the document Telegram has, may be empty
+        """
+        path = self.path(document)
+        size = os.path.getsize(path)
+        if size != document.size:
+            os.remove(path)
+            raise OSError('Downloaded object "{}" has {} bytes instead of {}.'.format(path, size, document.size))
+        try:
+            MediaStore.check(path, hashes)
+        except OSError:
+            os.remove(path)
+            raise
+        if not hashes:
+            self.logger.debug('No hashes of "%s" from Telegram, it is checked by size only.', path)
+        data = {
+            MediaStore.key_size   : size,
+            MediaStore.key_sha256 : MediaStore.digest(path),
+            MediaStore.key_mime   : document.mime_type,
+        }
+        with open(path + '.json.tmp', 'w') as ff:
+            json.dump(data, ff, indent=4)
+        os.replace(path + '.json.tmp', path + '.json')
+        self._verified.add(MediaStore.key(document))
+
+    @staticmethod
+    def check(path: str, hashes: List[FileHash]) -> None:
+        """ Checks parts of the file against their sha256
+            :raise OSError: if a part does not match
+        """
+        with open(path, 'rb') as ff:
+            for fileHash in hashes:
+                ff.seek(fileHash.offset)
+                if hashlib.sha256(ff.read(fileHash.limit)).digest() != fileHash.hash:
+                    raise OSError('Downloaded object "{}" does not match its checksum at offset {}.'
+                                  .format(path, fileHash.offset))
+
+    def link(self, document: Document, target: str) -> bool:
+        """ Hardlinks the stored object to 'target'. Another file that is there is left as it is.
+            :return False if the object is not linked
+        """
+        if os.path.exists(target):
+            if os.path.samefile(self.path(document), target):
+                return True
+            self.logger.debug('"%s" is another file, it is not replaced.', target)
+            return False
+        try:
+            os.link(self.path(document), target)
+            return True
+        except OSError as ex:
+            self.logger.debug('Failed to link "%s" to the store. %s', target, ex.strerror)
+            return False
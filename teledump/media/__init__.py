@@ -0,0 +1,2 @@
+from .MediaStore import MediaStore
+from .MediaDownloader import MediaDownloader
@@ -0,0 +1,27 @@
+""" This Module contains download bandwidth limiter """
+
+import asyncio
+import time
+
+
+class BandwidthLimiter:
+    """ Caps the total download rate of all concurrent downloads.
+        Each caller reserves a time slot proportional to the size of its chunk,
+        so the sum of all downloads never exceeds 'rate' bytes per second.
+    """
+
+    def __init__(self, rate: int):
+        # Bytes per second, 0 means unlimited
+        self.rate : int = rate
+        # Monotonic time of the next free slot
+        self._next : float = 0.0
+
+    async def consume(self, size: int) -> None:
+        """ Waits until 'size' bytes may be downloaded """
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        start = max(now, self._next)
+        self._next = start + size / self.rate
+        if start > now:
+            await asyncio.sleep(start - now)
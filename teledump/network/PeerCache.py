@@ -0,0 +1,166 @@
+""" This Module contains the persistent cache of resolved chats """
+
+import codecs
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict
+from typing import List
+
+from telethon import utils
+from telethon.tl.types import InputPeerChannel
+from telethon.tl.types import InputPeerChat
+from telethon.tl.types import InputPeerUser
+
+from ..utils import JOIN_CHAT_PREFIX_URL
+
+
+class PeerCache:
+    """ Chat names (@username, invitation link or dialog title, as given with --chat) mapped
+        to the peer id and access hash they were resolved into, so later runs resolve a chat
+        with one request instead of walking all dialogs of the account.
+
+        An entry is validated when it is used: the chat is fetched by its id and access hash,
+        and the entry is dropped if that fails or the chat no longer has that name.
+        Every walk of dialogs stores titles and usernames of all of them, the one done when
+        the cache is older than 'maxAge' runs in the background while the chat is dumped,
+        and is waited for up to 'walkTimeout' when the dump is done first. Kept alongside the session:
+            {"walked": <unix time>, "peers": {"@python": {"kind": "channel", "id": 1, "access-hash": 2}}}
+    """
+    maxAge : float = 24 * 60 * 60  # seconds
+    walkTimeout : float = 60  # seconds
+
+    key_walked     : str = 'walked'
+    key_peers      : str = 'peers'
+    key_kind       : str = 'kind'
+    key_id         : str = 'id'
+    key_accessHash : str = 'access-hash'
+
+    kind_user    : str = 'user'
+    kind_chat    : str = 'chat'
+    kind_channel : str = 'channel'
+
+    def __init__(self, path: str):
+        self._logger = logging.getLogger(__name__)
+        self._path : str = path
+        self._peers : Dict[str, dict] = OrderedDict()
+        # When all dialogs were walked the last time, unix time
+        self.walked : float = 0.0
+        # Whether there are changes to save
+        self._isDirty : bool = False
+
+    @staticmethod
+    def keyOf(name: str) -> str:
+        """ Usernames are case insensitive, titles and links are kept as they are """
+        name = name.strip()
+        return name.lower() if name.startswith('@') else name
+
+    def lookup(self, name: str):
+        """ :return input peer the name was resolved into, or None """
+        entry = self._peers.get(PeerCache.keyOf(name))
+        if entry is None and not name.startswith('@'):
+            # A bare username
+            entry = self._peers.get(PeerCache.keyOf('@' + name))
+        if entry is None:
+            return None
+        kind = entry[PeerCache.key_kind]
+        if kind == PeerCache.kind_channel:
+            return InputPeerChannel(entry[PeerCache.key_id], entry[PeerCache.key_accessHash])
+        if kind == PeerCache.kind_user:
+            return InputPeerUser(entry[PeerCache.key_id], entry[PeerCache.key_accessHash])
+        return InputPeerChat(entry[PeerCache.key_id])
+
+    @staticmethod
+    def isChatId(name: str) -> bool:
+        """ Whether the name is a chat id (marked, e.g. -1001234567890) """
+        return name.lstrip('-').isdigit()
+
+    @staticmethod
+    def matches(name: str, entity) -> bool:
+        """ Whether the chat still has the name.
+            An invitation link leads to the chat it was resolved into as long as it resolves
+        """
+        if name.startswith(JOIN_CHAT_PREFIX_URL):
+            return True
+        if PeerCache.isChatId(name):
+            return utils.get_peer_id(entity) == int(name)
+        username = (getattr(entity, 'username', None) or '').lower()
+        if name.startswith('@'):
+            return username == name[1:].lower()
+        return utils.get_display_name(entity) == name or username == name.lower()
+
+    def isStale(self) -> bool:
+        """ Whether dialogs were not walked for 'maxAge' """
+        return time.time() - self.walked > PeerCache.maxAge
+
+    def add(self, name: str, entity) -> None:
+        """ Remembers what the name was resolved into """
+        try:
+            peer = utils.get_input_peer(entity)
+        except TypeError:
+            return
+        if isinstance(peer, InputPeerChannel):
+            kind, id, accessHash = PeerCache.kind_channel, peer.channel_id, peer.access_hash
+        elif isinstance(peer, InputPeerUser):
+            kind, id, accessHash = PeerCache.kind_user, peer.user_id, peer.access_hash
+        elif isinstance(peer, InputPeerChat):
+            kind, id, accessHash = PeerCache.kind_chat, peer.chat_id, 0
+        else:
+            return
+        self._peers[PeerCache.keyOf(name)] = OrderedDict([
+            (PeerCache.key_kind      , kind),
+            (PeerCache.key_id        , id),
+            (PeerCache.key_accessHash, accessHash),
+        ])
+        self._isDirty = True
+
+    def addDialogs(self, dialogs: List) -> None:
+        """ Remembers titles and usernames of all dialogs of the account """
+        for dialog in dialogs:
+            if dialog.name:
+                self.add(dialog.name, dialog.entity)
+            username = getattr(dialog.entity, 'username', None)
+            if username:
+                self.add('@' + username, dialog.entity)
+        self.walked = time.time()
+        self._isDirty = True
+
+    def discard(self, name: str) -> None:
+        """ Forgets an entry that no longer resolves """
+        if self._peers.pop(PeerCache.keyOf(name), None) is not None:
+            self._isDirty = True
+
+    def load(self) -> None:
+        """ Restores entries saved by the previous runs if any """
+        if not os.path.exists(self._path):
+            return
+        try:
+            with codecs.open(self._path, 'r', 'utf-8') as ff:
+                data = json.load(ff)
+            for name, entry in data[PeerCache.key_peers].items():
+                self._peers[name] = OrderedDict([
+                    (PeerCache.key_kind      , str(entry[PeerCache.key_kind])),
+                    (PeerCache.key_id        , int(entry[PeerCache.key_id])),
+                    (PeerCache.key_accessHash, int(entry[PeerCache.key_accessHash])),
+                ])
+            self.walked = float(data[PeerCache.key_walked])
+            self._logger.debug('%s resolved chats loaded from "%s".', len(self._peers), self._path)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as ex:
+            self._peers.clear()
+            self.walked = 0.0
+            self._logger.debug('Ignore resolved chats "%s". %s', self._path, ex)
+
+    def save(self) -> None:
+        """ Persists entries for the next runs, if there are changes """
+        if not self._isDirty:
+            return
+        data = OrderedDict([(PeerCache.key_walked, self.walked), (PeerCache.key_peers, self._peers)])
+        try:
+            with codecs.open(self._path + '.tmp', 'w', 'utf-8') as ff:
+                json.dump(data, ff, ensure_ascii=False, indent=4)
+            os.replace(self._path + '.tmp', self._path)
+            self._isDirty = False
+        except OSError as ex:
+            self._logger.debug('Failed to save resolved chats "%s". %s', self._path, ex.strerror)
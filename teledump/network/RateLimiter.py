@@ -0,0 +1,120 @@
+""" This Module contains adaptive request rate limiter """
+
+import codecs
+import json
+import logging
+import math
+import os
+import time
+
+
+class RateLimiter:
+    """ Token bucket that paces requests to Telegram.
+        Every page costs one token per 100 requested messages (Telegram returns at most
+        100 messages per request). Tokens are reserved in order, so concurrent callers
+        get distinct time slots.
+
+        The rate is halved and the bucket is blocked for the requested time on every
+        FloodWait, and grows back by 10% after every 'rampAfter' pages without throttling.
+        Page size follows observed latency: it doubles while pages return faster than
+        'fastLatency' and halves when they are slower than 'slowLatency'.
+        State is persisted, so the next run starts at the last safe rate.
+    """
+    minRate     : float = 0.1   # requests/sec
+    maxRate     : float = 10.0  # requests/sec
+    minPageSize : int   = 100
+    maxPageSize : int   = 1000
+    rampAfter   : int   = 10
+    fastLatency : float = 1.0   # seconds
+    slowLatency : float = 4.0   # seconds
+
+    key_rate     : str = 'rate'
+    key_pageSize : str = 'page-size'
+    key_latency  : str = 'latency'
+
+    def __init__(self, path: str):
+        self._logger = logging.getLogger(__name__)
+        self._path : str = path
+        # Current rate, requests/sec
+        self.rate : float = 1.0
+        # Current number of messages to request per page
+        self.pageSize : int = RateLimiter.minPageSize
+        # Exponentially weighted moving average of page latency, seconds
+        self.latency : float = 0.0
+        # Total time spent waiting for FloodWait, seconds
+        self.floodWait : int = 0
+        # Monotonic time of the next free slot
+        self._next : float = 0.0
+        # Pages fetched since the last FloodWait
+        self._clean : int = 0
+
+    def limit(self, messageToFetch: int) -> int:
+        """ :return The number of messages to request in the next page """
+        if messageToFetch <= RateLimiter.minPageSize:
+            return RateLimiter.minPageSize
+        return self.pageSize
+
+    def reserve(self, limit: int) -> float:
+        """ Reserves a slot for a page of 'limit' messages.
+            :return Number of seconds to wait before sending the request
+        """
+        now = time.monotonic()
+        cost = math.ceil(limit / 100)
+        start = max(now, self._next)
+        self._next = start + cost / self.rate
+        return start - now
+
+    def concurrency(self, maxRequests: int) -> int:
+        """ :return How many requests may be in flight at a time, up to 'maxRequests'.
+                    More than rate * latency of them would only wait for their slots,
+                    so the number drops as soon as FloodWait lowers the rate.
+        """
+        return min(max(math.ceil(self.rate * self.latency), 1), maxRequests)
+
+    def onSuccess(self, latency: float) -> None:
+        """ Learns from a page that was fetched without throttling """
+        self.latency = latency if self.latency == 0 else 0.8 * self.latency + 0.2 * latency
+        if self.latency < RateLimiter.fastLatency:
+            self.pageSize = min(self.pageSize * 2, RateLimiter.maxPageSize)
+        elif self.latency > RateLimiter.slowLatency:
+            self.pageSize = max(self.pageSize // 2, RateLimiter.minPageSize)
+
+        self._clean += 1
+        if self._clean >= RateLimiter.rampAfter:
+            self._clean = 0
+            self.rate = min(self.rate * 1.1, RateLimiter.maxRate)
+
+    def onFlood(self, seconds: int) -> None:
+        """ Learns from FloodWait. Slows down and blocks all slots for 'seconds' """
+        self._clean = 0
+        self.floodWait += seconds
+        self.rate = max(self.rate / 2, RateLimiter.minRate)
+        self._next = max(self._next, time.monotonic() + seconds)
+        self._logger.debug('FloodWait %s sec. Rate lowered to %.2f req/sec.', seconds, self.rate)
+
+    def load(self) -> None:
+        """ Restores state saved by the previous run if any """
+        if not os.path.exists(self._path):
+            return
+        try:
+            with codecs.open(self._path, 'r', 'utf-8') as ff:
+                data = json.load(ff)
+            self.rate     = min(max(float(data[RateLimiter.key_rate]), RateLimiter.minRate), RateLimiter.maxRate)
+            self.pageSize = min(max(int(data[RateLimiter.key_pageSize]), RateLimiter.minPageSize), RateLimiter.maxPageSize)
+            self.latency  = float(data[RateLimiter.key_latency])
+            self._logger.debug('Rate limiter starts at %.2f req/sec, %s messages per page.', self.rate, self.pageSize)
+        except (OSError, ValueError, KeyError, TypeError) as ex:
+            self._logger.debug('Ignore rate limiter state "%s". %s', self._path, ex)
+
+    def save(self) -> None:
+        """ Persists state for the next run """
+        data = {
+            RateLimiter.key_rate     : self.rate,
+            RateLimiter.key_pageSize : self.pageSize,
+            RateLimiter.key_latency  : self.latency,
+        }
+        try:
+            with open(self._path, 'w') as ff:
+                json.dump(data, ff, indent=4)
+        except OSError as ex:
+            self._logger.debug('Failed to save rate limiter state "%s". %s', self._path, ex.strerror)
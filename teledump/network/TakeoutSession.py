@@ -0,0 +1,76 @@
+""" This Module contains takeout session that bulk exports are meant to run in """
+
+import logging
+
+from telethon import TelegramClient
+from telethon.errors import RPCError
+from telethon.errors import TakeoutInitDelayError
+
+from ..exceptions import DumpingError
+
+
+class TakeoutSession:
+    """ Takeout session (account.initTakeoutSession) of a dump, see --takeout.
+        It is Telethon's takeout proxy, TelegramClient.takeout(), entered for the dump:
+        requests sent through 'client' are wrapped into InvokeWithTakeoutRequest,
+        which Telegram serves with much looser flood limits than the normal session.
+
+        Telegram may refuse the takeout (TakeoutInitDelayError) until the user confirms it
+        in another Telegram app, then the dump goes on in the normal session.
+        The takeout id is kept in the session file, so the takeout of an interrupted run
+        is reused by the next one.
+    """
+
+    def __init__(self, client: TelegramClient):
+        """ constructor
+            :param client: TelegramClient the takeout is opened for
+        """
+        self._logger = logging.getLogger(__name__)
+        self._client : TelegramClient = client
+        # Proxy of the client that sends requests within takeout, None unless it is open
+        self.client : TelegramClient = None
+        # Why Telegram refused the takeout, '' if it did not
+        self.refusal : str = ''
+
+    @property
+    def isOpen(self) -> bool:
+        return self.client is not None
+
+    async def start(self) -> bool:
+        """ Opens takeout session, unless the session file has one open already
+            :return False if Telegram refused it
+        """
+        if self._client.session.takeout_id is not None:
+            self._logger.info('Reuse takeout session %s of the previous run.', self._client.session.takeout_id)
+            takeout = self._client.takeout(finalize=True)
+        else:
+            takeout = self._client.takeout(finalize=True, users=True, chats=True, megagroups=True, channels=True)
+        try:
+            self.client = await takeout.__aenter__()
+        except TakeoutInitDelayError as ex:
+            self.refusal = 'Confirm the data export in another Telegram app, it is allowed in {} sec.'.format(ex.seconds)
+            return False
+        except RPCError as ex:
+            self.refusal = str(ex)
+            return False
+        self._logger.debug('Takeout session %s started.', self._client.session.takeout_id)
+        return True
+
+    async def finish(self, success: bool) -> None:
+        """ Closes takeout session, telling Telegram whether the export succeeded """
+        takeout, self.client = self.client, None
+        if takeout is None:
+            return
+        # The proxy forwards attributes it is given to the client, so the outcome is
+        # told the way 'async with' does: the export failed if it exits with an exception
+        error = None if success else DumpingError('The dump failed.')
+        try:
+            await takeout.__aexit__(type(error) if error else None, error, None)
+        except (RPCError, ValueError) as ex:
+            self._logger.info('Failed to finish takeout session. %s', ex)
+            self.abandon()
+
+    def abandon(self) -> None:
+        """ Forgets the takeout, e.g. when Telegram no longer accepts it """
+        self.client = None
+        self._client.session.takeout_id = None
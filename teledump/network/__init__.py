@@ -0,0 +1,4 @@
+from .RateLimiter import RateLimiter
+from .BandwidthLimiter import BandwidthLimiter
+from .TakeoutSession import TakeoutSession
+from .PeerCache import PeerCache
@@ -0,0 +1,370 @@
+""" This Module contains the class that writes formatted messages into the resulting file """
+
+import codecs
+import json
+import logging
+import os
+import os.path
+import re
+import shutil
+import tempfile
+import time
+from collections import deque
+from typing import Deque
+from typing import Iterable
+from typing import List
+from typing import TextIO
+from typing import Tuple
+
+from ..exporters import Exporter
+from ..exporters import ExporterContext
+from ..settings import ChatDumpCheckpoint
+from ..settings import ChatDumpSettings
+from ..stats import RunStats
+
+
+class ChatDumpOutput:
+    """ Collects formatted messages in newest-to-oldest order.
+        When buffer reaches 'spillSize' messages they are saved into intermediate temp file.
+        In the end messages from all the temp files are being moved into resulting file in
+        ascending order along with the remaining ones in 'buffer'.
+
+        In ascending mode (--ascending) messages are collected in oldest-to-newest order
+        and buffer is appended straight to the resulting file, no temp files are used.
+
+        Every spill (at least each 'checkpointInterval' seconds) is followed by a checkpoint,
+        so an interrupted dump can be resumed with --resume. Temp files are kept next to
+        the resulting file until the dump is finished.
+
+        With --compress temp files are compressed the same way as the resulting file and
+        are appended to it as they are. In ascending mode every spill ends a gzip member
+        (zstd frame), so the checkpoint can truncate the resulting file at its boundary.
+    """
+    spillSize : int = 1000
+    checkpointInterval : float = 60.0 # seconds
+
+    def __init__(self, settings: ChatDumpSettings, exporter: Exporter, context: ExporterContext):
+        self.logger = logging.getLogger(__name__)
+        self.settings : ChatDumpSettings = settings
+        self.exporter : Exporter = exporter
+        self.context  : ExporterContext = context
+        self.checkpoint : ChatDumpCheckpoint = ChatDumpCheckpoint(settings.outFile)
+
+        # Current buffer of messages, that will be batched into a temp file
+        # or otherwise written directly into the resulting file if there are too few of them
+        # to form a batch of size 'spillSize'.
+        self.buffer : Deque[str] = deque()
+
+        # A list of paths to the temp files and the latest message id saved in each of them
+        self.tempFiles : Deque[str] = deque()
+        self.tempMeta  : Deque[int] = deque()
+
+        # The number of messages written into a resulting file de-facto
+        self.totalSaved : int = 0
+
+        # The latest message id saved so far
+        self.idLatest : int = settings.idLastMessage
+
+        # Resulting file kept open in ascending mode
+        self._stream : TextIO = None
+        # Whether resulting file already has its preamble
+        self._isResumed : bool = False
+        # When the last checkpoint was saved
+        self._checkpointed : float = time.monotonic()
+
+    def isFull(self) -> bool:
+        """ Whether the buffer should be flushed into a temp file """
+        return len(self.buffer) >= self.spillSize \
+            or time.monotonic() - self._checkpointed >= self.checkpointInterval
+
+    def spill(self, idLatest: int, idPageOffset: int, messageToFetch: int) -> None:
+        """ Flush buffer into a new temp file, or into resulting file in ascending mode.
+            Then save checkpoint.
+            :param idLatest:       the latest message id in buffer
+            :param idPageOffset:   offset of the next page to fetch
+            :param messageToFetch: how many messages are still to be dumped
+        """
+        if idLatest > self.idLatest:
+            self.idLatest = idLatest
+        started = time.monotonic()
+        written = 0
+        compression = self.exporter.compression
+        if self.settings.isAscending and compression.isEnabled:
+            position = self._outSize()
+            with self._begin() as ff:
+                self.totalSaved += self._saveFile(ff, self.buffer)
+            # The member is complete, the next spill appends a new one
+            self._isResumed = True
+            self._fsync(self.settings.outFile)
+            written = self._outSize() - position
+        elif self.settings.isAscending:
+            ff = self._open()
+            position = self._outSize()
+            self.totalSaved += self._saveFile(ff, self.buffer)
+            ff.flush()
+            os.fsync(ff.fileno())
+            written = self._outSize() - position
+        elif self.buffer:
+            path, count = self._spillTemp(self.buffer)
+            written = os.path.getsize(path)
+            self.totalSaved += count
+            self.tempFiles.append(path)
+            self.tempMeta.append(idLatest)
+        self.context.stats.add('spill', time.monotonic() - started, bytes=written)
+        self._checkpoint(idPageOffset, messageToFetch)
+
+    def spillSegment(self, buffer: Deque[str]) -> Tuple[str, int]:
+        """ Flush a buffer of newest-to-oldest messages into a new temp file that is not
+            a part of the output until it is committed, see commit().
+            :return path of the temp file and the number of messages in it
+        """
+        started = time.monotonic()
+        path, count = self._spillTemp(buffer)
+        self.context.stats.add('spill', time.monotonic() - started, bytes=os.path.getsize(path))
+        return path, count
+
+    def commit(self, segments: List[Tuple[str, int, int]], idPageOffset: int, messageToFetch: int) -> None:
+        """ Adds temp files written by spillSegment() to the output as messages older than
+            the ones it has. Then save checkpoint.
+            :param segments: path, the latest message id and number of messages of every temp file,
+                             newest first
+        """
+        for path, idLatest, count in segments:
+            self.tempFiles.append(path)
+            self.tempMeta.append(idLatest)
+            self.totalSaved += count
+            if idLatest > self.idLatest:
+                self.idLatest = idLatest
+        self._checkpoint(idPageOffset, messageToFetch)
+
+    def append(self, block: List[str], idLatest: int) -> None:
+        """ Appends oldest-to-newest messages to the finished resulting file and flushes it
+            to disk (--follow). A compressed file gets a new gzip member (zstd frame).
+        """
+        started = time.monotonic()
+        position = RunStats.size(self.settings.outFile)
+        with self.exporter.open_final_file(self.settings.outFile, 'a') as ff:
+            self._write(ff, block)
+        self._fsync(self.settings.outFile)
+        self.totalSaved += len(block)
+        if idLatest > self.idLatest:
+            self.idLatest = idLatest
+        self.context.stats.add('append', time.monotonic() - started,
+                               bytes=RunStats.size(self.settings.outFile) - position)
+
+    def save(self, idLastMessage: int) -> int:
+        """ Write buffer and all temp files into resulting file.
+            :return The latest message id that went into resulting file
+        """
+        if self.settings.isAscending:
+            if idLastMessage > self.idLatest:
+                self.idLatest = idLastMessage
+            ff = self._open()
+            self.totalSaved += self._saveFile(ff, self.buffer)
+            self._close()
+            idLastMessage = self.idLatest
+        else:
+            self._beginMerge()
+            if self.exporter.compression.isEnabled:
+                with self._begin() as ff:
+                    self.totalSaved += self._saveFile(ff, self.buffer)
+                # Compressed temp files are members of the resulting file as they are
+                with open(self.settings.outFile, 'ab') as ff:
+                    idLastMessage = self._merge(ff, idLastMessage)
+            else:
+                with self._begin() as ff:
+                    # flush what's left in the mem buffer into resulting file
+                    self.totalSaved += self._saveFile(ff, self.buffer)
+                    idLastMessage = self._merge(ff, idLastMessage)
+            self._fsync(self.settings.outFile)
+        self.checkpoint.delete()
+        # Temp files are needed to resume an interrupted merge until the checkpoint is gone
+        while self.tempFiles:
+            self._remove(self.tempFiles.pop())
+        self.tempMeta.clear()
+        return idLastMessage
+
+    def resume(self) -> dict:
+        """ Restores temp files and counters from checkpoint.
+            :return checkpoint data
+        """
+        data = self.checkpoint.load()
+        for path, idLatest in data[ChatDumpCheckpoint.key_segments]:
+            if not os.path.exists(path):
+                raise OSError('Temp file "{}" of the checkpoint is missing.'.format(path))
+            self.tempFiles.append(path)
+            self.tempMeta.append(idLatest)
+        self._sweep(self.tempFiles)
+        self.totalSaved = data[ChatDumpCheckpoint.key_totalSaved]
+        self.idLatest   = data[ChatDumpCheckpoint.key_LastMessageId]
+        if ChatDumpCheckpoint.key_mergeOffset in data and os.path.exists(self.settings.outFile):
+            # Drop what the interrupted merge wrote, it is merged again
+            self.exporter.truncate_final_file(self.settings.outFile, data[ChatDumpCheckpoint.key_mergeOffset])
+        if self.settings.isAscending:
+            # Drop whatever was written after the checkpoint
+            self.exporter.truncate_final_file(self.settings.outFile, data[ChatDumpCheckpoint.key_outSize])
+            self._isResumed = True
+        return data
+
+    def discard(self) -> None:
+        """ Forget an unfinished dump into the same resulting file, if any,
+            along with temp files an interrupted dump left without a checkpoint
+        """
+        if self.checkpoint.exists():
+            try:
+                for path, _ in self.checkpoint.load()[ChatDumpCheckpoint.key_segments]:
+                    self._remove(path)
+            except Exception:  # pylint: disable=broad-except
+                pass
+        self._sweep([])
+        self.checkpoint.delete()
+
+    def sweep(self) -> None:
+        """ Deletes temp files of this resulting file that are not a part of the output,
+            e.g. the ones of --parallel ranges that had not joined it when the dump was interrupted
+        """
+        self._sweep(self.tempFiles)
+
+    def cleanup(self) -> None:
+        """ Make sure there are no temp files left undeleted,
+            unless they are needed to resume from checkpoint
+        """
+        self._close()
+        if self.checkpoint.exists():
+            self.logger.info('Unfinished dump is saved. Run with --resume to continue.')
+            return
+        while self.tempFiles:
+            self._remove(self.tempFiles.pop())
+
+    def _checkpoint(self, idPageOffset: int, messageToFetch: int) -> None:
+        progress = {}
+        progress[ChatDumpCheckpoint.key_pageOffset    ] = idPageOffset
+        progress[ChatDumpCheckpoint.key_messageToFetch] = messageToFetch
+        progress[ChatDumpCheckpoint.key_LastMessageId ] = self.idLatest
+        progress[ChatDumpCheckpoint.key_totalSaved    ] = self.totalSaved
+        progress[ChatDumpCheckpoint.key_segments      ] = list(zip(self.tempFiles, self.tempMeta))
+        progress[ChatDumpCheckpoint.key_outSize       ] = self._stream.tell() if self._stream else self._outSize()
+        self.checkpoint.save(self.settings, progress)
+        self._checkpointed = time.monotonic()
+
+    def _beginMerge(self) -> None:
+        """ Records in the checkpoint where resulting file ended before the merge """
+        if not self.checkpoint.exists():
+            return
+        data = dict(self.checkpoint.load())
+        data[ChatDumpCheckpoint.key_mergeOffset] = self.exporter.final_file_size(self.settings.outFile)
+        self.checkpoint.save(self.settings, data)
+
+    def _begin(self) -> TextIO:
+        """ Opens resulting file and writes its preamble """
+        if self._isResumed:
+            return self.exporter.open_final_file(self.settings.outFile, 'a')
+        result_file_mode = 'a' if self.settings.idLastMessage > -1 else 'w'
+        ff = self.exporter.open_final_file(self.settings.outFile, result_file_mode)
+        if self.settings.isAddbom:
+            ff.write(codecs.BOM_UTF8.decode())
+
+        self.exporter.begin_final_file(ff, self.context)
+        return ff
+
+    def _open(self) -> TextIO:
+        if self._stream is None:
+            self._stream = self._begin()
+        return self._stream
+
+    def _close(self) -> None:
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def _outSize(self) -> int:
+        """ Size of resulting file (or directory) in ascending mode, where spills go into it """
+        return RunStats.size(self.settings.outFile) if self.settings.isAscending else 0
+
+    @staticmethod
+    def _fsync(path: str) -> None:
+        """ Flushes a closed file to disk """
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _sweep(self, keep: Iterable[str]) -> None:
+        """ Deletes temp files of this resulting file that are not in 'keep', e.g. the ones
+            of --parallel ranges that had not joined the output when the dump was killed
+        """
+        outFile = os.path.abspath(self.settings.outFile)
+        pattern = re.compile(re.escape(os.path.basename(outFile)) + r'\.\w{8}\.tmp(\.\w+)?$')
+        keep = {os.path.abspath(path) for path in keep}
+        try:
+            names = os.listdir(os.path.dirname(outFile))
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(os.path.dirname(outFile), name)
+            if pattern.match(name) and path not in keep:
+                self._remove(path)
+
+    def _remove(self, path: str) -> None:
+        try:
+            self.logger.debug("Delete temp file %s", path)
+            os.remove(path)
+        except Exception:  # pylint: disable=broad-except
+            pass
+
+    def _spillTemp(self, buffer: Deque[str]) -> Tuple[str, int]:
+        """ Flush buffer into a new temp file next to the resulting file """
+        compression = self.exporter.compression
+        fd, path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.settings.outFile)),
+                                    prefix=os.path.basename(self.settings.outFile) + '.',
+                                    suffix='.tmp' + compression.suffix)
+        os.close(fd)
+        with compression.open(path, 'w') as ff:
+            count = self._saveFile(ff, buffer)
+        self._fsync(path)
+        return path, count
+
+    def _saveFile(self, outFile: TextIO, buffer: Deque[str]) -> int:
+        """ Flush buffer into a file stream """
+        pop = buffer.popleft if self.settings.isAscending else buffer.pop
+        return self._write(outFile, (pop() for _ in range(len(buffer))))
+
+    @staticmethod
+    def _write(outFile: TextIO, lines: Iterable[str]) -> int:
+        """ Writes formatted messages into a file stream.
+            Rows of binary formats go into a stream that takes them as they are,
+            into other ones (temp files) as one-line JSON.
+        """
+        count = 0
+        writeRow = getattr(outFile, 'writeRow', None)
+        for line in lines:
+            count += 1
+            if isinstance(line, str):
+                print(line, file=outFile)
+            elif writeRow is not None:
+                writeRow(line)
+            else:
+                print(json.dumps(line, ensure_ascii=False), file=outFile)
+        return count
+
+    def _merge(self, outFile : TextIO, idLastMessage: int) -> int:
+        """ merge all temp files into final one, oldest first. They are deleted by save().
+            Compressed temp files are copied into binary 'outFile' without decompressing them.
+        """
+        isCompressed = self.exporter.compression.isEnabled
+        for path, batch_latest_message_id in zip(reversed(self.tempFiles), reversed(self.tempMeta)):
+            started = time.monotonic()
+            size = os.path.getsize(path)
+            if isCompressed:
+                with open(path, 'rb') as ctf:
+                    shutil.copyfileobj(ctf, outFile)
+            else:
+                with codecs.open(path, 'r', 'utf-8') as ctf:
+                    for line in ctf.readlines():
+                        print(line, file=outFile, end='')
+            # update the latest_message_id metadata
+            if batch_latest_message_id > idLastMessage:
+                idLastMessage = batch_latest_message_id
+            self.context.stats.add('merge', time.monotonic() - started, bytes=size)
+        return idLastMessage
@@ -0,0 +1 @@
+from .ChatDumpOutput import ChatDumpOutput
@@ -0,0 +1,238 @@
+""" This Module contains asyncio engine that fetches, formats and writes
+    messages concurrently.
+"""
+
+import asyncio
+import logging
+import time
+from typing import List
+from typing import Set
+from typing import Tuple
+
+from telethon import TelegramClient
+from telethon.errors import FloodWaitError
+from telethon.tl.custom.message import Message
+
+from ..archive import MessageArchive
+from ..exporters import Exporter
+from ..exporters import ExporterContext
+from ..filters import Filter
+from ..filters import SearchQuery
+from ..network import RateLimiter
+from ..output import ChatDumpOutput
+from ..settings import ChatDumpSettings
+
+
+class DumpPipeline:
+    """ Fetches pages of messages from Telegram and converts them into the output
+        in three stages joined by bounded queues:
+            fetch (prefetches up to 'prefetch' pages ahead) -> format -> write
+        Stages work concurrently, so network waits overlap formatting and disk writes.
+        With 'query' pages come from Telegram search and 'filter' is the residual one.
+        With 'archive' every fetched page is archived as is.
+    """
+
+    def __init__(self, client: TelegramClient, peer, settings: ChatDumpSettings,
+                 exporter: Exporter, filter: Filter, context: ExporterContext,
+                 output: ChatDumpOutput, limiter: RateLimiter, query: SearchQuery = None,
+                 archive: MessageArchive = None):
+        self.logger = logging.getLogger(__name__)
+        self.client   : TelegramClient = client
+        self.peer = peer
+        self.settings : ChatDumpSettings = settings
+        self.exporter : Exporter = exporter
+        self.filter   : Filter = filter
+        self.context  : ExporterContext = context
+        self.output   : ChatDumpOutput = output
+        self.limiter  : RateLimiter = limiter
+        self.query    : SearchQuery = query
+        self.archive  : MessageArchive = archive
+
+        # How many massages are still to be dumped
+        self.messageToFetch : int = 0
+        # Actual latest message id that was processed by the pipeline
+        self.idLastMessage : int = settings.idLastMessage
+        # Messages received from Telegram and written into output
+        self.totalFetched : int = 0
+        self.totalWritten : int = 0
+        # End-to-end throughput of the last run, messages per second
+        self.rate : float = 0.0
+
+        # Set by formatting stage when it needs no more pages
+        self._isStopped : bool = False
+        self._pages  : asyncio.Queue = None
+        self._blocks : asyncio.Queue = None
+        # Output calls running in executor, see _offload()
+        self._offloaded : Set[asyncio.Future] = set()
+
+    async def run(self, messageToFetch: int, idPageOffset: int) -> None:
+        """ Runs all stages until history is exhausted or 'messageToFetch' messages are dumped
+            :param idPageOffset: offset of the first page to fetch
+        """
+        self.messageToFetch = messageToFetch
+        self._pages  = asyncio.Queue(maxsize=self.settings.prefetch)
+        self._blocks = asyncio.Queue(maxsize=self.settings.prefetch)
+
+        started = time.monotonic()
+        stages = [
+            asyncio.ensure_future(self._produce(idPageOffset)),
+            asyncio.ensure_future(self._format()),
+            asyncio.ensure_future(self._write()),
+        ]
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            await self._settle(stages)
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.rate = self.totalWritten / elapsed
+        self.logger.debug('Pipeline: %s messages fetched, %s formatted in %.1f sec.',
+                          self.totalFetched, self.totalWritten, elapsed)
+
+    async def _offload(self, func, *args):
+        """ Runs a blocking output call in executor. The call is not abandoned when the stage
+            awaiting it is cancelled, it is waited for by _settle()
+        """
+        future = asyncio.get_event_loop().run_in_executor(None, func, *args)
+        self._offloaded.add(future)
+        future.add_done_callback(self._offloaded.discard)
+        return await asyncio.shield(future)
+
+    async def _settle(self, stages: List[asyncio.Future]) -> None:
+        """ Cancels stages and waits until they and the output calls they started are finished,
+            so an interrupted dump leaves the output consistent with its checkpoint
+        """
+        for stage in stages:
+            stage.cancel()
+        await asyncio.gather(*stages, return_exceptions=True)
+        if self._offloaded:
+            await asyncio.wait(list(self._offloaded))
+
+    async def _produce(self, idPageOffset: int) -> None:
+        """ Fetch stage. Walks history from the newest message to the oldest one,
+            or from the last dumped message to the newest one in ascending mode
+        """
+        isAscending = self.settings.isAscending
+        while not self._isStopped:
+            messages = await self._fetchPage(idPageOffset)
+            if not messages:
+                break
+            self.totalFetched += len(messages)
+            if self.archive is not None:
+                with self.context.stats.measure('archive'):
+                    self.archive.add(messages)
+            await self._pages.put(messages)
+            idPageOffset = messages[-1].id
+            # break if the very beginning of channel history or already dumped message is reached
+            if not isAscending and (idPageOffset <= 1 or idPageOffset <= self.settings.idLastMessage):
+                break
+            # or the page crossed --since (--until in ascending mode)
+            if self.settings.dateBound(messages[-1]) > 0:
+                break
+        await self._pages.put(None)
+
+    async def _fetchPage(self, idPageOffset: int, limit: int = 0, **kwargs) -> List[Message]:
+        """ Retrieves one page of messages older than 'idPageOffset'
+            :param limit:  messages to request, by default as many as the rate limiter allows
+            :param kwargs: other arguments of get_messages(), e.g. min_id
+        """
+        stats = self.context.stats
+        limit = limit or self.limiter.limit(self.messageToFetch)
+        kwargs.setdefault('offset_date', self.settings.pageDate(idPageOffset, self.query is not None))
+        if self.query is not None:
+            kwargs.update(self.query.kwargs())
+        # make 5 attempts
+        for _ in range(0, 5):
+            # wait for a free slot to avoid flood ban
+            wait = self.limiter.reserve(limit)
+            if wait > 0:
+                stats.add('pacing', wait)
+            await asyncio.sleep(wait)
+            try:
+                started = time.monotonic()
+                messages = await self.client.fetchMessages(self.peer, limit=limit, offset_id=idPageOffset,
+                                                           reverse=self.settings.isAscending, **kwargs)
+                latency = time.monotonic() - started
+                self.limiter.onSuccess(latency)
+                stats.page(latency, len(messages))
+                if self.query is not None and self.query.matched < 0:
+                    self.query.matched = messages.total
+                if messages:
+                    self.logger.debug('Fetched messages with ids %s - %s', messages[0].id, messages[-1].id)
+                return messages
+            except FloodWaitError as ex:
+                self.logger.info('FloodWaitError detected. Slow down and retry in %s sec.', ex.seconds)
+                self.limiter.onFlood(ex.seconds)
+                stats.add('flood-wait', ex.seconds)
+        return []
+
+    async def _format(self) -> None:
+        """ Format stage. Filters messages and converts them into strings """
+        while True:
+            messages = await self._pages.get()
+            if messages is None:
+                break
+            if self._isStopped:
+                # Drain pages fetched before the stop was noticed by fetch stage
+                continue
+            await self._blocks.put(self._formatPage(messages))
+        await self._blocks.put(None)
+
+    def _formatPage(self, messages: List[Message]) -> Tuple[List[str], int, int, int]:
+        """ :return formatted messages (in page order), the latest message id of the page
+                    or -1 if the page has no new messages, offset of the next page
+                    and how many messages are still to be dumped after this page
+        """
+        stats = self.context.stats
+        started = time.monotonic()
+        selected = []
+        rejected = 0
+        idNewest = self.settings.idNewest(messages)
+        idLastMessage = -1 \
+            if self.settings.idLastMessage >= idNewest \
+            else idNewest
+        for msg in messages:
+            bound = self.settings.dateBound(msg)
+            if bound > 0:
+                # Paging went past --since (--until in ascending mode)
+                self._isStopped = True
+                break
+            if bound < 0:
+                continue
+            if not self.filter.valid(msg):
+                rejected += 1
+                continue
+
+            if self.settings.idLastMessage >= msg.id:
+                self._isStopped = True
+                break
+
+            selected.append(msg)
+
+            self.messageToFetch -= 1
+            if self.messageToFetch == 0:
+                self._isStopped = True
+                break
+        stats.add('filter', time.monotonic() - started)
+        stats.count('messages-rejected', rejected)
+
+        block = []
+        if selected:
+            self.context.isFirst = (self.messageToFetch == 0)
+            with stats.measure('format'):
+                block = self.exporter.format_batch(selected, self.context)
+            self.context.isLast = False
+        return block, idLastMessage, messages[-1].id, self.messageToFetch
+
+    async def _write(self) -> None:
+        """ Write stage. Moves formatted blocks into output, spilling to disk off the event loop """
+        while True:
+            item = await self._blocks.get()
+            if item is None:
+                break
+            block, idLatest, idPageOffset, messageToFetch = item
+            if self.idLastMessage < idLatest:
+                self.idLastMessage = idLatest
+            self.output.buffer.extend(block)
+            self.totalWritten += len(block)
+            if self.output.isFull():
+                await self._offload(self.output.spill, idLatest, idPageOffset, messageToFetch)
@@ -0,0 +1,130 @@
+""" This Module contains the engine that appends new messages of a chat as they come (--follow) """
+
+import asyncio
+import logging
+import time
+from typing import Dict
+from typing import List
+
+from telethon import TelegramClient
+from telethon import events
+from telethon.tl.custom.message import Message
+
+from ..archive import MessageArchive
+from ..exporters import Exporter
+from ..exporters import ExporterContext
+from ..filters import Filter
+from ..output import ChatDumpOutput
+from ..settings import ChatDumpMetaFile
+from ..settings import ChatDumpSettings
+
+
+class FollowPipeline:
+    """ Live tail of a chat (--follow). Subscribes to NewMessage events of the chat before the
+        history is caught up, so nothing posted meanwhile is missed. Then every 'flushInterval'
+        seconds the messages received since the previous flush and newer than the latest dumped
+        one are filtered, formatted and appended to the resulting file in one batch, the file is
+        fsync'ed and .meta is replaced with the new latest message id. An interrupted tail goes
+        on with --continue --follow.
+        Telethon fetches the updates missed while the connection was down on its own.
+    """
+
+    def __init__(self, client: TelegramClient, peer, settings: ChatDumpSettings,
+                 exporter: Exporter, filter: Filter, context: ExporterContext,
+                 output: ChatDumpOutput, chatMeta: ChatDumpMetaFile, archive: MessageArchive = None):
+        self.logger = logging.getLogger(__name__)
+        self.client   : TelegramClient = client
+        self.peer = peer
+        self.settings : ChatDumpSettings = settings
+        self.exporter : Exporter = exporter
+        self.filter   : Filter = filter
+        self.context  : ExporterContext = context
+        self.output   : ChatDumpOutput = output
+        self.chatMeta : ChatDumpMetaFile = chatMeta
+        self.archive  : MessageArchive = archive
+
+        # The latest message id in the resulting file
+        self.idLastMessage : int = settings.idLastMessage
+        # Messages received from Telegram and appended to the output
+        self.totalReceived : int = 0
+        self.totalWritten : int = 0
+
+        # Messages received since the last flush, by id
+        self._pending : Dict[int, Message] = {}
+        self._event : events.NewMessage = None
+        # The flush run() started last, it is not interrupted along with run()
+        self._flushing : asyncio.Future = None
+
+    def subscribe(self) -> None:
+        """ Starts collecting new messages of the chat """
+        self._event = events.NewMessage(chats=self.peer)
+        self.client.add_event_handler(self._onMessage, self._event)
+
+    def unsubscribe(self) -> None:
+        if self._event is not None:
+            self.client.remove_event_handler(self._onMessage, self._event)
+            self._event = None
+
+    async def run(self, idLastMessage: int) -> None:
+        """ Appends new messages until interrupted
+            :param idLastMessage: the latest message id that the caught up history holds
+        """
+        self.idLastMessage = max(self.idLastMessage, idLastMessage)
+        while True:
+            await asyncio.sleep(self.settings.flushInterval)
+            self._flushing = asyncio.ensure_future(self.flush())
+            await asyncio.shield(self._flushing)
+
+    async def stop(self, running: asyncio.Task) -> None:
+        """ Cancels run() and waits for the flush it started, if any,
+            then appends what was received since
+        """
+        running.cancel()
+        await asyncio.gather(running, return_exceptions=True)
+        if self._flushing is not None:
+            await self._flushing
+        await self.flush()
+
+    async def flush(self) -> None:
+        """ Appends messages received so far to the resulting file """
+        pending, self._pending = self._pending, {}
+        messages = [pending[id] for id in sorted(pending) if id > self.idLastMessage]
+        if not messages:
+            return
+        stats = self.context.stats
+        self.totalReceived += len(messages)
+        stats.count('messages-fetched', len(messages))
+        if self.archive is not None:
+            with stats.measure('archive'):
+                self.archive.add(messages)
+
+        started = time.monotonic()
+        selected = []
+        for msg in messages:
+            if self.settings.dateBound(msg) == 0 and self.filter.valid(msg):
+                selected.append(msg)
+        stats.add('filter', time.monotonic() - started)
+        stats.count('messages-rejected', len(messages) - len(selected))
+        block = []
+        if selected:
+            with stats.measure('format'):
+                block = self.exporter.format_batch(selected, self.context)
+
+        idLatest = messages[-1].id
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._append, block, idLatest)
+        self.idLastMessage = idLatest
+        self.totalWritten += len(block)
+        if block:
+            self.client.print('{} new messages appended, the latest id {}.', len(block), idLatest)
+
+    def _append(self, block: List[str], idLatest: int) -> None:
+        # The file goes first, so a crash between them repeats the batch rather than loses it
+        if block:
+            self.output.append(block, idLatest)
+        self.chatMeta.update(self.settings, idLatest)
+
+    async def _onMessage(self, event: events.NewMessage.Event) -> None:
+        msg = event.message
+        if msg.id > self.idLastMessage:
+            self._pending[msg.id] = msg
@@ -0,0 +1,250 @@
+""" This Module contains asyncio engine that fetches disjoint id ranges of one chat concurrently """
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Deque
+from typing import List
+from typing import Tuple
+
+from telethon import TelegramClient
+from telethon.tl.custom.message import Message
+
+from ..archive import MessageArchive
+from ..exporters import Exporter
+from ..exporters import ExporterContext
+from ..filters import Filter
+from ..filters import SearchQuery
+from ..network import RateLimiter
+from ..output import ChatDumpOutput
+from ..settings import ChatDumpSettings
+from .DumpPipeline import DumpPipeline
+
+
+class IdRange:
+    """ Messages with ids between 'low' and 'high' (both exclusive) and what is fetched of them so far """
+    __slots__ = ('low', 'high', 'offset', 'buffer', 'idLatest', 'segments', 'isBusy', 'isDone')
+
+    def __init__(self, low: int, high: int):
+        self.low  : int = low
+        self.high : int = high
+        # offset_id of the next page
+        self.offset : int = high
+        # Formatted messages newest first, that are not in temp files yet, and the latest id among them
+        self.buffer : Deque[str] = deque()
+        self.idLatest : int = -1
+        # Temp files of the range: path, the latest message id and number of messages
+        self.segments : List[Tuple[str, int, int]] = []
+        # Whether a worker walks the range, whether it is fetched to its low end
+        self.isBusy : bool = False
+        self.isDone : bool = False
+
+    @property
+    def span(self) -> int:
+        """ Number of ids that are still to be fetched """
+        return max(self.offset - self.low - 1, 0)
+
+
+class RangePipeline(DumpPipeline):
+    """ Fetches a chat from 'parallel' disjoint id ranges at a time (--parallel).
+        Ids between the last dumped message and the newest one (probed once) are split into
+        ranges that are walked concurrently with offset_id/min_id windows. A worker done with
+        its range takes over the older half of the widest range still being walked, so ranges
+        of deleted messages do not leave workers idle. Requests in flight are bounded by what
+        the rate limiter allows, see RateLimiter.concurrency().
+
+        Every range is formatted into temp files of its own. They join the output in id order
+        as soon as all newer ranges are done, and a checkpoint is saved then, so --resume goes
+        on from the oldest range that joined the output.
+    """
+
+    def __init__(self, client: TelegramClient, peer, settings: ChatDumpSettings,
+                 exporter: Exporter, filter: Filter, context: ExporterContext,
+                 output: ChatDumpOutput, limiter: RateLimiter, query: SearchQuery = None,
+                 archive: MessageArchive = None):
+        super().__init__(client, peer, settings, exporter, filter, context, output, limiter, query, archive)
+        # Ranges that have not joined the output yet, newest first
+        self._ranges : List[IdRange] = []
+        # Requests being fetched now
+        self._inFlight : int = 0
+        self._slots : asyncio.Condition = None
+        self._committing : asyncio.Lock = None
+
+    async def run(self, messageToFetch: int, idPageOffset: int) -> None:
+        """ Fetches all messages older than 'idPageOffset' (the newest message if 0) down to
+            the last dumped one or --since
+        """
+        self.messageToFetch = messageToFetch
+        self._slots = asyncio.Condition()
+        self._committing = asyncio.Lock()
+
+        started = time.monotonic()
+        high, low = await self._probe(idPageOffset)
+        if high - low > 1:
+            self._split(low, high)
+            self.logger.debug('Fetch ids %s - %s in %s ranges.', low + 1, high - 1, len(self._ranges))
+        workers = [asyncio.ensure_future(self._work()) for _ in range(self.settings.parallel)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            await self._settle(workers)
+            self._discard()
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.rate = self.totalWritten / elapsed
+        self.logger.debug('Ranges: %s messages fetched, %s formatted in %.1f sec.',
+                          self.totalFetched, self.totalWritten, elapsed)
+
+    async def _probe(self, idPageOffset: int) -> Tuple[int, int]:
+        """ :return offset_id and min_id of the whole id space to fetch """
+        high = idPageOffset
+        if high == 0:
+            # The newest message, up to --until
+            newest = await self._fetchPage(0, 1)
+            high = newest[0].id + 1 if newest else 0
+        low = max(self.settings.idLastMessage, 0)
+        if self.settings.since is not None and high > 0:
+            # The newest message before --since
+            older = await self._fetchPage(0, 1, offset_date=self.settings.since)
+            if older:
+                low = max(low, older[0].id)
+        return high, low
+
+    def _split(self, low: int, high: int) -> None:
+        width = math.ceil((high - low - 1) / self.settings.parallel)
+        while high - low > 1:
+            self._ranges.append(IdRange(max(high - 1 - width, low), high))
+            high = self._ranges[-1].low + 1
+
+    async def _work(self) -> None:
+        """ Walks ranges until there is none left to walk or to split """
+        while True:
+            rng = self._take()
+            if rng is None:
+                return
+            try:
+                await self._walk(rng)
+            finally:
+                rng.isBusy = False
+            await self._commit()
+
+    def _take(self) -> IdRange:
+        """ :return The newest range no one walks, or the older half of the widest range being walked """
+        for rng in self._ranges:
+            if not rng.isBusy and not rng.isDone:
+                rng.isBusy = True
+                return rng
+        busy = [rng for rng in self._ranges if rng.isBusy and not rng.isDone]
+        victim = max(busy, key=lambda rng: rng.span, default=None)
+        # Less than two pages left is not worth another worker
+        if victim is None or victim.span <= 2 * self.limiter.pageSize:
+            return None
+        middle = victim.low + victim.span // 2
+        rng = IdRange(victim.low, middle + 1)
+        victim.low = middle
+        self._ranges.insert(self._ranges.index(victim) + 1, rng)
+        rng.isBusy = True
+        return rng
+
+    async def _walk(self, rng: IdRange) -> None:
+        """ Fetches and formats pages of the range down to its low end """
+        stats = self.context.stats
+        while not rng.isDone:
+            limit = self.limiter.limit(self.messageToFetch)
+            await self._acquire()
+            try:
+                messages = await self._fetchPage(rng.offset, limit, min_id=rng.low)
+            finally:
+                await self._release()
+            self.totalFetched += len(messages)
+            if self.archive is not None:
+                with stats.measure('archive'):
+                    self.archive.add(messages)
+
+            # The range could be split while the page was fetched
+            page = [msg for msg in messages if msg.id > rng.low]
+            isDone = len(messages) < limit or len(page) < len(messages)
+            if messages:
+                rng.offset = messages[-1].id
+            if page:
+                idNewest = self.settings.idNewest(page)
+                if self.idLastMessage < idNewest:
+                    self.idLastMessage = idNewest
+                if rng.idLatest < idNewest:
+                    rng.idLatest = idNewest
+
+                block, isPast = self._formatPageOf(page)
+                isDone = isDone or isPast
+                rng.buffer.extend(block)
+                if len(rng.buffer) >= self.output.spillSize:
+                    buffer, rng.buffer = rng.buffer, deque()
+                    path, count = await self._offload(self.output.spillSegment, buffer)
+                    rng.segments.append((path, rng.idLatest, count))
+                    rng.idLatest = -1
+            # Only now the range may join the output
+            rng.isDone = isDone
+
+    def _formatPageOf(self, page: List[Message]) -> Tuple[List[str], bool]:
+        """ Filters and formats a page of a range
+            :return formatted messages and whether the page went past --since
+        """
+        stats = self.context.stats
+        started = time.monotonic()
+        selected = []
+        rejected = 0
+        isPast = False
+        for msg in page:
+            bound = self.settings.dateBound(msg)
+            if bound > 0:
+                isPast = True
+                break
+            if bound < 0:
+                continue
+            if not self.filter.valid(msg):
+                rejected += 1
+                continue
+            selected.append(msg)
+        stats.add('filter', time.monotonic() - started)
+        stats.count('messages-rejected', rejected)
+
+        block = []
+        if selected:
+            with stats.measure('format'):
+                block = self.exporter.format_batch(selected, self.context)
+            self.context.isLast = False
+            self.totalWritten += len(block)
+        return block, isPast
+
+    async def _commit(self) -> None:
+        """ Moves the ranges that are done into the output, as long as all newer ranges are done """
+        async with self._committing:
+            while self._ranges and self._ranges[0].isDone:
+                rng = self._ranges[0]
+                if rng.buffer:
+                    buffer, rng.buffer = rng.buffer, deque()
+                    path, count = await self._offload(self.output.spillSegment, buffer)
+                    rng.segments.append((path, rng.idLatest, count))
+                self._ranges.pop(0)
+                segments, rng.segments = rng.segments, []
+                # The next page of a resumed dump is the one older than the range
+                await self._offload(self.output.commit, segments, rng.low + 1, self.messageToFetch)
+
+    async def _acquire(self) -> None:
+        """ Waits until one more request may be in flight """
+        async with self._slots:
+            await self._slots.wait_for(
+                lambda: self._inFlight < self.limiter.concurrency(self.settings.parallel))
+            self._inFlight += 1
+
+    async def _release(self) -> None:
+        async with self._slots:
+            self._inFlight -= 1
+            self._slots.notify_all()
+
+    def _discard(self) -> None:
+        """ Removes temp files of the ranges that did not join the output, including the ones
+            spilled while the range was cancelled
+        """
+        for rng in self._ranges:
+            rng.segments = []
+        self.output.sweep()
@@ -0,0 +1,3 @@
+from .DumpPipeline import DumpPipeline
+from .RangePipeline import RangePipeline
+from .FollowPipeline import FollowPipeline
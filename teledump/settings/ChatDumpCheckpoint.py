@@ -0,0 +1,118 @@
+""" This Module contains classes related to Checkpoint Files"""
+
+import codecs
+import errno
+import json
+import logging
+import os
+import os.path
+
+from . import ChatDumpSettings
+from ..exceptions import MetaFileError
+
+
+class ChatDumpCheckpoint:
+    """ Checkpoint file CRUD.
+        Holds the progress of an unfinished dump, so it can be resumed with --resume.
+        The file is replaced atomically, it is either the previous or the next checkpoint.
+    """
+    key_version         : str = 'version'
+    key_chatName        : str = 'chat-name'
+    key_exporter        : str = 'exporter-name'
+    key_exporterConfig  : str = 'exporter-config'
+    key_filter          : str = 'filter-name'
+    key_compression     : str = 'compression'
+    key_shardSize       : str = 'shard-size'
+    key_since           : str = 'since'
+    key_until           : str = 'until'
+    key_isIncremental   : str = 'is-incremental'
+    key_isAscending     : str = 'is-ascending'
+    key_limit           : str = 'limit'
+    key_firstMessageId  : str = 'first-message-id'
+    key_LastMessageId   : str = 'latest-message-id'
+    key_pageOffset      : str = 'page-offset'
+    key_messageToFetch  : str = 'messages-to-fetch'
+    key_totalSaved      : str = 'saved-count'
+    key_segments        : str = 'segments'
+    key_outSize         : str = 'output-size'
+    # Size of resulting file when temp files started to be merged into it
+    key_mergeOffset     : str = 'merge-offset'
+
+    def __init__(self, path : str):
+        self._logger : logging.Logger = logging.getLogger(__name__)
+        self._path : str  = path + '.checkpoint'
+        self._data : dict = {}
+
+    def exists(self) -> bool:
+        return os.path.exists(self._path)
+
+    def merge(self, settings: ChatDumpSettings) -> None:
+        """ Restores settings of the interrupted dump """
+        data = self.load()
+        settings.chatName       = data[ChatDumpCheckpoint.key_chatName]
+        settings.exporter       = data[ChatDumpCheckpoint.key_exporter]
+        settings.exporterConfig = data[ChatDumpCheckpoint.key_exporterConfig]
+        settings.filter         = data[ChatDumpCheckpoint.key_filter]
+        settings.compression    = data.get(ChatDumpCheckpoint.key_compression, settings.compression)
+        settings.shardSize      = data.get(ChatDumpCheckpoint.key_shardSize, settings.shardSize)
+        settings.since          = settings.decodeDate(data.get(ChatDumpCheckpoint.key_since))
+        settings.until          = settings.decodeDate(data.get(ChatDumpCheckpoint.key_until))
+        settings.isIncremental  = data[ChatDumpCheckpoint.key_isIncremental]
+        settings.isAscending    = data[ChatDumpCheckpoint.key_isAscending]
+        settings.limit          = data[ChatDumpCheckpoint.key_limit]
+        settings.idLastMessage  = data[ChatDumpCheckpoint.key_firstMessageId]
+
+    def load(self) -> dict:
+        """ Loads checkpoint from file """
+        if not self._data:
+            try:
+                self._logger.debug('Load checkpoint %s.', self._path)
+                with codecs.open(self._path, 'r', 'utf-8') as ff:
+                    self._data = json.load(ff)
+            except OSError as ex:
+                msg = 'Unable to open the checkpoint file "{}". {}'.format(self._path, ex.strerror)
+                raise MetaFileError(msg) from ex
+            except ValueError as ex:
+                msg = 'Unable to load the checkpoint file "{}". {}'.format(self._path, ex)
+                raise MetaFileError(msg) from ex
+        return self._data
+
+    def save(self, settings: ChatDumpSettings, progress: dict) -> None:
+        """ Atomically replaces checkpoint file with 'settings' and 'progress' of the dump """
+        data = {}
+        data[ChatDumpCheckpoint.key_version       ] = 1
+        data[ChatDumpCheckpoint.key_chatName      ] = settings.chatName
+        data[ChatDumpCheckpoint.key_exporter      ] = settings.exporter
+        data[ChatDumpCheckpoint.key_exporterConfig] = settings.exporterConfig
+        data[ChatDumpCheckpoint.key_filter        ] = settings.filter
+        data[ChatDumpCheckpoint.key_compression   ] = settings.compression
+        data[ChatDumpCheckpoint.key_shardSize     ] = settings.shardSize
+        data[ChatDumpCheckpoint.key_since         ] = settings.encodeDate(settings.since)
+        data[ChatDumpCheckpoint.key_until         ] = settings.encodeDate(settings.until)
+        data[ChatDumpCheckpoint.key_isIncremental ] = settings.isIncremental
+        data[ChatDumpCheckpoint.key_isAscending   ] = settings.isAscending
+        data[ChatDumpCheckpoint.key_limit         ] = settings.limit
+        data[ChatDumpCheckpoint.key_firstMessageId] = settings.idLastMessage
+        data.update(progress)
+        tempPath = self._path + '.tmp'
+        try:
+            with open(tempPath, 'w') as cf:
+                json.dump(data, cf, indent=4, sort_keys=False)
+                cf.flush()
+                os.fsync(cf.fileno())
+            os.replace(tempPath, self._path)
+        except OSError as ex:
+            msg = 'Failed to write the checkpoint file. {}'.format(ex.strerror)
+            raise MetaFileError(msg)
+        self._data = data
+
+    def delete(self) -> None:
+        """ Delete checkpoint file when dump is finished """
+        self._data = {}
+        try:
+            self._logger.debug('Delete checkpoint file %s.', self._path)
+            os.remove(self._path)
+        except OSError as ex:
+            if ex.errno != errno.ENOENT:
+                msg = 'Failed to delete checkpoint file. {}'.format(ex.strerror)
+                raise MetaFileError(msg)
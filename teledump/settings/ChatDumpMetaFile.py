@@ -4,9 +4,11 @@ import codecs
 import errno
 import json
 import logging
+import os
 import os.path
 
 from . import ChatDumpSettings
+from .. import exporters
 from ..exceptions import MetaFileError
 
 
@@ -18,6 +20,10 @@ class ChatDumpMetaFile:
     key_exporter       : str = "exporter-name"
     key_exporterConfig : str = "exporter-config"
     key_filter         : str = "filter-name"
+    key_compression    : str = "compression"
+    key_shardSize      : str = "shard-size"
+    key_since          : str = "since"
+    key_until          : str = "until"
 
 
     def __init__(self, path : str):
@@ -34,6 +40,14 @@ class ChatDumpMetaFile:
         settings.exporter      = self._data[ChatDumpMetaFile.key_exporter]
         settings.exporterConfig= self._data[ChatDumpMetaFile.key_exporterConfig]
         settings.filter        = self._data[ChatDumpMetaFile.key_filter]
+        # Files written before compression was supported have no such key
+        settings.compression   = self._data.get(ChatDumpMetaFile.key_compression, settings.compression)
+        settings.shardSize     = self._data.get(ChatDumpMetaFile.key_shardSize, settings.shardSize)
+        # --since/--until given with --continue move the window of a rolling dump
+        if settings.since is None:
+            settings.since     = settings.decodeDate(self._data.get(ChatDumpMetaFile.key_since))
+        if settings.until is None:
+            settings.until     = settings.decodeDate(self._data.get(ChatDumpMetaFile.key_until))
 
     def _load(self) -> None:
         """ Loads metadata from file """
@@ -43,12 +57,29 @@ class ChatDumpMetaFile:
                 self._data = json.load(ff)
                 # TODO Validate Meta Dict
         except OSError as ex:
+            if ex.errno == errno.ENOENT and self._recover():
+                return
             msg = 'Unable to open the metadata file "{}". {}'.format(self._path, ex.strerror)
             raise MetaFileError(msg) from ex
         except ValueError as ex:
             msg = 'Unable to load the metadata file "{}". AttributeError: {}'.format(self._path, ex)
             raise MetaFileError(msg) from ex
 
+    def _recover(self) -> bool:
+        """ Restores metadata from the resulting file, if its exporter keeps it there """
+        recovered = exporters.recover(self._path[:-len('.meta')])
+        if recovered is None:
+            return False
+        exporter, chatName, idLastMessage = recovered
+        self._logger.info('Metadata file %s is missing, restored it from the resulting file.', self._path)
+        self._data = {}
+        self._data[ChatDumpMetaFile.key_chatName      ] = chatName
+        self._data[ChatDumpMetaFile.key_LastMessageId ] = idLastMessage
+        self._data[ChatDumpMetaFile.key_exporter      ] = exporter
+        self._data[ChatDumpMetaFile.key_exporterConfig] = ''
+        self._data[ChatDumpMetaFile.key_filter        ] = ''
+        return True
+
     def delete(self) -> None:
         """ Delete metafile if running in CONTINUE mode """
         try:
@@ -69,12 +100,35 @@ class ChatDumpMetaFile:
             self._add_key(data, ChatDumpMetaFile.key_exporter)
             self._add_key(data, ChatDumpMetaFile.key_exporterConfig)
             self._add_key(data, ChatDumpMetaFile.key_filter)
-            with open(self._path, 'w') as mf:
+            self._add_key(data, ChatDumpMetaFile.key_compression)
+            self._add_key(data, ChatDumpMetaFile.key_shardSize)
+            self._add_key(data, ChatDumpMetaFile.key_since)
+            self._add_key(data, ChatDumpMetaFile.key_until)
+            # Replaced atomically, --follow rewrites it after every batch
+            tempPath = self._path + '.tmp'
+            with open(tempPath, 'w') as mf:
                 json.dump(self._data, mf, indent=4, sort_keys=False)
+                mf.flush()
+                os.fsync(mf.fileno())
+            os.replace(tempPath, self._path)
         except OSError as ex:
             msg = 'Failed to write the metadata file. {}'.format(ex.strerror);
             raise MetaFileError(msg)
 
+    def update(self, settings: ChatDumpSettings, idLastMessage: int) -> None:
+        """ Save metafile describing a dump made with 'settings' """
+        data = {}
+        data[ChatDumpMetaFile.key_chatName      ] = settings.chatName
+        data[ChatDumpMetaFile.key_LastMessageId ] = idLastMessage
+        data[ChatDumpMetaFile.key_exporter      ] = settings.exporter
+        data[ChatDumpMetaFile.key_exporterConfig] = settings.exporterConfig
+        data[ChatDumpMetaFile.key_filter        ] = settings.filter
+        data[ChatDumpMetaFile.key_compression   ] = settings.compression
+        data[ChatDumpMetaFile.key_shardSize     ] = settings.shardSize
+        data[ChatDumpMetaFile.key_since         ] = settings.encodeDate(settings.since)
+        data[ChatDumpMetaFile.key_until         ] = settings.encodeDate(settings.until)
+        self.save(data)
+
     def _add_key(self, data: dict, key: str) -> None:
         if key in data:
             self._data[key] = data[key]
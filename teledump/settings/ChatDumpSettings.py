@@ -1,7 +1,13 @@
 """ This Module contains classes related to CLI interactions"""
 
+import sys
+from datetime import datetime
 from typing import *
 
+from ..exceptions import FilterError
+from ..filters.expr.Predicates import parseDate
+from ..filters.expr.Predicates import parseNumber
+from ..utils import Compression
 from ..utils import JOIN_CHAT_PREFIX_URL
 from .CustomArgumentParser import CustomArgumentParser
 from .CustomFormatter import CustomFormatter
@@ -34,13 +40,45 @@ class ChatDumpSettings:
         self.isQuiet      : bool = False
         self.isIncremental: bool = False
         self.idLastMessage: int = -1
+        self.isPipelined  : bool = False
+        self.prefetch     : int  = 4
+        # Number of id ranges of the chat fetched at a time
+        self.parallel     : int  = 1
+        self.batchFile    : str  = ""
+        self.jobs         : int  = 4
+        self.isAscending  : bool = False
+        # Messages dated within [since, until) are dumped, None means unbounded (UTC)
+        self.since        : datetime = None
+        self.until        : datetime = None
+        self.isResumed    : bool = False
+        self.downloadDir  : str  = ""
+        self.downloadWorkers: int = 4
+        self.downloadParts: int  = 4
+        self.bandwidth    : int  = 0
+        self.storeDir     : str  = ""
+        self.isPushdown   : bool = False
+        # Whether the dump runs within takeout session
+        self.isTakeout    : bool = False
+        # Whether new messages are appended as they come once the history is dumped,
+        # and how often they are flushed, seconds
+        self.isFollowing  : bool = False
+        self.flushInterval: float = 5.0
+        self.archiveDir   : str  = ""
+        self.archiveSource: str  = ""
+        self.senderCacheFile: str = ""
+        self.statsFile    : str  = ""
+        self.prometheusFile: str = ""
+        # gzip | zstd | '' for plain text
+        self.compression  : str  = ""
+        # Maximum size of a part of the sharded dataset, 0 writes a single file
+        self.shardSize    : int  = 0
 
 
         # Parse parameters
         parser = CustomArgumentParser(formatter_class=CustomFormatter, usage=usage)
 
         parser.add_argument('-c' , '--chat'    , type=str , default='' )
-        parser.add_argument('-p' , '--phone'   , type=str , required=True)
+        parser.add_argument('-p' , '--phone'   , type=str , default='')
         parser.add_argument('-o' , '--out'     , type=str , default='')
         parser.add_argument('-e' , '--exporter', type=str , default='')
         parser.add_argument(       '--expdata' , type=str, default='')
@@ -50,7 +88,32 @@ class ChatDumpSettings:
         parser.add_argument('-cl', '--clean'   , action='store_true')
         parser.add_argument('-v' , '--verbose' , action='store_true')
         parser.add_argument(       '--addbom'  , action='store_true')
+        parser.add_argument(       '--compress', type=str , default='', choices=Compression.METHODS + ('none',))
+        parser.add_argument(       '--shard'   , type=str , default='')
         parser.add_argument('-q' , '--quiet'   , action='store_true')
+        parser.add_argument(       '--pipeline', action='store_true')
+        parser.add_argument(       '--prefetch', type=int , default=4)
+        parser.add_argument(       '--parallel', type=int , default=1)
+        parser.add_argument(       '--batch'   , type=str , default='')
+        parser.add_argument(       '--jobs'    , type=int , default=4)
+        parser.add_argument(       '--ascending', action='store_true')
+        parser.add_argument(       '--since'   , type=str , default='')
+        parser.add_argument(       '--until'   , type=str , default='')
+        parser.add_argument(       '--resume'  , action='store_true')
+        parser.add_argument(       '--download', type=str , default='')
+        parser.add_argument(       '--download-workers', type=int, default=4, dest='download_workers')
+        parser.add_argument(       '--download-parts'  , type=int, default=4, dest='download_parts')
+        parser.add_argument(       '--bandwidth', type=int, default=0)
+        parser.add_argument(       '--store'   , type=str , default='')
+        parser.add_argument(       '--pushdown', action='store_true')
+        parser.add_argument(       '--takeout' , action='store_true')
+        parser.add_argument(       '--follow'  , action='store_true')
+        parser.add_argument(       '--flush-interval', type=float, default=5.0, dest='flush_interval')
+        parser.add_argument(       '--archive' , type=str , default='')
+        parser.add_argument(       '--from-archive', type=str, default='', dest='from_archive')
+        parser.add_argument(       '--sender-cache', type=str, default='', dest='sender_cache')
+        parser.add_argument(       '--stats'   , type=str , default='')
+        parser.add_argument(       '--prometheus', type=str, default='')
 
         args = parser.parse_args()
 
@@ -60,16 +123,31 @@ class ChatDumpSettings:
         args.filter   = args.filter.strip()
         args.out      = args.out.strip()
         args.phone    = args.phone.strip()
+        args.batch    = args.batch.strip()
+        args.archive  = args.archive.strip()
+        args.from_archive = args.from_archive.strip()
 
         # Detect Normal/Incremental mode
         self._incremental(args, parser)
         # Check if user specified the right options depending on the mode
         self._consistency(args, parser)
 
-        self._validate_limit(args)
+        self._validate_limit(args, parser)
+        self._validate_dates(args, parser)
         self._validate_exporter(args, parser)
         self._validate_filter(args, parser)
+        self.isPushdown = args.pushdown
+        self.isTakeout  = args.takeout
+        self._validate_archive(args, parser)
         self._validate_outFile(args)
+        self._validate_compression(args, parser)
+        self._validate_shard(args, parser)
+        self._validate_pipeline(args, parser)
+        self._validate_download(args, parser)
+        self._validate_follow(args, parser)
+        self.senderCacheFile = args.sender_cache.strip()
+        self.statsFile      = args.stats.strip()
+        self.prometheusFile = args.prometheus.strip()
 
         self.chatName  = args.chat
         self.isClean   = args.clean
@@ -93,7 +171,54 @@ class ChatDumpSettings:
         return
 
     def _consistency(self, args, parser : CustomArgumentParser):
-        if self.isIncremental:
+        if args.from_archive != "":
+            # In case of --from-archive messages are read from the archive, nothing is fetched
+            if self.isIncremental or args.resume or args.batch != "":
+                parser.error('--continue, --resume and --batch are not allowed with --from-archive')
+            if args.archive != "":
+                parser.error('--archive is not allowed with --from-archive')
+            if args.takeout:
+                parser.error('--takeout is not allowed with --from-archive')
+            if args.follow:
+                parser.error('--follow is not allowed with --from-archive')
+            if args.out == "":
+                parser.error('output file must be specified explicitely when using --from-archive')
+            self.archiveSource = args.from_archive
+            return
+        if args.batch != "":
+            # In case of --batch every chat is described by the manifest
+            if self.isIncremental:
+                parser.error('--continue is not allowed with --batch, use "continue" key of manifest entries')
+            if args.resume:
+                parser.error('--resume is not allowed with --batch, use "continue" key of manifest entries')
+            if args.chat != "":
+                parser.error('chat name must NOT be specified explicitely when using --batch')
+            if args.out != "":
+                parser.error('output file must NOT be specified explicitely when using --batch')
+            if args.jobs < 1:
+                parser.error('jobs must be a positive number')
+            self.batchFile = args.batch
+            self.jobs      = args.jobs
+        elif args.resume:
+            # In case of --resume everything is restored from checkpoint file
+            if self.isIncremental:
+                parser.error('--continue is not allowed with --resume')
+            if args.out == "":
+                parser.error('To resume an unfinished dump. You have to specify it using --out or -o setting.')
+            if args.chat != "":
+                parser.error('chat name must NOT be specified explicitely when using --resume')
+            if args.exporter != "":
+                parser.error('exporter must NOT be specified explicitely when using --resume')
+            if args.filter != "":
+                parser.error('filter must NOT be specified explicitely when using --resume')
+            if args.limit != -1:
+                parser.error('limit setting is not allowed when using --resume')
+            if args.ascending:
+                parser.error('--ascending is not allowed with --resume')
+            if args.since != "" or args.until != "":
+                parser.error('--since and --until are not allowed with --resume')
+            self.isResumed = True
+        elif self.isIncremental:
             if args.out == "":
                 parser.error('To increment an existing dump file. You have to specify it using --out or -o setting.')
             if self.idLastMessage != -1:
@@ -119,40 +244,216 @@ class ChatDumpSettings:
             if args.chat == "":
                 parser.error('the following arguments are required: -c/--chat ')
 
+        if args.phone == "":
+            parser.error('the following arguments are required: -p/--phone')
         try:
             zz = int(args.phone) <= 0
             self.phoneNum = args.phone
         except ValueError:
             parser.error('Phone number is invalid.')
 
-    def _validate_limit(self, args):
+    def _validate_limit(self, args, parser):
         # Validate limit / set default
         self.limit = args.limit
+        self.isAscending = args.ascending
+        if self.isAscending:
+            # Oldest-first dump always runs to the newest message
+            if self.limit > 0:
+                parser.error('limit setting is not allowed when using --ascending')
+            self.limit = 0
         if not self.isIncremental and self.limit < 0:
             self.limit = 100
 
+    def _validate_dates(self, args, parser):
+        # --since is the beginning of its day (month, minute ...), --until is the end of it
+        try:
+            if args.since != '':
+                self.since = parseDate(args.since)[0]
+            if args.until != '':
+                self.until = parseDate(args.until)[1]
+        except FilterError as ex:
+            parser.error('Invalid --since/--until. {}'.format(ex))
+        if self.since is not None and self.until is not None and self.since >= self.until:
+            parser.error('--since must be earlier than --until')
+        if (self.since is not None or self.until is not None) and args.limit == -1 and not self.isIncremental:
+            # The whole range unless limited explicitly
+            self.limit = 0
+
     def _validate_exporter(self, args, parser):
         # Validate exporter name / set default
         self.exporter = exporters.fallback(args.exporter)
         if not exporters.exist(self.exporter):
             parser.error('No such exporter : <{}>'.format(args.exporter))
         self.exporterConfig = args.expdata
+        if self.exporter == 'parquet' and args.addbom:
+            parser.error('--addbom is not applicable to parquet exporter')
 
     def _validate_filter(self, args, parser):
         if args.filter != '':
             self.filter = args.filter
-            if not filters.exist(self.filter):
-                parser.error('No such filter : <{}>'.format(args.filter))
+            try:
+                filters.check(self.filter)
+            except FilterError as ex:
+                parser.error('No such filter : <{}>. {}'.format(args.filter, ex))
+
+    def _validate_pipeline(self, args, parser):
+        if args.prefetch < 1:
+            parser.error('prefetch must be a positive number of pages')
+        self.isPipelined = args.pipeline
+        self.prefetch    = args.prefetch
+        if args.parallel < 1:
+            parser.error('parallel must be a positive number of id ranges')
+        self.parallel    = args.parallel
+        if self.parallel > 1:
+            # Ranges are fetched to their ends, the whole history (or --since window) is dumped
+            if args.limit > 0:
+                parser.error('limit setting is not allowed when using --parallel')
+            if self.isAscending:
+                parser.error('--ascending is not allowed with --parallel')
+            self.limit = 0
+
+    def _validate_archive(self, args, parser):
+        if args.archive == '':
+            return
+        if args.batch != '':
+            parser.error('--archive is not allowed with --batch')
+        self.archiveDir = args.archive
+        # Archive keeps the whole history, not only the messages Telegram search finds
+        self.isPushdown = False
+
+    def _validate_download(self, args, parser):
+        if args.download.strip() == '' and args.store.strip() == '':
+            return
+        if args.exporter != '' and args.exporter != 'media':
+            parser.error('--download and --store require media exporter')
+        if args.download_workers < 1 or args.download_parts < 1:
+            parser.error('download workers and parts must be positive numbers')
+        if args.bandwidth < 0:
+            parser.error('bandwidth must not be negative')
+        self.downloadDir     = args.download.strip()
+        self.storeDir        = args.store.strip()
+        self.downloadWorkers = args.download_workers
+        self.downloadParts   = args.download_parts
+        # KB/sec -> bytes/sec
+        self.bandwidth       = args.bandwidth * 1024
+
+    def _validate_follow(self, args, parser):
+        if not args.follow:
+            return
+        if args.batch != '':
+            parser.error('--follow is not allowed with --batch')
+        if self.until is not None:
+            parser.error('--until is not allowed with --follow')
+        if self.downloadDir or self.storeDir:
+            parser.error('--download and --store are not allowed with --follow')
+        if self.exporter == 'parquet' or self.shardSize:
+            # Every flush would add a new file to the dataset
+            parser.error('--follow is not applicable to parquet exporter and --shard')
+        if args.flush_interval <= 0:
+            parser.error('flush interval must be a positive number of seconds')
+        self.isFollowing   = True
+        self.flushInterval = args.flush_interval
 
     def _validate_outFile(self, args):
         # Default output file if not specified by user
-        OUTPUT_FILE_TEMPLATE = 'telegram_{}.log'
-
         if args.out != '':
             outFile = args.out
-        elif args.chat.startswith(JOIN_CHAT_PREFIX_URL):
-            outFile = OUTPUT_FILE_TEMPLATE.format(args.chat.rsplit('/', 1)[-1])
         else:
-            outFile = OUTPUT_FILE_TEMPLATE.format(args.chat)
+            outFile = ChatDumpSettings.defaultOutFile(args.chat)
 
         self.outFile = outFile
+
+    def _validate_compression(self, args, parser):
+        # Explicit --compress, or the one implied by extension of the output file
+        if args.compress == 'none':
+            self.compression = ''
+        else:
+            self.compression = args.compress or Compression.detect(self.outFile)
+        if not self.compression:
+            return
+        if self.exporter in ('parquet', 'sqlite'):
+            parser.error('--compress is not applicable to {} exporter'.format(self.exporter))
+        missing = Compression.missing(self.compression)
+        if missing:
+            parser.error(missing)
+
+    def _validate_shard(self, args, parser):
+        if args.shard == '':
+            return
+        try:
+            self.shardSize = parseNumber(args.shard)
+        except FilterError:
+            self.shardSize = 0
+        if self.shardSize <= 0:
+            parser.error('--shard must be a positive size, e.g. 256m')
+        if not exporters.shardable(self.exporter):
+            parser.error('--shard is not applicable to {} exporter'.format(self.exporter))
+        if args.addbom:
+            parser.error('--addbom is not applicable with --shard')
+
+    def messageLimit(self) -> int:
+        """ How many massages user wants to be dumped
+            explicit --limit, or default of 100 or unlimited (int.Max)
+        """
+        return self.limit \
+            if self.limit != -1\
+            and not self.limit == 0\
+            and not self.isIncremental\
+            else sys.maxsize
+
+    def isParallel(self) -> bool:
+        """ Whether id ranges are fetched concurrently. A resumed dump may have a limit
+            or run in ascending mode, then it goes on with one cursor
+        """
+        return self.parallel > 1 and not self.isAscending and self.messageLimit() == sys.maxsize
+
+    def firstPageOffset(self) -> int:
+        """ Offset of the first page to fetch """
+        # Oldest-first dump walks from the oldest message (or the last dumped one) upwards
+        return max(self.idLastMessage, 0) if self.isAscending else 0
+
+    def pageDate(self, idPageOffset: int, isSearch: bool) -> datetime:
+        """ offset_date of the page, so the first page starts right at --until (--since in ascending mode)
+            instead of the newest (oldest) message. None once paging goes on by message id
+        """
+        if idPageOffset != 0:
+            return None
+        if self.isAscending:
+            # Telegram search takes offset_date as the upper bound only
+            return None if isSearch else self.since
+        return self.until
+
+    def dateBound(self, msg) -> int:
+        """ :return 0 if the message is dated within --since/--until,
+                    1 if paging has gone past the range, so no further message is in it,
+                    -1 if paging has not reached the range yet
+        """
+        if self.since is not None and msg.date < self.since:
+            return -1 if self.isAscending else 1
+        if self.until is not None and msg.date >= self.until:
+            return 1 if self.isAscending else -1
+        return 0
+
+    def idNewest(self, messages: list) -> int:
+        """ :return id of the newest message of the page that is not newer than --until, -1 if none is """
+        if self.until is None:
+            return messages[-1].id if self.isAscending else messages[0].id
+        return max((msg.id for msg in messages if msg.date < self.until), default=-1)
+
+    @staticmethod
+    def encodeDate(date: datetime) -> str:
+        """ --since/--until as stored in meta and checkpoint files """
+        return date.isoformat() if date is not None else None
+
+    @staticmethod
+    def decodeDate(text: str) -> datetime:
+        return datetime.fromisoformat(text) if text else None
+
+    @staticmethod
+    def defaultOutFile(chatName: str) -> str:
+        """ Output file name used when user did not specify it """
+        OUTPUT_FILE_TEMPLATE = 'telegram_{}.log'
+
+        if chatName.startswith(JOIN_CHAT_PREFIX_URL):
+            return OUTPUT_FILE_TEMPLATE.format(chatName.rsplit('/', 1)[-1])
+        return OUTPUT_FILE_TEMPLATE.format(chatName)
@@ -1,2 +1,3 @@
 from .ChatDumpSettings import ChatDumpSettings
 from .ChatDumpMetaFile import ChatDumpMetaFile
+from .ChatDumpCheckpoint import ChatDumpCheckpoint
@@ -0,0 +1,206 @@
+""" This Module contains per-stage statistics of a dump run """
+
+import codecs
+import json
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+
+class Stage:
+    """ Time spent in a stage of the dump, how many times it ran and how many bytes it wrote """
+    __slots__ = ('count', 'seconds', 'maxSeconds', 'bytes')
+
+    def __init__(self):
+        self.count : int = 0
+        self.seconds : float = 0.0
+        self.maxSeconds : float = 0.0
+        self.bytes : int = 0
+
+    def add(self, seconds: float, count: int = 1, bytes: int = 0) -> None:
+        self.count += count
+        self.seconds += seconds
+        self.maxSeconds = max(self.maxSeconds, seconds)
+        self.bytes += bytes
+
+
+class RunStats:
+    """ Statistics of dumping one chat:
+            stages   - connect, takeout, resolve, pushdown, pacing, fetch, flood-wait, archive, filter,
+                       format, spill, merge, download, append, each with its time, count and bytes
+            counters - messages-fetched, messages-rejected, messages-saved ...
+            latency of every page fetched from Telegram
+        Written at the end of a run as JSON and as Prometheus textfile collector metrics.
+    """
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, chat: str = '', exporter: str = ''):
+        self.chat : str = chat
+        self.exporter : str = exporter
+        self.stages   : Dict[str, Stage] = OrderedDict()
+        self.counters : Dict[str, int] = OrderedDict()
+        # Fetch latency of every page, seconds
+        self.latencies : List[float] = []
+        # Size of the resulting file after the run minus its size before, bytes
+        self.bytesWritten : int = 0
+        self.rc : int = 0
+        self.started : float = time.time()
+        self.finished : float = 0.0
+        # Resulting file (or dataset directory) and its size when the run started writing it
+        self._outPath : str = ''
+        self._outSize : int = 0
+
+    def stage(self, name: str) -> Stage:
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = Stage()
+        return stage
+
+    def add(self, name: str, seconds: float, count: int = 1, bytes: int = 0) -> None:
+        self.stage(name).add(seconds, count, bytes)
+
+    @contextmanager
+    def measure(self, name: str, count: int = 1):
+        """ Adds time spent in the block to the stage """
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.stage(name).add(time.monotonic() - started, count)
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def page(self, latency: float, messages: int) -> None:
+        """ Records a page fetched from Telegram """
+        self.latencies.append(latency)
+        self.add('fetch', latency)
+        self.count('messages-fetched', messages)
+
+    def watch(self, path: str) -> None:
+        """ Remembers size of the resulting file, so 'bytesWritten' is what the run added to it """
+        self._outPath = path
+        self._outSize = RunStats.size(path)
+
+    def finish(self, rc: int, messagesSaved: int) -> None:
+        self.rc = rc
+        self.counters['messages-saved'] = messagesSaved
+        self.finished = time.time()
+        if self._outPath:
+            self.bytesWritten = RunStats.size(self._outPath) - self._outSize
+
+    def duration(self) -> float:
+        return (self.finished or time.time()) - self.started
+
+    def quantile(self, q: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def toDict(self) -> dict:
+        duration = self.duration()
+        saved = self.counters.get('messages-saved', 0)
+        return OrderedDict([
+            ('chat'         , self.chat),
+            ('exporter'     , self.exporter),
+            ('rc'           , self.rc),
+            ('started'      , self.started),
+            ('seconds'      , round(duration, 3)),
+            ('msgsPerSec'   , round(saved / duration, 1) if duration > 0 else 0.0),
+            ('bytesWritten' , self.bytesWritten),
+            ('counters'     , dict(self.counters)),
+            ('stages'       , OrderedDict((name, OrderedDict([
+                ('count'     , stage.count),
+                ('seconds'   , round(stage.seconds, 6)),
+                ('maxSeconds', round(stage.maxSeconds, 6)),
+                ('bytes'     , stage.bytes),
+            ])) for name, stage in self.stages.items())),
+            ('fetchLatency' , OrderedDict(
+                [('pages', len(self.latencies))] +
+                [('p{:g}'.format(q * 100), round(self.quantile(q), 6)) for q in RunStats.QUANTILES])),
+        ])
+
+    def samples(self) -> List[Tuple[str, str, str]]:
+        """ :return Prometheus samples of this run: (metric family, sample with labels, value) """
+        labels = 'chat="{}",exporter="{}"'.format(_label(self.chat), _label(self.exporter))
+        duration = self.duration()
+        saved = self.counters.get('messages-saved', 0)
+        samples = [
+            ('teledump_run_success', '', int(self.rc == 0)),
+            ('teledump_run_timestamp_seconds', '', '{:.3f}'.format(self.finished or time.time())),
+            ('teledump_run_duration_seconds', '', '{:.6f}'.format(duration)),
+            ('teledump_messages_per_second', '', '{:.3f}'.format(saved / duration if duration > 0 else 0.0)),
+            ('teledump_output_bytes', '', self.bytesWritten),
+        ]
+        # Values of one run go up and down between runs, they are gauges named for the last run
+        for name, value in self.counters.items():
+            samples.append(('teledump_last_run_{}'.format(name.replace('-', '_')), '', value))
+        for name, stage in self.stages.items():
+            stageLabel = ',stage="{}"'.format(name)
+            samples.append(('teledump_last_run_stage_seconds', stageLabel, '{:.6f}'.format(stage.seconds)))
+            samples.append(('teledump_last_run_stage_operations', stageLabel, stage.count))
+            samples.append(('teledump_last_run_stage_bytes', stageLabel, stage.bytes))
+        for q in RunStats.QUANTILES:
+            samples.append(('teledump_last_run_fetch_latency_seconds', ',quantile="{:g}"'.format(q),
+                            '{:.6f}'.format(self.quantile(q))))
+        samples.append(('teledump_last_run_fetch_pages', '', len(self.latencies)))
+        result = [(family, '{}{{{}{}}}'.format(family, labels, extra), str(value)) for family, extra, value in samples]
+        return result
+
+    @staticmethod
+    def size(path: str) -> int:
+        """ :return size of the file or of all files of the directory, 0 if there is none """
+        if os.path.isdir(path):
+            return sum(os.path.getsize(os.path.join(root, name))
+                       for root, _, names in os.walk(path) for name in names)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    @staticmethod
+    def save(runs: List['RunStats'], statsPath: str = '', prometheusPath: str = '') -> None:
+        """ Writes statistics of the runs (one per chat) into JSON and Prometheus textfile.
+            Files are replaced atomically, so a collector never reads a half-written one.
+        """
+        if statsPath:
+            data = runs[0].toDict() if len(runs) == 1 else {'chats': [run.toDict() for run in runs]}
+            _replace(statsPath, json.dumps(data, indent=4, ensure_ascii=False) + '\n')
+        if prometheusPath:
+            families : Dict[str, List[str]] = OrderedDict()
+            for run in runs:
+                for family, sample, value in run.samples():
+                    families.setdefault(family, []).append('{} {}'.format(sample, value))
+            lines = []
+            for family, samples in families.items():
+                kind, text = _METRICS.get(family, ('gauge', 'Count of the last dump.'))
+                lines.append('# HELP {} {}'.format(family, text))
+                lines.append('# TYPE {} {}'.format(family, kind))
+                lines.extend(samples)
+            _replace(prometheusPath, '\n'.join(lines) + '\n')
+
+
+_METRICS = {
+    'teledump_run_success'                    : ('gauge', 'Whether the last dump succeeded.'),
+    'teledump_run_timestamp_seconds'          : ('gauge', 'Unix time the last dump finished.'),
+    'teledump_run_duration_seconds'           : ('gauge', 'Duration of the last dump.'),
+    'teledump_messages_per_second'            : ('gauge', 'Messages saved per second by the last dump.'),
+    'teledump_output_bytes'                   : ('gauge', 'Bytes the last dump added to the resulting file.'),
+    'teledump_last_run_stage_seconds'         : ('gauge', 'Time spent in a stage of the last dump.'),
+    'teledump_last_run_stage_operations'      : ('gauge', 'Operations (pages, spills ...) of a stage of the last dump.'),
+    'teledump_last_run_stage_bytes'           : ('gauge', 'Bytes written by a stage of the last dump.'),
+    'teledump_last_run_fetch_latency_seconds' : ('gauge', 'Quantiles of latency of pages fetched by the last dump.'),
+    'teledump_last_run_fetch_pages'           : ('gauge', 'Pages fetched by the last dump.'),
+}
+
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _replace(path: str, text: str) -> None:
+    with codecs.open(path + '.tmp', 'w', 'utf-8') as ff:
+        ff.write(text)
+    os.replace(path + '.tmp', path)
@@ -0,0 +1,2 @@
+from .RunStats import RunStats
+from .RunStats import Stage
@@ -0,0 +1,102 @@
+""" This Module contains compressed text streams of resulting and temp files """
+
+import codecs
+import gzip
+import os
+import os.path
+import zlib
+from typing import TextIO
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from ..exceptions import DumpingError
+
+
+class Compression:
+    """ Opens resulting and temp files as plain UTF-8 text or as a gzip/zstd stream.
+        Every open() for writing or appending starts a new gzip member (zstd frame)
+        and concatenated members are a valid file, so --continue appends to a compressed
+        file without rewriting it, and compressed temp files are moved into resulting
+        file as they are, without decompressing them.
+    """
+    GZIP = 'gzip'
+    ZSTD = 'zstd'
+    METHODS = (GZIP, ZSTD)
+    # Compression method by extension of the resulting file
+    EXTENSIONS = {'.gz': GZIP, '.gzip': GZIP, '.zst': ZSTD, '.zstd': ZSTD}
+    # Defaults of gzip and zstd command line tools
+    LEVELS = {GZIP: 6, ZSTD: 3}
+
+    def __init__(self, method: str = ''):
+        # '' for plain text
+        self.method : str = method
+
+    @property
+    def isEnabled(self) -> bool:
+        return self.method != ''
+
+    @property
+    def suffix(self) -> str:
+        """ Extension of compressed temp files """
+        return {Compression.GZIP: '.gz', Compression.ZSTD: '.zst'}.get(self.method, '')
+
+    def open(self, path: str, mode: str) -> TextIO:
+        """ Opens the file for writing ('w') or appending ('a') UTF-8 text """
+        if self.method == Compression.GZIP:
+            return gzip.open(path, mode + 't', compresslevel=Compression.LEVELS[self.method],
+                             encoding='utf-8', newline='')
+        if self.method == Compression.ZSTD:
+            if zstandard is None:
+                raise DumpingError(Compression.missing(self.method))
+            return zstandard.open(path, mode + 't', cctx=zstandard.ZstdCompressor(level=Compression.LEVELS[self.method]),
+                                  encoding='utf-8', newline='')
+        return codecs.open(path, mode, 'utf-8')
+
+    def truncate(self, path: str, size: int) -> None:
+        """ Cuts a file at 'size' bytes, where its stream was flushed.
+            A compressed file is decompressed up to there and written anew as one complete
+            gzip member (zstd frame), so it can be appended to again.
+        """
+        if not self.isEnabled:
+            with open(path, 'r+b') as ff:
+                ff.truncate(size)
+            return
+        with open(path, 'rb') as ff:
+            data = ff.read(size)
+        chunks = []
+        while data:
+            if self.method == Compression.GZIP:
+                decompressor = zlib.decompressobj(wbits=31)
+            else:
+                if zstandard is None:
+                    raise DumpingError(Compression.missing(self.method))
+                decompressor = zstandard.ZstdDecompressor().decompressobj()
+            chunks.append(decompressor.decompress(data))
+            # The next member (frame), if this one is complete
+            data = decompressor.unused_data if decompressor.eof else b''
+        tempPath = path + '.tmp'
+        if self.method == Compression.GZIP:
+            stream = gzip.open(tempPath, 'wb', compresslevel=Compression.LEVELS[self.method])
+        else:
+            stream = zstandard.open(tempPath, 'wb', cctx=zstandard.ZstdCompressor(level=Compression.LEVELS[self.method]))
+        with stream:
+            for chunk in chunks:
+                stream.write(chunk)
+        with open(tempPath, 'rb') as ff:
+            os.fsync(ff.fileno())
+        os.replace(tempPath, path)
+
+    @staticmethod
+    def detect(path: str) -> str:
+        """ :return compression method implied by extension of the path, '' if none """
+        return Compression.EXTENSIONS.get(os.path.splitext(path)[1].lower(), '')
+
+    @staticmethod
+    def missing(method: str) -> str:
+        """ :return why the method can not be used, '' if it can """
+        if method == Compression.ZSTD and zstandard is None:
+            return 'zstd compression requires zstandard package. Run "pip install zstandard".'
+        return ''
@@ -1,25 +1,35 @@
 import re
+from typing import Dict
+
 
 class Escaper:
-    def __init__(self):
-        self.ESCAPE = re.compile(r'[\x00-\x1f\\"\b\f\n\r\t]')
-        self.ESCAPE_DICT = {
-            '\\': '\\\\',
-            '"': '""',
+    """ Escapes control characters (and 'extra' ones) the way JSON encoder does.
+        A string without such characters is returned as is, found by one regex scan.
+        Otherwise every table character the string contains is replaced with str.replace,
+        which is cheaper than calling back into Python for each match.
+    """
+
+    def __init__(self, extra: Dict[str, str] = None):
+        table = {chr(i): '\\u{0:04x}'.format(i) for i in range(0x20)}
+        table.update({
             '\b': '\\b',
             '\f': '\\f',
             '\n': '\\n',
             '\r': '\\r',
             '\t': '\\t',
-        }
-        for i in range(0x20):
-            self.ESCAPE_DICT.setdefault(chr(i), '\\u{0:04x}'.format(i))
+        })
+        table.update(extra or {})
+        # Backslash goes first as the other replacements add it
+        self._table = sorted(table.items(), key=lambda item: item[0] != '\\')
+        self._search = re.compile('[{}]'.format(re.escape(''.join(table)))).search
 
     def escape( self, ss: str ) -> str :
         """Return a JSON representation of a Python string"""
         if not ss:
             return ""
-        def replace(match):
-            return self.ESCAPE_DICT[match.group(0)]
-
-        return str(self.ESCAPE.sub(replace, ss))
+        if self._search(ss) is None:
+            return ss
+        for ch, replacement in self._table:
+            if ch in ss:
+                ss = ss.replace(ch, replacement)
+        return ss
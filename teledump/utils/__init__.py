@@ -1,7 +1,15 @@
+from .Compression import Compression
 from .Escaper import Escaper
 JOIN_CHAT_PREFIX_URL = 'https://t.me/joinchat/'
-_escaper = Escaper()
+# csv cells: control characters, backslash and quotes
+_escaper = Escaper({'\\': '\\\\', '"': '""'})
+# text lines: control characters only
+_textEscaper = Escaper()
 
 
 def escape( ss: str ) -> str :
     return _escaper.escape(ss)
+
+
+def escape_text( ss: str ) -> str :
+    return _textEscaper.escape(ss)
@@ -0,0 +1,103 @@
+""" Interrupted dumps resumed with --resume against the synthetic chat of benchmarks.fakes """
+
+import gzip
+import sys
+import time
+
+import pytest
+
+from benchmarks.fakes import ChatShape
+from benchmarks.fakes import FakeChat
+from benchmarks.fakes import FakeDumper
+from teledump import exporters
+from teledump import filters
+from teledump.settings import ChatDumpCheckpoint
+from teledump.settings import ChatDumpMetaFile
+from teledump.settings import ChatDumpSettings
+
+COUNT = 4000
+SPILL = 200
+
+
+def makeDumper(tmp_path, monkeypatch, out: str, args: list) -> FakeDumper:
+    monkeypatch.setattr(sys, 'argv', ['teledump', '-p', '+10000000000', '-o', str(tmp_path / out), '-q'] + args)
+    settings = ChatDumpSettings('')
+    if settings.isResumed:
+        ChatDumpCheckpoint(settings.outFile).merge(settings)
+    exporter = exporters.load(settings.exporter)
+    exporter.setCompression(settings.compression)
+    dumper = FakeDumper(str(tmp_path / 'session'), settings, ChatDumpMetaFile(settings.outFile),
+                        exporter, filters.load(settings.filter, exporter), FakeChat(ChatShape(count=COUNT)))
+    dumper.output.spillSize = SPILL
+    return dumper
+
+
+def interruptDuring(dumper: FakeDumper, calls: int, method: str = 'spill') -> None:
+    """ Interrupts the dump the way Ctrl+C does, while the n-th call of the output method is running """
+    spill = getattr(dumper.output, method)
+    loop = dumper.loop
+    done = []
+
+    def interrupt():
+        raise KeyboardInterrupt
+
+    def slowSpill(*args):
+        if len(done) + 1 == calls:
+            loop.call_soon_threadsafe(interrupt)
+            time.sleep(0.2)
+        spill(*args)
+        done.append(args)
+    setattr(dumper.output, method, slowSpill)
+
+
+def tempFiles(tmp_path) -> list:
+    return sorted(str(path) for path in tmp_path.iterdir() if '.tmp' in path.name)
+
+
+def read(path: str) -> list:
+    with (gzip.open(path, 'rt', encoding='utf-8') if path.endswith('.gz') else open(path, encoding='utf-8')) as ff:
+        return ff.read().splitlines()
+
+
+@pytest.mark.parametrize('mode', [[], ['--pipeline'], ['--ascending'], ['--pipeline', '--ascending']])
+@pytest.mark.parametrize('out', ['out.jsonl', 'out.jsonl.gz'])
+def test_interrupted_dump_is_resumed(tmp_path, monkeypatch, mode, out):
+    args = ['-c', '@benchmark_chat', '-e', 'jsonl'] + ([] if '--ascending' in mode else ['-l', '0'])
+    assert makeDumper(tmp_path, monkeypatch, 'ref.jsonl', args + mode).run() == 0
+
+    dumper = makeDumper(tmp_path, monkeypatch, out, args + mode)
+    interruptDuring(dumper, 2)
+    assert dumper.run() == 1
+    assert ChatDumpCheckpoint(dumper.settings.outFile).exists()
+
+    dumper = makeDumper(tmp_path, monkeypatch, out, ['--resume'] + [arg for arg in mode if arg == '--pipeline'])
+    assert dumper.run() == 0
+    assert not ChatDumpCheckpoint(dumper.settings.outFile).exists()
+    assert read(dumper.settings.outFile) == read(str(tmp_path / 'ref.jsonl'))
+    assert tempFiles(tmp_path) == []
+
+
+@pytest.mark.parametrize('out', ['out.jsonl', 'out.jsonl.gz'])
+def test_interrupted_parallel_dump_keeps_only_temp_files_of_checkpoint(tmp_path, monkeypatch, out):
+    args = ['-c', '@benchmark_chat', '-e', 'jsonl', '--parallel', '4']
+    assert makeDumper(tmp_path, monkeypatch, 'ref.jsonl', args).run() == 0
+
+    dumper = makeDumper(tmp_path, monkeypatch, out, args)
+    interruptDuring(dumper, 2, 'commit')
+    assert dumper.run() == 1
+    checkpoint = ChatDumpCheckpoint(dumper.settings.outFile)
+    segments = [path for path, _ in checkpoint.load()[ChatDumpCheckpoint.key_segments]]
+    assert tempFiles(tmp_path) == sorted(segments)
+
+    dumper = makeDumper(tmp_path, monkeypatch, out, ['--resume', '--parallel', '4'])
+    assert dumper.run() == 0
+    assert read(dumper.settings.outFile) == read(str(tmp_path / 'ref.jsonl'))
+    assert tempFiles(tmp_path) == []
+
+
+def test_fresh_dump_removes_temp_files_left_without_checkpoint(tmp_path, monkeypatch):
+    stray = tmp_path / 'out.jsonl.k3j5x8q1.tmp'
+    stray.write_text('')
+    dumper = makeDumper(tmp_path, monkeypatch, 'out.jsonl', ['-c', '@benchmark_chat', '-e', 'jsonl', '-l', '0'])
+    assert dumper.run() == 0
+    assert not stray.exists()
@@ -0,0 +1,69 @@
+""" Sharded datasets (--shard) written from the synthetic chat of benchmarks.fakes """
+
+import hashlib
+import os
+import sys
+
+from benchmarks.fakes import ChatShape
+from benchmarks.fakes import FakeChat
+from benchmarks.fakes import FakeDumper
+from teledump import exporters
+from teledump import filters
+from teledump.exporters.shard.ShardManifest import ShardManifest
+from teledump.settings import ChatDumpMetaFile
+from teledump.settings import ChatDumpSettings
+
+SHARD = 64 * 1024
+
+
+def dump(tmp_path, monkeypatch, count: int, args: list) -> FakeDumper:
+    monkeypatch.setattr(sys, 'argv', ['teledump', '-p', '+10000000000', '-o', str(tmp_path / 'out'), '-q'] + args)
+    settings = ChatDumpSettings('')
+    chatMeta = ChatDumpMetaFile(settings.outFile)
+    if settings.isIncremental:
+        chatMeta.merge(settings)
+    exporter = exporters.load(settings.exporter)
+    exporter = exporters.shard(exporter, settings.exporter, settings.shardSize)
+    dumper = FakeDumper(str(tmp_path / 'session'), settings, chatMeta,
+                        exporter, filters.load(settings.filter, exporter), FakeChat(ChatShape(count=count)))
+    assert dumper.run() == 0
+    return dumper
+
+
+def listed(tmp_path) -> list:
+    return ShardManifest(str(tmp_path / 'out')).load().shards
+
+
+def test_parts_are_listed_with_their_contents(tmp_path, monkeypatch):
+    dump(tmp_path, monkeypatch, 3000, ['-c', '@benchmark_chat', '-e', 'jsonl', '-l', '0', '--shard', '64k'])
+    shards = listed(tmp_path)
+    assert len(shards) > 1
+    ids = []
+    for shard in shards:
+        path = os.path.join(str(tmp_path / 'out'), shard[ShardManifest.key_path])
+        with open(path, 'rb') as ff:
+            data = ff.read()
+        assert len(data) <= SHARD
+        assert shard[ShardManifest.key_bytes] == len(data)
+        assert shard[ShardManifest.key_sha256] == hashlib.sha256(data).hexdigest()
+        assert shard[ShardManifest.key_rows] == data.count(b'\n')
+        assert shard[ShardManifest.key_partition] == os.path.dirname(shard[ShardManifest.key_path])
+        ids.append((shard[ShardManifest.key_firstId], shard[ShardManifest.key_lastId]))
+    # Oldest first, every message in exactly one part
+    assert ids[0][0] == 1 and ids[-1][1] == 3000
+    assert all(prev[1] + 1 == cur[0] for prev, cur in zip(ids, ids[1:]))
+    assert sum(shard[ShardManifest.key_rows] for shard in shards) == 3000
+
+
+def test_continue_adds_parts(tmp_path, monkeypatch):
+    dump(tmp_path, monkeypatch, 2000, ['-c', '@benchmark_chat', '-e', 'jsonl', '-l', '0', '--shard', '64k'])
+    before = listed(tmp_path)
+    dump(tmp_path, monkeypatch, 2500, ['--continue'])
+    after = listed(tmp_path)
+    assert after[:len(before)] == before
+    added = after[len(before):]
+    assert added
+    assert not {shard[ShardManifest.key_path] for shard in added} & {shard[ShardManifest.key_path] for shard in before}
+    assert added[0][ShardManifest.key_firstId] == 2001
+    assert added[-1][ShardManifest.key_lastId] == 2500
+    assert sum(shard[ShardManifest.key_rows] for shard in added) == 500
@@ -0,0 +1,66 @@
+""" Takeout session of a dump (--takeout) against the synthetic chat of benchmarks.fakes """
+
+import sys
+
+from benchmarks.fakes import ChatShape
+from benchmarks.fakes import FakeChat
+from benchmarks.fakes import FakeDumper
+from teledump import exporters
+from teledump import filters
+from teledump.settings import ChatDumpMetaFile
+from teledump.settings import ChatDumpSettings
+
+COUNT = 500
+
+
+def makeDumper(tmp_path, monkeypatch, takeout: str) -> FakeDumper:
+    chat = FakeChat(ChatShape(count=COUNT), takeout)
+    out = str(tmp_path / 'out.jsonl')
+    monkeypatch.setattr(sys, 'argv', ['teledump', '-c', '@' + chat.channel.username, '-p', '+10000000000',
+                                      '-o', out, '-e', 'jsonl', '-l', '0', '-q', '--takeout'])
+    settings = ChatDumpSettings('')
+    exporter = exporters.load(settings.exporter)
+    return FakeDumper(str(tmp_path / 'session'), settings, ChatDumpMetaFile(settings.outFile),
+                      exporter, filters.load(settings.filter, exporter), chat)
+
+
+def test_accepted_takeout_is_finished_with_success(tmp_path, monkeypatch):
+    dumper = makeDumper(tmp_path, monkeypatch, 'accept')
+    assert dumper.run() == 0
+    assert dumper.output.totalSaved == COUNT
+    # Every page and the finish went through the takeout
+    assert dumper.chat.takeoutRequests == dumper.chat.requests + 1
+    assert dumper.chat.takeoutSuccess is True
+    assert dumper.session.takeout_id is None
+
+
+def test_refused_takeout_falls_back_to_normal_session(tmp_path, monkeypatch):
+    dumper = makeDumper(tmp_path, monkeypatch, 'refuse')
+    assert dumper.run() == 0
+    assert dumper.output.totalSaved == COUNT
+    assert dumper.takeoutSession is None
+    assert dumper.chat.takeoutRequests == 0
+    assert dumper.chat.takeoutSuccess is None
+
+
+def test_invalid_takeout_falls_back_to_normal_session(tmp_path, monkeypatch):
+    dumper = makeDumper(tmp_path, monkeypatch, 'accept')
+    # A takeout of the previous run the server no longer knows
+    dumper.session.takeout_id = 42
+    assert dumper.run() == 0
+    assert dumper.output.totalSaved == COUNT
+    assert dumper.takeoutSession is None
+    assert dumper.chat.takeoutSuccess is None
+    assert dumper.session.takeout_id is None
+
+
+def test_failed_dump_finishes_takeout_without_success(tmp_path, monkeypatch):
+    dumper = makeDumper(tmp_path, monkeypatch, 'accept')
+
+    def spill(*args):
+        raise KeyboardInterrupt
+    dumper.output.spillSize = 100
+    dumper.output.spill = spill
+    assert dumper.run() == 1
+    assert dumper.chat.takeoutSuccess is False
+    assert dumper.session.takeout_id is None